@@ -1,30 +1,136 @@
 #pragma once
 
 #include "FWCore/Framework/interface/Frameworkfwd.h"
-#include "FWCore/Framework/interface/EDAnalyzer.h"
+#include "FWCore/Framework/interface/stream/EDAnalyzer.h"
 #include "JMEAnalysis/TreeWrapper/interface/TreeWrapper.h"
+#include "JMEAnalysis/JMEValidator/interface/Timing.h"
 
+#include <map>
+#include <memory>
+#include <mutex>
+#include <set>
+#include <string>
+#include <utility>
+#include <vector>
+
+class TBranch;
+class TTree;
 
 namespace JME {
-    class Analyzer : public edm::EDAnalyzer {
+    /**
+     * Output of an analyzer, shared by all its streams: the tree in the
+     * TFileService, and the timing measurements merged at the end of the job.
+     *
+     * Analyzers with other results to merge across streams derive from it,
+     * and hide Analyzer::initializeGlobalCache with their own version.
+     */
+    struct AnalyzerOutput {
+        AnalyzerOutput(const edm::ParameterSet& iConfig);
+        virtual ~AnalyzerOutput() {}
+
+        // Called at the end of the job, once all the streams are done
+        virtual void endJob() const {}
+
+        std::string moduleLabel;
+        std::string timingJSON;
+        // If false, commit() does not fill the tree
+        bool writeTree;
+
+        // Everything below is only accessed with the mutex held
+        mutable std::mutex mutex;
+        mutable TTree* tree = nullptr;
+        // Stream whose buffers are currently bound to the tree branches
+        mutable int boundStream = -1;
+        mutable JME::Timing timing;
+    };
+
+    /**
+     * Base class of the analyzers writing a tree to the TFileService.
+     *
+     * Analyzers are stream modules: each stream has its own instance, with its
+     * own tree branches used as fill buffers. commit() writes the current
+     * values of the branches of the stream in the shared output tree, holding
+     * a lock only for the TTree::Fill, and resets them.
+     *
+     * Configuration, all optional:
+     *   treeName             = cms.string('t'),
+     *   disabledBranchGroups = cms.vstring(),    # branch groups not written, see declareBranchGroup
+     *   compressionAlgorithm = cms.string(''),   # 'ZLIB' or 'LZMA', default: the one of the output file
+     *   compressionLevel     = cms.int32(-1),    # 0 to 9, default: the one of the output file
+     *   basketSize           = cms.int32(0),     # in bytes, default: ROOT default
+     *   autoFlush            = cms.int64(0),     # TTree::SetAutoFlush, default: ROOT default
+     *   timing               = cms.untracked.bool(False),  # time the sections declared in timing_
+     *   timingJSON           = cms.untracked.string(''),   # default: <module label>_timing.json
+     *   writeTree            = cms.bool(True),   # False: the tree is created, but no event is written
+     */
+    class Analyzer : public edm::stream::EDAnalyzer<edm::GlobalCache<AnalyzerOutput>> {
         public:
             // construction/destruction
-            explicit Analyzer(const edm::ParameterSet& iConfig);
+            explicit Analyzer(const edm::ParameterSet& iConfig, const AnalyzerOutput* output);
             virtual ~Analyzer();
 
+            static std::unique_ptr<AnalyzerOutput> initializeGlobalCache(const edm::ParameterSet& iConfig);
+            static void globalEndJob(const AnalyzerOutput* output);
+
         protected:
 
+            // Create the tree of the output, for the initializeGlobalCache of the derived classes
+            static std::unique_ptr<AnalyzerOutput> initializeOutput(std::unique_ptr<AnalyzerOutput> output, const edm::ParameterSet& iConfig);
+
             // member functions
-            virtual void beginJob() override;
+            virtual void beginStream(edm::StreamID streamID) override;
             virtual void analyze(const edm::Event& iEvent, const edm::EventSetup& iSetup) = 0;
+            virtual void endStream() override;
+
+            // Called once, by the first stream, when the branches of the output tree are created
+            virtual void beginOutput(TTree* output) {}
+
+            // Write the current event of this stream in the output tree, and reset the branches
+            void commit();
+
+            // Declare a group of branches that can be disabled from the configuration.
+            // Must be called from the constructor of the analyzer
+            void declareBranchGroup(const std::string& group, const std::vector<std::string>& branches);
+
+            // Disable a group independently of the configuration, e.g. when its
+            // branches are meaningless for the current setup
+            void disableBranchGroup(const std::string& group) {
+                disabledBranchGroups_.insert(group);
+            }
+
+            // False if the group is disabled: its branches are not written, and the
+            // analyzer should skip the computation behind them
+            bool isBranchGroupEnabled(const std::string& group) const {
+                return disabledBranchGroups_.count(group) == 0;
+            }
 
         protected:
 
             // member data
             std::string moduleLabel_;
 
-            // tree
+            // tree of this stream, holding the values of the current event
             std::string treeName_;
             ROOT::TreeWrapper tree;
+
+            // timing of the sections of analyze(), opt-in
+            JME::Timing timing_;
+
+        private:
+            void removeDisabledBranches(TTree* tree);
+            void configureOutputTree(TTree* tree);
+
+            int streamID_;
+            std::unique_ptr<TTree> streamTree_;
+            // (output tree branch, stream tree branch)
+            std::vector<std::pair<TBranch*, TBranch*>> branches_;
+
+            std::map<std::string, std::vector<std::string>> branchGroups_;
+            std::set<std::string> disabledBranchGroups_;
+
+            std::string compressionAlgorithm_;
+            int compressionLevel_;
+            int basketSize_;
+            long long autoFlush_;
     };
 }
@@ -0,0 +1,94 @@
+#pragma once
+
+#include "DataFormats/Candidate/interface/Candidate.h"
+
+#include <string>
+#include <vector>
+
+namespace JME {
+    /**
+     * Opposite-charge lepton pairs, e.g. Z candidates.
+     *
+     * The four-momenta of the leptons are copied once per event in flat arrays
+     * with add(), then build() enumerates the pairs (i, j) with i < j, keeps the
+     * opposite-charge ones with a mass inside the window, and selects the best
+     * one. The selection only depends on the order the leptons were added in:
+     * on ties, the first pair wins.
+     *
+     *   builder.clear();
+     *   for (const auto& muon: *muons)
+     *       builder.add(muon);
+     *   if (builder.build() > 0)
+     *       ... builder.best().pt ...
+     *
+     * Leptons of different flavours can be added to the same builder; mixed
+     * pairs are only built if sameFlavour is false.
+     */
+    class DileptonBuilder {
+        public:
+            enum Selection {
+                // Mass closest to the nominal mass
+                CLOSEST_MASS,
+                // Highest pair pt
+                HIGHEST_PT
+            };
+
+            struct Pair {
+                // Indices of the leptons, in the order they were added, first < second
+                size_t first;
+                size_t second;
+
+                double px;
+                double py;
+                double pz;
+                double energy;
+
+                double pt;
+                double phi;
+                double mass;
+            };
+
+            DileptonBuilder(double mass = 91.2, double window = 15, Selection selection = CLOSEST_MASS, bool sameFlavour = true);
+
+            // Parse the name of a selection, "closestMass" or "highestPt"
+            static Selection selection(const std::string& name);
+
+            void clear();
+
+            void add(const reco::Candidate& lepton);
+
+            // Build the pairs from the leptons added since the last clear(),
+            // returning the number of pairs in the mass window
+            size_t build();
+
+            bool found() const {
+                return nPairs_ > 0;
+            }
+
+            // Best pair, only meaningful if found()
+            const Pair& best() const {
+                return best_;
+            }
+
+            size_t size() const {
+                return px_.size();
+            }
+
+        private:
+            double mass_;
+            double window_;
+            Selection selection_;
+            bool sameFlavour_;
+
+            // Leptons, struct-of-arrays
+            std::vector<double> px_;
+            std::vector<double> py_;
+            std::vector<double> pz_;
+            std::vector<double> energy_;
+            std::vector<int> charge_;
+            std::vector<int> flavour_;
+
+            size_t nPairs_ = 0;
+            Pair best_;
+    };
+}
@@ -0,0 +1,67 @@
+#pragma once
+
+#include "FWCore/ServiceRegistry/interface/ActivityRegistry.h"
+#include "FWCore/Utilities/interface/StreamID.h"
+#include "CondFormats/JetMETObjects/interface/JetCorrectorParameters.h"
+#include "CondFormats/JetMETObjects/interface/FactorizedJetCorrector.h"
+
+#include <map>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <vector>
+
+namespace edm {
+    class ParameterSet;
+    namespace service {
+        class SystemBounds;
+    }
+}
+
+namespace JME {
+    /**
+     * Job-level owner of the jet energy correction payloads.
+     *
+     * Each payload file is parsed once per process and shared, read-only, by
+     * every module asking for it. FactorizedJetCorrector keeps per-jet state
+     * (setJetEta, setJetPt, ...), so each stream gets its own corrector built
+     * from the shared parameters.
+     *
+     * Configuration:
+     *   process.JetCorrectorService = cms.Service('JetCorrectorService',
+     *       era = cms.string('PHYS14_V2_MC'),
+     *       directory = cms.string('JMEAnalysis/JMEValidator/data')
+     *   )
+     */
+    class JetCorrectorService {
+        public:
+            typedef std::vector<JetCorrectorParameters> Parameters;
+            typedef std::shared_ptr<const Parameters> Handle;
+
+            // construction/destruction
+            JetCorrectorService(const edm::ParameterSet& iConfig, edm::ActivityRegistry& iRegistry);
+
+            // Parameters of the given levels of a payload, e.g. ("AK4PFchs", {"L1FastJet", "L2Relative"}).
+            // Files are looked up as <directory>/<era>_<level>_<payload>.txt
+            Handle parameters(const std::string& payload, const std::vector<std::string>& levels);
+
+            // Parameters read from the given payload files
+            Handle parameters(const std::vector<std::string>& files);
+
+            // Corrector of the current stream for the given parameters
+            FactorizedJetCorrector& corrector(const Handle& parameters, edm::StreamID streamID);
+
+        private:
+            void preallocate(const edm::service::SystemBounds& bounds);
+            std::string payloadFile(const std::string& payload, const std::string& level) const;
+
+            std::string era_;
+            std::string directory_;
+
+            std::mutex mutex_;
+            std::map<std::vector<std::string>, Handle> parameters_;
+
+            // Per-stream scratch state: only accessed by its own stream
+            std::vector<std::map<const Parameters*, std::unique_ptr<FactorizedJetCorrector>>> correctors_;
+    };
+}
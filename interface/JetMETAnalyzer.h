@@ -1,30 +1,40 @@
 #pragma once
 
 #include "JMEAnalysis/JMEValidator/interface/Analyzer.h"
+#include "JMEAnalysis/JMEValidator/interface/PackedCandidateSoA.h"
+#include "JMEAnalysis/JMEValidator/interface/SortedVertices.h"
 
 class JetMETAnalyzer : public JME::Analyzer
 {
 public:
   // construction/destruction
-  explicit JetMETAnalyzer(const edm::ParameterSet& iConfig);
+  explicit JetMETAnalyzer(const edm::ParameterSet& iConfig, const JME::AnalyzerOutput* output);
   virtual ~JetMETAnalyzer();
 
 private:
   // member functions
+  virtual void beginOutput(TTree* output) override;
   void analyze(const edm::Event& iEvent,const edm::EventSetup& iSetup);
-  void endJob(){;}
 
-  void computeBetaStar(const pat::Jet& jet, const std::vector<reco::Vertex>& vertices);
+  // rank: index of the jet among the jets of its collection written in the tree
+  void fillReference(const pat::Jet& jet, int rank);
+  void computeBetaStar(const pat::Jet& jet, const std::vector<reco::Vertex>& vertices, const JME::PackedCandidateSoA* packedCandidates);
 
 private:
   // member data
-  std::string   JetCorLabel_;
-  std::vector<std::string> JetCorLevels_;
+  struct JetCollection {
+    std::string   JetCorLabel;
+    std::vector<std::string> JetCorLevels;
+    edm::EDGetTokenT<std::vector<pat::Jet>> srcJet;
+  };
+  // Jet collections, in the order of their jtcoll index
+  std::vector<JetCollection> jetCollections_;
 
-  edm::EDGetTokenT<std::vector<pat::Jet>> srcJet_;
   edm::EDGetTokenT<double> srcRho_;
   edm::EDGetTokenT<std::vector<reco::Vertex>> srcVtx_;
   edm::EDGetTokenT<std::vector<pat::Muon>> srcMuons_;
+  // Optional, output of the PackedCandidateSoAProducer
+  edm::EDGetTokenT<JME::PackedCandidateSoA> srcPackedCandidates_;
 
   edm::EDGetTokenT<std::vector<PileupSummaryInfo>> m_puInfoToken;
 
@@ -34,7 +44,23 @@ private:
   double        deltaRMax_;
   double        deltaPhiMin_;
   double        deltaRPartonMax_;
-  FactorizedJetCorrector* jetCorrector_;
+
+  // Non-fake vertices sorted in z, updated once per event
+  JME::SortedVertices sortedVertices_;
+  // Cross-check the sorted closest vertex search against the loop over all the vertices
+  bool          checkBetaStar_;
+
+  // Enabled branch groups
+  bool          doPileup_;
+  bool          doReference_;
+  bool          doKinematics_;
+  bool          doPileupId_;
+  bool          doRings_;
+  bool          doCollections_;
+
+  // Timing sections
+  size_t        analyzeTiming_;
+  size_t        betaStarTiming_;
 
   // Tree branches
   float& rho_ = tree["rho"].write<float>();
@@ -46,6 +72,7 @@ private:
   std::vector<float>& tnpus = tree["tnpus"].write<std::vector<float>>();
   std::vector<int>& bxns = tree["bxns"].write<std::vector<int>>();
   int& nref = tree["nref"].write<int>();
+  std::vector<int>& jtcoll = tree["jtcoll"].write<std::vector<int>>();
   std::vector<int>& refrank = tree["refrank"].write<std::vector<int>>();
   std::vector<int>& refpdgid_algorithmicDef = tree["refpdgid_algorithmicDef"].write<std::vector<int>>();
   std::vector<int>& refpdgid_physicsDef = tree["refpdgid_physicsDef"].write<std::vector<int>>();
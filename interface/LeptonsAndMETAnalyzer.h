@@ -1,47 +1,65 @@
 #pragma once
 
 #include "JMEAnalysis/JMEValidator/interface/Analyzer.h"
+#include "JMEAnalysis/JMEValidator/interface/DileptonBuilder.h"
+#include "JMEAnalysis/JMEValidator/interface/MuonIsolationRecord.h"
+#include "JMEAnalysis/JMEValidator/interface/RecoilAccumulator.h"
+#include "JMEAnalysis/JMEValidator/interface/PackedCandidateSoA.h"
 
 #include <vector>
 
+// Output shared by the streams, with the recoil of all the streams
+struct LeptonsAndMETOutput : public JME::AnalyzerOutput
+{
+  LeptonsAndMETOutput(const edm::ParameterSet& iConfig);
+  virtual void endJob() const override;
+
+  bool doRecoil;
+  // Only accessed with the mutex held
+  mutable JME::RecoilAccumulator recoil;
+};
+
 class LeptonsAndMETAnalyzer : public JME::Analyzer
 {
 public:
   // construction/destruction
-  explicit LeptonsAndMETAnalyzer(const edm::ParameterSet& iConfig);
+  explicit LeptonsAndMETAnalyzer(const edm::ParameterSet& iConfig, const JME::AnalyzerOutput* output);
   virtual ~LeptonsAndMETAnalyzer();
 
+  static std::unique_ptr<JME::AnalyzerOutput> initializeGlobalCache(const edm::ParameterSet& iConfig);
+
 private:
   // member functions
-  virtual void beginJob() override;
+  virtual void endStream() override;
   virtual void analyze(const edm::Event& iEvent,const edm::EventSetup& iSetup) override;
-  virtual void endJob(){;}
   void recoilComputation( float &met, float &metPhi, float &Zpt, float &Zphi, float &upara, float &uperp);
 
 private:
   // member data
-  int eventCounter_; 
-  int eventLimit_; 
+  // Z candidates from the muons of srcIsoMuons
+  JME::DileptonBuilder zBuilder_;
+
+  // Recoil of the Z candidates, accumulated if the 'recoil' PSet is present
+  bool doRecoil_;
+  JME::RecoilAccumulator recoil_;
+  size_t pfMETRecoil_;
+  size_t puppETRecoil_;
+
+  // Timing sections
+  size_t analyzeTiming_;
+  size_t isolationTiming_;
 
   // Tokens
   edm::EDGetTokenT<edm::View<reco::Candidate>> srcIsoMuons_;
   edm::EDGetTokenT<std::vector<pat::MET>> srcMET_;
   edm::EDGetTokenT<std::vector<reco::PFMET>> srcPUPPET_;
+  // Optional, output of the PackedCandidateSoAProducer
+  edm::EDGetTokenT<JME::PackedCandidateSoA> srcPackedCandidates_;
 
-  edm::InputTag srcVtx_;
-  edm::InputTag srcMuons_;
-  edm::InputTag srcVMCHSTAND_;
-  edm::InputTag srcVMNHSTAND_;
-  edm::InputTag srcVMPhSTAND_;
-  edm::InputTag srcVMPUSTAND_;
-  edm::InputTag srcVMNHPFWGT_;
-  edm::InputTag srcVMPhPFWGT_;
-  edm::InputTag srcVMCHPUPPI_;
-  edm::InputTag srcVMNHPUPPI_;
-  edm::InputTag srcVMPhPUPPI_;
-  edm::InputTag srcVMCHNOMUONPUPPI_;
-  edm::InputTag srcVMNHNOMUONPUPPI_;
-  edm::InputTag srcVMPhNOMUONPUPPI_;
+  edm::EDGetTokenT<std::vector<reco::Vertex>> srcVtx_;
+  edm::EDGetTokenT<edm::View<pat::Muon>> srcMuons_;
+  // Output of the MuonIsolationRecordProducer, aligned with srcMuons
+  edm::EDGetTokenT<JME::MuonIsolationRecordCollection> srcIsolation_;
 
   // Tree branches
   ULong64_t& run = tree["run"].write<ULong64_t>();
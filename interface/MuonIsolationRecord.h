@@ -0,0 +1,47 @@
+#pragma once
+
+#include <vector>
+
+namespace JME {
+    /**
+     * Isolation sums of a muon, for all the isolation flavours.
+     *
+     * Built by the MuonIsolationRecordProducer from the ValueMaps of the
+     * MuonPFIsolationSequence, as a collection aligned by index with the muon
+     * collection, so that the analyzers read one product indexed like the
+     * muons. The ValueMap lookups are only moved to the producer, which does
+     * one per sum and muon: the record does not make the isolation cheaper.
+     *
+     * The sums are kept in double precision, as in the ValueMaps.
+     */
+    struct MuonIsolationRecord {
+        enum Flavour {
+            STAND = 0,
+            PFWGT,
+            PUPPI,
+            NOMUONPUPPI,
+            N_FLAVOURS
+        };
+
+        enum Component {
+            // Charged hadrons
+            CH = 0,
+            // Neutral hadrons
+            NH,
+            // Photons
+            PH,
+            // Charged pileup
+            PU,
+            N_COMPONENTS
+        };
+
+        // Sums not computed for a flavour are 0
+        double sums[N_FLAVOURS][N_COMPONENTS] = {};
+
+        double get(Flavour flavour, Component component) const {
+            return sums[flavour][component];
+        }
+    };
+
+    typedef std::vector<MuonIsolationRecord> MuonIsolationRecordCollection;
+}
@@ -0,0 +1,48 @@
+#pragma once
+
+#include "DataFormats/Provenance/interface/ProductID.h"
+
+#include <vector>
+
+namespace JME {
+    /**
+     * Per-event struct-of-arrays view of a pat::PackedCandidate collection,
+     * indexed by candidate key, with the vertex quantities shared by the
+     * analyzers.
+     *
+     * Built once per event by the PackedCandidateSoAProducer, so that the
+     * analyzers do not need to dynamic_cast the jet constituents and to
+     * recompute dz and the closest vertex for each jet collection.
+     */
+    struct PackedCandidateSoA {
+        // Product ID of the packed candidates collection, to check that a
+        // candidate Ptr can be used as an index
+        edm::ProductID source;
+
+        std::vector<float> pt;
+        std::vector<float> eta;
+        std::vector<float> phi;
+        std::vector<int> charge;
+        std::vector<int> fromPV;
+
+        // dz with respect to the primary vertex. The vertex quantities are kept
+        // in double precision, as computed, since they are compared to cuts
+        std::vector<double> dz;
+        // dz with respect to the closest non-fake vertex, or dz if smaller
+        std::vector<double> dzClosest;
+
+        // z of the non-fake vertices, sorted
+        std::vector<double> vertexZ;
+
+        // Number of good vertices: not fake, ndof >= 4 and |z| <= 24
+        unsigned int nGoodVertices = 0;
+
+        size_t size() const {
+            return pt.size();
+        }
+
+        bool contains(const edm::ProductID& id) const {
+            return id == source;
+        }
+    };
+}
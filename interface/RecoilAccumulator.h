@@ -0,0 +1,87 @@
+#pragma once
+
+#include <cstdint>
+#include <string>
+#include <vector>
+
+namespace edm {
+    class ParameterSet;
+}
+
+namespace JME {
+    /**
+     * In-job accumulation of the hadronic recoil of Z events, for several MET
+     * flavours, in (ZpT, NPV) bins:
+     *   - running moments (entries, mean and variance) of u_par / ZpT and u_perp
+     *   - fixed-binning distributions of u_par / ZpT and u_perp
+     *
+     * Each stream has its own accumulator, merged at the end of the job. The
+     * summaries are booked in the TFileService as histograms that hadd adds
+     * exactly, so that jobs can be merged:
+     *   recoil/<flavour>/uParaOverZpT_profile, uPerp_profile   TProfile2D (ZpT, NPV), option "s"
+     *   recoil/<flavour>/uParaOverZpT, uPerp                   TH3F (ZpT, NPV, value)
+     *
+     * Configuration, all optional:
+     *   zPtBins        = cms.vdouble(0, 10, 20, 30, 40, 50, 75, 100, 150, 200, 300),
+     *   npvBins        = cms.vdouble(0, 5, 10, 15, 20, 25, 30, 40, 60),
+     *   responseBins   = cms.vdouble(120, -4., 2.),       # number of bins, min, max of u_par / ZpT
+     *   perpBins       = cms.vdouble(100, -100., 100.),   # number of bins, min, max of u_perp
+     */
+    class RecoilAccumulator {
+        public:
+            RecoilAccumulator();
+            explicit RecoilAccumulator(const edm::ParameterSet& iConfig);
+
+            // Declare a MET flavour, returning its index
+            size_t flavour(const std::string& name);
+
+            void fill(size_t flavour, double zPt, double npv, double uPara, double uPerp);
+
+            // Add the content of another accumulator, with the same binning
+            void merge(const RecoilAccumulator& other);
+
+            // Book and fill the summaries in the TFileService, in a 'recoil' directory
+            void book() const;
+
+        private:
+            // Welford running moments, merged with the formula of Chan et al.
+            struct Moments {
+                uint64_t n = 0;
+                double mean = 0;
+                double m2 = 0;
+
+                void add(double x);
+                void merge(const Moments& other);
+            };
+
+            struct Axis {
+                size_t nBins;
+                double min;
+                double max;
+            };
+
+            struct Flavour {
+                std::string name;
+
+                // [zPt][npv]
+                std::vector<Moments> response;
+                std::vector<Moments> perp;
+
+                // [zPt][npv][value], with underflow and overflow in value
+                std::vector<uint64_t> responseHistogram;
+                std::vector<uint64_t> perpHistogram;
+            };
+
+            // Index of x in edges, -1 outside
+            static int find(const std::vector<double>& edges, double x);
+            // Index of x in the axis, 0 for underflow and nBins + 1 for overflow
+            static size_t find(const Axis& axis, double x);
+
+            std::vector<double> zPtBins_;
+            std::vector<double> npvBins_;
+            Axis responseAxis_;
+            Axis perpAxis_;
+
+            std::vector<Flavour> flavours_;
+    };
+}
@@ -0,0 +1,54 @@
+#pragma once
+
+#include "DataFormats/VertexReco/interface/Vertex.h"
+#include "DataFormats/PatCandidates/interface/PackedCandidate.h"
+
+#include <vector>
+
+namespace JME {
+    /**
+     * Non-fake vertices of an event sorted in z, to find the vertex closest in dz
+     * to a packed candidate without looping over all the vertices.
+     *
+     * For a vertex v, PackedCandidate::dz(v) can be written as
+     *
+     *   dz(v) = z0 - vz + a * (vx * ux + vy * uy)
+     *
+     * with z0 = cz - a * (cx * ux + cy * uy), a = pz / pt and (ux, uy) the transverse
+     * direction of the candidate. The last term is bounded by |a| * R, R being the
+     * largest transverse distance of the vertices to the beam line. The search starts
+     * at z0 and walks in both directions, until |z0 - vz| - |a| * R exceeds the best
+     * |dz| found so far. The dz values themselves are computed with PackedCandidate::dz,
+     * and vertices at the same |dz| are resolved in favour of the first one in the
+     * input collection, so the result is exactly the one of the loop over all the
+     * vertices.
+     */
+    class SortedVertices {
+        public:
+            // Build the z-sorted list of the non-fake vertices. Called once per event
+            void update(const std::vector<reco::Vertex>& vertices);
+
+            // Smallest |dz| between the candidate and the vertices, starting from
+            // the value 'initial'. As in the loop over the vertices, the value
+            // returned is the signed dz of the closest vertex
+            double closestDz(const pat::PackedCandidate& candidate, double initial) const;
+
+            // Same result, looping over all the vertices
+            static double closestDzBruteForce(const pat::PackedCandidate& candidate, const std::vector<reco::Vertex>& vertices, double initial);
+
+            size_t size() const {
+                return z_.size();
+            }
+
+            const std::vector<double>& z() const {
+                return z_;
+            }
+
+        private:
+            std::vector<double> z_;
+            std::vector<reco::Vertex::Point> positions_;
+            // Index of each vertex in the input collection
+            std::vector<size_t> indices_;
+            double maxRadius_ = 0;
+    };
+}
@@ -0,0 +1,107 @@
+#pragma once
+
+#include <array>
+#include <chrono>
+#include <cstdint>
+#include <string>
+#include <vector>
+
+namespace JME {
+    /**
+     * Opt-in timing of named sections of an analyzer.
+     *
+     * Sections are declared once, in the constructor of the analyzer, and then
+     * timed with a Scope:
+     *
+     *   size_t section = timing.section("computeBetaStar", "constituents");
+     *   ...
+     *   {
+     *       JME::Timing::Scope scope(timing, section);
+     *       ...
+     *       scope.add(nConstituents);
+     *   }
+     *
+     * When timing is disabled, a Scope does not read the clock. Otherwise the
+     * time of each call is measured with std::chrono::steady_clock, accumulated,
+     * and histogrammed. Each stream has its own Timing, merged at the end of
+     * the job; the histograms are then booked in the TFileService.
+     */
+    class Timing {
+        public:
+            typedef std::chrono::steady_clock Clock;
+
+            class Scope {
+                public:
+                    Scope(Timing& timing, size_t section)
+                        : timing_(timing.enabled_ ? &timing : nullptr)
+                        , section_(section) {
+                            if (timing_)
+                                start_ = Clock::now();
+                        }
+
+                    ~Scope() {
+                        if (timing_)
+                            timing_->record(section_, std::chrono::duration_cast<std::chrono::nanoseconds>(Clock::now() - start_).count(), items_);
+                    }
+
+                    // Count items (jets, candidates, ...) processed in this call
+                    void add(uint64_t items = 1) {
+                        items_ += items;
+                    }
+
+                private:
+                    Timing* timing_;
+                    size_t section_;
+                    uint64_t items_ = 0;
+                    Clock::time_point start_;
+            };
+
+            explicit Timing(bool enabled = false)
+                : enabled_(enabled) {
+                }
+
+            bool enabled() const {
+                return enabled_;
+            }
+
+            void setEnabled(bool enabled) {
+                enabled_ = enabled;
+            }
+
+            // Declare a section, returning its index. 'unit' is the name of the counted items
+            size_t section(const std::string& name, const std::string& unit);
+
+            // Add the measurements of another Timing, e.g. of another stream
+            void merge(const Timing& other);
+
+            // Book and fill the histograms of all the sections in the TFileService,
+            // in a 'timing' directory
+            void book() const;
+
+            // Write the summary of all the sections as JSON
+            void writeJSON(const std::string& fileName, const std::string& moduleLabel) const;
+
+        private:
+            // Histograms of log10 of the time in ns, from 0 to 10
+            static const size_t N_BINS = 200;
+            typedef std::array<uint64_t, N_BINS + 2> Histogram;
+
+            struct Section {
+                std::string name;
+                std::string unit;
+
+                uint64_t calls = 0;
+                uint64_t items = 0;
+                uint64_t nanoseconds = 0;
+
+                // Time of each call, and per item
+                Histogram timePerCall = Histogram();
+                Histogram timePerItem = Histogram();
+            };
+
+            void record(size_t section, uint64_t nanoseconds, uint64_t items);
+
+            bool enabled_;
+            std::vector<Section> sections_;
+    };
+}
@@ -2,23 +2,38 @@
 
 #include "JMEAnalysis/JMEValidator/interface/Analyzer.h"
 
+#include <cstdint>
+
 class puppiAnalyzer : public JME::Analyzer
 {
 public:
   // construction/destruction
-  explicit puppiAnalyzer(const edm::ParameterSet& iConfig);
+  explicit puppiAnalyzer(const edm::ParameterSet& iConfig, const JME::AnalyzerOutput* output);
   virtual ~puppiAnalyzer();
 
 private:
   // member functions
-  virtual void beginJob() override;
   virtual void analyze(const edm::Event& iEvent,const edm::EventSetup& iSetup) override;
-  virtual void endJob(){;}
+
+  // Deterministic prescale, only depending on the event id
+  bool isSelected(const edm::EventID& id) const;
+  // Round a float to mantissaBits_ bits of mantissa, in compact mode
+  float reduce(float value) const;
 
 private:
   // member data
-  int eventCounter_; 
-  int eventLimit_; 
+  // Keep one event out of prescale_, whatever the order the events are processed in
+  unsigned int prescale_;
+  // Candidates with a lower pt are not written, neither in the candidate
+  // branches nor in the alphas
+  double ptMin_;
+  // Compact mode: (pt, eta, phi) with mantissaBits_ bits of mantissa, and
+  // integer categorical fields, instead of (px, py, pz, e) and floats
+  bool compact_;
+  int mantissaBits_;
+
+  // Timing section of the loop over the candidates
+  size_t candidatesTiming_;
 
   // Tokens
   edm::EDGetTokenT<double> nAlgosToken_;
@@ -33,15 +48,23 @@ private:
   ULong64_t& lumiBlock = tree["lumi"].write<ULong64_t>();
   ULong64_t& event = tree["evt"].write<ULong64_t>();
   float& nalgos = tree["nalgos"].write<float>();
-  std::vector<float>& px = tree["px"].write<std::vector<float>>();
-  std::vector<float>& py = tree["py"].write<std::vector<float>>();
-  std::vector<float>& pz = tree["pz"].write<std::vector<float>>();
-  std::vector<float>& e = tree["e"].write<std::vector<float>>();
   std::vector<float>& alphas = tree["alphas"].write<std::vector<float>>();
   std::vector<float>& thealphas = tree["thealphas"].write<std::vector<float>>();
   std::vector<float>& thealphasmed = tree["thealphasmed"].write<std::vector<float>>();
   std::vector<float>& thealphasrms = tree["thealphasrms"].write<std::vector<float>>();
+  // Full mode, group "candidates"
+  std::vector<float>& px = tree["px"].write<std::vector<float>>();
+  std::vector<float>& py = tree["py"].write<std::vector<float>>();
+  std::vector<float>& pz = tree["pz"].write<std::vector<float>>();
+  std::vector<float>& e = tree["e"].write<std::vector<float>>();
   std::vector<float>& id = tree["id"].write<std::vector<float>>();
   std::vector<float>& charge = tree["charge"].write<std::vector<float>>();
   std::vector<float>& fromPV = tree["fromPV"].write<std::vector<float>>();
+  // Compact mode, group "compact"
+  std::vector<float>& pt = tree["pt"].write<std::vector<float>>();
+  std::vector<float>& eta = tree["eta"].write<std::vector<float>>();
+  std::vector<float>& phi = tree["phi"].write<std::vector<float>>();
+  std::vector<short>& pdgId = tree["pdgId"].write<std::vector<short>>();
+  std::vector<char>& q = tree["q"].write<std::vector<char>>();
+  std::vector<char>& pv = tree["pv"].write<std::vector<char>>();
 };
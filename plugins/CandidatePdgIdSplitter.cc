@@ -0,0 +1,118 @@
+////////////////////////////////////////////////////////////////////////////////
+//
+// CandidatePdgIdSplitter
+// ----------------------
+//
+// Split a candidate collection by pdgId, in one pass, into several Ptr
+// collections put as instances. Replaces a set of PdgIdPFCandidateSelectors
+// reading the same input, e.g. for the PUPPI candidates:
+//
+//   splits = cms.PSet(
+//       ChargedHadrons = cms.vint32(211,-211,321,-321,999211,2212,-2212),
+//       NeutralHadrons = cms.vint32(111,130,310,2112),
+//       Photons        = cms.vint32(22)
+//   )
+//
+// A candidate goes to every instance listing its pdgId.
+////////////////////////////////////////////////////////////////////////////////
+
+
+#include "FWCore/Framework/interface/Frameworkfwd.h"
+#include "FWCore/Framework/interface/EDProducer.h"
+#include "FWCore/Framework/interface/Event.h"
+#include "FWCore/Framework/interface/EventSetup.h"
+#include "FWCore/Framework/interface/MakerMacros.h"
+
+#include "FWCore/ParameterSet/interface/ParameterSet.h"
+
+#include "DataFormats/Common/interface/Handle.h"
+#include "DataFormats/Common/interface/Ptr.h"
+#include "DataFormats/Common/interface/View.h"
+#include "DataFormats/Candidate/interface/Candidate.h"
+
+#include <map>
+#include <memory>
+#include <string>
+#include <vector>
+
+
+////////////////////////////////////////////////////////////////////////////////
+// class definition
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+class CandidatePdgIdSplitter : public edm::EDProducer
+{
+public:
+  // construction/destruction
+  CandidatePdgIdSplitter(const edm::ParameterSet& iConfig);
+  ~CandidatePdgIdSplitter() {;}
+
+  // member functions
+  void produce(edm::Event& iEvent,const edm::EventSetup& iSetup);
+
+private:
+  typedef std::vector<edm::Ptr<reco::Candidate>> CandPtrCollection;
+
+  // member data
+  edm::EDGetTokenT<edm::View<reco::Candidate>> src_;
+
+  std::vector<std::string> instances_;
+  // pdgId -> indices of the instances
+  std::map<int, std::vector<size_t>> splits_;
+};
+
+
+////////////////////////////////////////////////////////////////////////////////
+// construction/destruction
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+CandidatePdgIdSplitter::CandidatePdgIdSplitter(const edm::ParameterSet& iConfig)
+  : src_(consumes<edm::View<reco::Candidate>>(iConfig.getParameter<edm::InputTag>("src")))
+{
+  const edm::ParameterSet& splits = iConfig.getParameter<edm::ParameterSet>("splits");
+
+  instances_ = splits.getParameterNamesForType<std::vector<int>>();
+  for (size_t i = 0; i < instances_.size(); i++) {
+    for (int pdgId: splits.getParameter<std::vector<int>>(instances_[i]))
+      splits_[pdgId].push_back(i);
+
+    produces<CandPtrCollection>(instances_[i]);
+  }
+}
+
+
+////////////////////////////////////////////////////////////////////////////////
+// implementation of member functions
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+void CandidatePdgIdSplitter::produce(edm::Event& iEvent,const edm::EventSetup& iSetup)
+{
+  edm::Handle<edm::View<reco::Candidate>> cands;
+  iEvent.getByToken(src_, cands);
+
+  std::vector<std::unique_ptr<CandPtrCollection>> outputs;
+  for (size_t i = 0; i < instances_.size(); i++)
+    outputs.push_back(std::unique_ptr<CandPtrCollection>(new CandPtrCollection()));
+
+  for (size_t i = 0; i < cands->size(); i++) {
+    auto split = splits_.find((*cands)[i].pdgId());
+    if (split == splits_.end())
+      continue;
+
+    for (size_t instance: split->second)
+      outputs[instance]->push_back(cands->ptrAt(i));
+  }
+
+  for (size_t i = 0; i < instances_.size(); i++)
+    iEvent.put(std::auto_ptr<CandPtrCollection>(outputs[i].release()), instances_[i]);
+}
+
+
+////////////////////////////////////////////////////////////////////////////////
+// plugin definition
+////////////////////////////////////////////////////////////////////////////////
+
+DEFINE_FWK_MODULE(CandidatePdgIdSplitter);
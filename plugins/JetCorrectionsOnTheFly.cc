@@ -31,16 +31,26 @@ JetCorrectionsOnTheFly::JetCorrectionsOnTheFly(edm::ParameterSet const& cfg) :
   corrPtUp = fileService->make<TH1F>("corrPtUp", "Corrected pt Plus Uncertainty ", 50, 0., 500.);
   corrPtDown = fileService->make<TH1F>("corrPtDown", "Corrected pt Minus Uncertainty ", 50, 0., 500.);
   
-  //Get the factorized jet corrector parameters. 
-  std::vector<JetCorrectorParameters> vPar;
-  for ( std::vector<std::string>::const_iterator payloadBegin = jecPayloadNames_.begin(),
-	  payloadEnd = jecPayloadNames_.end(), ipayload = payloadBegin; ipayload != payloadEnd; ++ipayload ) {
-    JetCorrectorParameters pars(*ipayload);
-    vPar.push_back(pars);
+  // If the JetCorrectorService is configured, the payloads are shared with
+  // all the other modules of the job, and the correctors are per-stream
+  edm::Service<JME::JetCorrectorService> jetCorrectorService;
+  if ( jetCorrectorService.isAvailable() ) {
+    jecParameters_ = jetCorrectorService->parameters(jecPayloadNames_);
   }
-  
-  // Make the FactorizedJetCorrector and Uncertainty
-  jec_ = boost::shared_ptr<FactorizedJetCorrector> ( new FactorizedJetCorrector(vPar) );
+  else {
+    //Get the factorized jet corrector parameters. 
+    std::vector<JetCorrectorParameters> vPar;
+    for ( std::vector<std::string>::const_iterator payloadBegin = jecPayloadNames_.begin(),
+	    payloadEnd = jecPayloadNames_.end(), ipayload = payloadBegin; ipayload != payloadEnd; ++ipayload ) {
+      JetCorrectorParameters pars(*ipayload);
+      vPar.push_back(pars);
+    }
+
+    // Make the FactorizedJetCorrector
+    jec_ = boost::shared_ptr<FactorizedJetCorrector> ( new FactorizedJetCorrector(vPar) );
+  }
+
+  // Make the Uncertainty
   jecUnc_ = boost::shared_ptr<JetCorrectionUncertainty>( new JetCorrectionUncertainty(jecUncName_) );
 
 }
@@ -63,6 +73,13 @@ void JetCorrectionsOnTheFly::analyze(edm::Event const& evt, edm::EventSetup cons
   edm::Handle< std::vector<reco::Vertex> > h_pv;
   evt.getByLabel( pvSrc_, h_pv );  
 
+  // Get the corrector, either our own or the one of this stream from the JetCorrectorService
+  FactorizedJetCorrector* jec = jec_.get();
+  if ( jecParameters_ ) {
+    edm::Service<JME::JetCorrectorService> jetCorrectorService;
+    jec = &jetCorrectorService->corrector( jecParameters_, evt.streamID() );
+  }
+
   // Loop over jets, get the correction, and plot
   // the corrected jet pt
   for ( edm::View<reco::Jet>::const_iterator ibegin = h_jets->begin(),
@@ -84,13 +101,13 @@ void JetCorrectionsOnTheFly::analyze(edm::Event const& evt, edm::EventSetup cons
     // Get the correction itself. This needs the jet area,
     // the rho value, and the number of primary vertices to
     // run the correction. 
-    jec_->setJetEta( uncorrJet.eta() );
-    jec_->setJetPt ( uncorrJet.pt() );
-    jec_->setJetE  ( uncorrJet.energy() );
-    jec_->setJetA  ( ijet->jetArea() );
-    jec_->setRho   ( *(h_rho.product()) );
-    jec_->setNPV   ( h_pv->size() );
-    double corr = jec_->getCorrection();
+    jec->setJetEta( uncorrJet.eta() );
+    jec->setJetPt ( uncorrJet.pt() );
+    jec->setJetE  ( uncorrJet.energy() );
+    jec->setJetA  ( ijet->jetArea() );
+    jec->setRho   ( *(h_rho.product()) );
+    jec->setNPV   ( h_pv->size() );
+    double corr = jec->getCorrection();
 
     // Now access the uncertainty on the jet energy correction.
     // Pass the corrected jet pt to the "setJetPt" method. 
@@ -12,6 +12,7 @@
 #include "CondFormats/JetMETObjects/interface/JetCorrectionUncertainty.h"
 #include "CondFormats/JetMETObjects/interface/FactorizedJetCorrector.h"
 #include "CondFormats/JetMETObjects/interface/JetCorrectorParameters.h"
+#include "JMEAnalysis/JMEValidator/interface/JetCorrectorService.h"
 #include <boost/shared_ptr.hpp>
 
 class JetCorrectionsOnTheFly : public edm::EDAnalyzer 
@@ -37,5 +38,6 @@ class JetCorrectionsOnTheFly : public edm::EDAnalyzer
 
        boost::shared_ptr<JetCorrectionUncertainty> jecUnc_;
        boost::shared_ptr<FactorizedJetCorrector> jec_;
+       JME::JetCorrectorService::Handle jecParameters_;
    };
 #endif
@@ -0,0 +1,318 @@
+////////////////////////////////////////////////////////////////////////////////
+//
+// MuonGridIsolationProducer
+// -------------------------
+//
+// Charged hadron (CH), neutral hadron (NH), photon (Ph) and charged pileup (PU)
+// isolation sums of muons, for several cone sizes, in one pass over the packed
+// candidates. The candidates are binned once per event in an eta-phi grid with
+// cells as large as the largest cone, so that only the 3x3 cells around a muon
+// are visited.
+//
+// The candidate categories, cone vetoes and thresholds are those of the
+// isoDepositReplace + CandIsolatorFromDeposits sequences built by
+// load_muonPFiso_sequence:
+//   CH: charge != 0 and fromPV >= 2, veto 0.0001, threshold 0.0
+//   NH: charge == 0 and pdgId != 22, veto 0.01,   threshold 0.5
+//   Ph: pdgId == 22,                 veto 0.01,   threshold 0.5
+//   PU: charge != 0 and fromPV <= 1, veto 0.01,   threshold 0.5
+// A candidate contributes if veto <= dR < cone and weight * pt > threshold.
+//
+// Output: one ValueMap<double> per component and cone, with instance label
+// <component>R<cone>, the cone written as with %g and the dot replaced by a p,
+// e.g. CHR0p4 for the CH sum in a cone of 0.4 and CHR1 in a cone of 1.0 (see
+// gridIsolationLabel in MuonPFIsolationSequence_cff.py)
+////////////////////////////////////////////////////////////////////////////////
+
+
+#include "FWCore/Framework/interface/Frameworkfwd.h"
+#include "FWCore/Framework/interface/EDProducer.h"
+#include "FWCore/Framework/interface/Event.h"
+#include "FWCore/Framework/interface/EventSetup.h"
+#include "FWCore/Framework/interface/MakerMacros.h"
+
+#include "FWCore/ParameterSet/interface/ParameterSet.h"
+
+#include "DataFormats/Common/interface/Handle.h"
+#include "DataFormats/Common/interface/ValueMap.h"
+#include "DataFormats/Common/interface/View.h"
+#include "DataFormats/Candidate/interface/Candidate.h"
+#include "DataFormats/PatCandidates/interface/PackedCandidate.h"
+#include "DataFormats/Math/interface/deltaPhi.h"
+
+#include <algorithm>
+#include <cmath>
+#include <memory>
+#include <sstream>
+#include <string>
+#include <vector>
+
+
+////////////////////////////////////////////////////////////////////////////////
+// class definition
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+class MuonGridIsolationProducer : public edm::EDProducer
+{
+public:
+  // construction/destruction
+  MuonGridIsolationProducer(const edm::ParameterSet& iConfig);
+  ~MuonGridIsolationProducer() {;}
+
+  // member functions
+  void produce(edm::Event& iEvent,const edm::EventSetup& iSetup);
+
+private:
+  enum Component { CH = 0, NH, PH, PU, N_COMPONENTS };
+
+  // Isolation component a candidate contributes to
+  static Component component(const pat::PackedCandidate& candidate);
+
+  size_t etaCell(double eta) const;
+  size_t phiCell(double phi) const;
+
+  // member data
+  edm::EDGetTokenT<edm::View<reco::Candidate>> src_;
+  edm::EDGetTokenT<std::vector<pat::PackedCandidate>> srcCandidates_;
+  // Optional, per-candidate weights (e.g. PUPPI), keyed by srcCandidates
+  edm::EDGetTokenT<edm::ValueMap<float>> srcWeights_;
+
+  std::vector<double> cones_;
+  std::vector<std::string> instances_[N_COMPONENTS];
+  double vetos2_[N_COMPONENTS];
+  double thresholds_[N_COMPONENTS];
+
+  // Grid
+  double etaMax_;
+  double cellSize_;
+  size_t nEta_;
+  size_t nPhi_;
+
+  // Binned candidates, sorted by cell, reused from event to event
+  std::vector<size_t> cellStart_;
+  std::vector<float> eta_;
+  std::vector<float> phi_;
+  std::vector<float> pt_;
+  std::vector<int> component_;
+};
+
+
+////////////////////////////////////////////////////////////////////////////////
+// construction/destruction
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+MuonGridIsolationProducer::MuonGridIsolationProducer(const edm::ParameterSet& iConfig)
+  : src_(consumes<edm::View<reco::Candidate>>(iConfig.getParameter<edm::InputTag>("src")))
+  , srcCandidates_(consumes<std::vector<pat::PackedCandidate>>(iConfig.getParameter<edm::InputTag>("srcCandidates")))
+  , cones_(iConfig.getParameter<std::vector<double>>("cones"))
+{
+  if (iConfig.existsAs<edm::InputTag>("srcWeights"))
+    srcWeights_ = consumes<edm::ValueMap<float>>(iConfig.getParameter<edm::InputTag>("srcWeights"));
+
+  if (cones_.empty())
+    throw edm::Exception(edm::errors::Configuration, "MuonGridIsolationProducer: cones is empty");
+
+  // Vetoes and thresholds, in the order CH, NH, Ph, PU
+  std::vector<double> vetos = {0.0001, 0.01, 0.01, 0.01};
+  std::vector<double> thresholds = {0.0, 0.5, 0.5, 0.5};
+  if (iConfig.existsAs<std::vector<double>>("vetos"))
+    vetos = iConfig.getParameter<std::vector<double>>("vetos");
+  if (iConfig.existsAs<std::vector<double>>("thresholds"))
+    thresholds = iConfig.getParameter<std::vector<double>>("thresholds");
+  if (vetos.size() != N_COMPONENTS || thresholds.size() != N_COMPONENTS)
+    throw edm::Exception(edm::errors::Configuration, "MuonGridIsolationProducer: vetos and thresholds must have 4 values (CH, NH, Ph, PU)");
+
+  const std::vector<std::string> names = {"CH", "NH", "Ph", "PU"};
+  for (size_t c = 0; c < N_COMPONENTS; c++) {
+    vetos2_[c] = vetos[c] * vetos[c];
+    thresholds_[c] = thresholds[c];
+
+    for (double cone: cones_) {
+      // 0.4 -> R0p4, 1.0 -> R1 (default stream precision, as %g)
+      std::ostringstream label;
+      label << cone;
+      std::string digits = label.str();
+      std::replace(digits.begin(), digits.end(), '.', 'p');
+
+      instances_[c].push_back(names[c] + "R" + digits);
+      produces<edm::ValueMap<double>>(instances_[c].back());
+    }
+  }
+
+  // Cells at least as large as the largest cone: all the candidates in a cone
+  // are in the 3x3 cells around the muon
+  etaMax_   = iConfig.existsAs<double>("etaMax") ? iConfig.getParameter<double>("etaMax") : 5.0;
+  cellSize_ = *std::max_element(cones_.begin(), cones_.end());
+  nEta_     = std::max<size_t>(1, std::floor(2 * etaMax_ / cellSize_));
+  nPhi_     = std::max<size_t>(1, std::floor(2 * M_PI / cellSize_));
+}
+
+
+////////////////////////////////////////////////////////////////////////////////
+// implementation of member functions
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+MuonGridIsolationProducer::Component MuonGridIsolationProducer::component(const pat::PackedCandidate& candidate)
+{
+  if (candidate.charge() != 0)
+    return (candidate.fromPV() >= 2) ? CH : PU;
+  if (candidate.pdgId() == 22)
+    return PH;
+  return NH;
+}
+
+
+//______________________________________________________________________________
+size_t MuonGridIsolationProducer::etaCell(double eta) const
+{
+  // Candidates beyond etaMax go to the first or last cell, which keeps
+  // neighbours in eta in neighbouring cells
+  double x = (eta + etaMax_) / (2 * etaMax_) * nEta_;
+  if (x < 0)
+    return 0;
+  return std::min<size_t>(x, nEta_ - 1);
+}
+
+
+//______________________________________________________________________________
+size_t MuonGridIsolationProducer::phiCell(double phi) const
+{
+  double x = (phi + M_PI) / (2 * M_PI) * nPhi_;
+  if (x < 0)
+    return 0;
+  return std::min<size_t>(x, nPhi_ - 1);
+}
+
+
+//______________________________________________________________________________
+void MuonGridIsolationProducer::produce(edm::Event& iEvent,const edm::EventSetup& iSetup)
+{
+  edm::Handle<edm::View<reco::Candidate>> muons;
+  edm::Handle<std::vector<pat::PackedCandidate>> candidates;
+  edm::Handle<edm::ValueMap<float>> weights;
+
+  iEvent.getByToken(src_, muons);
+  iEvent.getByToken(srcCandidates_, candidates);
+  if (!srcWeights_.isUninitialized())
+    iEvent.getByToken(srcWeights_, weights);
+
+  // Bin the candidates passing the thresholds, with a counting sort on the cell index
+  const size_t nCells = nEta_ * nPhi_;
+  const size_t nCandidates = candidates->size();
+
+  std::vector<size_t> cells;
+  std::vector<float> pts;
+  std::vector<Component> components;
+  std::vector<size_t> indices;
+  cells.reserve(nCandidates);
+  pts.reserve(nCandidates);
+  components.reserve(nCandidates);
+  indices.reserve(nCandidates);
+
+  cellStart_.assign(nCells + 1, 0);
+  for (size_t i = 0; i < nCandidates; i++) {
+    const pat::PackedCandidate& candidate = (*candidates)[i];
+    Component c = component(candidate);
+
+    float pt = candidate.pt();
+    if (weights.isValid())
+      pt *= weights->get(candidates.id(), i);
+    if (pt <= thresholds_[c])
+      continue;
+
+    size_t cell = etaCell(candidate.eta()) * nPhi_ + phiCell(candidate.phi());
+    cells.push_back(cell);
+    pts.push_back(pt);
+    components.push_back(c);
+    indices.push_back(i);
+    cellStart_[cell + 1]++;
+  }
+
+  for (size_t cell = 0; cell < nCells; cell++)
+    cellStart_[cell + 1] += cellStart_[cell];
+
+  const size_t nBinned = cells.size();
+  eta_.resize(nBinned);
+  phi_.resize(nBinned);
+  pt_.resize(nBinned);
+  component_.resize(nBinned);
+
+  std::vector<size_t> next(cellStart_.begin(), cellStart_.end() - 1);
+  for (size_t j = 0; j < nBinned; j++) {
+    size_t k = next[cells[j]]++;
+    const pat::PackedCandidate& candidate = (*candidates)[indices[j]];
+    eta_[k] = candidate.eta();
+    phi_[k] = candidate.phi();
+    pt_[k] = pts[j];
+    component_[k] = components[j];
+  }
+
+  // Sums, [cone][component][muon]
+  const size_t nCones = cones_.size();
+  const size_t nMuons = muons->size();
+  std::vector<double> cones2(nCones);
+  for (size_t r = 0; r < nCones; r++)
+    cones2[r] = cones_[r] * cones_[r];
+
+  std::vector<std::vector<std::vector<double>>> sums(nCones,
+      std::vector<std::vector<double>>(N_COMPONENTS, std::vector<double>(nMuons, 0.)));
+
+  // Neighbouring cells in phi, without duplicates when there are less than 3
+  std::vector<size_t> phiCells;
+  for (size_t m = 0; m < nMuons; m++) {
+    const reco::Candidate& muon = (*muons)[m];
+    const double muonEta = muon.eta();
+    const double muonPhi = muon.phi();
+
+    const size_t ie = etaCell(muonEta);
+    const size_t ip = phiCell(muonPhi);
+
+    phiCells.clear();
+    for (int dp = -1; dp <= 1; dp++) {
+      size_t p = (ip + nPhi_ + dp) % nPhi_;
+      if (std::find(phiCells.begin(), phiCells.end(), p) == phiCells.end())
+        phiCells.push_back(p);
+    }
+
+    for (size_t e = (ie > 0) ? ie - 1 : 0; e <= std::min(ie + 1, nEta_ - 1); e++) {
+      for (size_t p: phiCells) {
+        const size_t cell = e * nPhi_ + p;
+        for (size_t k = cellStart_[cell]; k < cellStart_[cell + 1]; k++) {
+          const double dEta = eta_[k] - muonEta;
+          const double dPhi = reco::deltaPhi(double(phi_[k]), muonPhi);
+          const double dR2 = dEta * dEta + dPhi * dPhi;
+
+          const int c = component_[k];
+          if (dR2 < vetos2_[c])
+            continue;
+
+          for (size_t r = 0; r < nCones; r++) {
+            if (dR2 < cones2[r])
+              sums[r][c][m] += pt_[k];
+          }
+        }
+      }
+    }
+  }
+
+  for (size_t c = 0; c < N_COMPONENTS; c++) {
+    for (size_t r = 0; r < nCones; r++) {
+      std::auto_ptr<edm::ValueMap<double>> valueMap(new edm::ValueMap<double>());
+      edm::ValueMap<double>::Filler filler(*valueMap);
+      filler.insert(muons, sums[r][c].begin(), sums[r][c].end());
+      filler.fill();
+
+      iEvent.put(valueMap, instances_[c][r]);
+    }
+  }
+}
+
+
+////////////////////////////////////////////////////////////////////////////////
+// plugin definition
+////////////////////////////////////////////////////////////////////////////////
+
+DEFINE_FWK_MODULE(MuonGridIsolationProducer);
@@ -0,0 +1,125 @@
+////////////////////////////////////////////////////////////////////////////////
+//
+// MuonIsolationRecordProducer
+// ---------------------------
+//
+// Collect the isolation sums of all the flavours (STAND, PFWGT, PUPPI,
+// NOMUONPUPPI) in one record per muon, aligned by index with the muons. Each
+// configured sum is still read from its ValueMap, once per muon: this module
+// gathers the lookups in one place, it does not save them
+////////////////////////////////////////////////////////////////////////////////
+
+
+#include "FWCore/Framework/interface/Frameworkfwd.h"
+#include "FWCore/Framework/interface/EDProducer.h"
+#include "FWCore/Framework/interface/Event.h"
+#include "FWCore/Framework/interface/EventSetup.h"
+#include "FWCore/Framework/interface/MakerMacros.h"
+
+#include "FWCore/ParameterSet/interface/ParameterSet.h"
+
+#include "DataFormats/Common/interface/Handle.h"
+#include "DataFormats/Common/interface/ValueMap.h"
+#include "DataFormats/Common/interface/View.h"
+#include "DataFormats/Candidate/interface/Candidate.h"
+
+#include "JMEAnalysis/JMEValidator/interface/MuonIsolationRecord.h"
+
+#include <memory>
+#include <string>
+#include <vector>
+
+
+////////////////////////////////////////////////////////////////////////////////
+// class definition
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+class MuonIsolationRecordProducer : public edm::EDProducer
+{
+public:
+  // construction/destruction
+  MuonIsolationRecordProducer(const edm::ParameterSet& iConfig);
+  ~MuonIsolationRecordProducer() {;}
+
+  // member functions
+  void produce(edm::Event& iEvent,const edm::EventSetup& iSetup);
+
+private:
+  typedef JME::MuonIsolationRecord Record;
+
+  // member data
+  edm::EDGetTokenT<edm::View<reco::Candidate>> src_;
+  // Uninitialized for the sums not configured
+  edm::EDGetTokenT<edm::ValueMap<double>> srcSums_[Record::N_FLAVOURS][Record::N_COMPONENTS];
+};
+
+
+////////////////////////////////////////////////////////////////////////////////
+// construction/destruction
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+MuonIsolationRecordProducer::MuonIsolationRecordProducer(const edm::ParameterSet& iConfig)
+  : src_(consumes<edm::View<reco::Candidate>>(iConfig.getParameter<edm::InputTag>("src")))
+{
+  // One optional PSet per flavour, with optional CH, NH, Ph and PU ValueMaps
+  const std::vector<std::string> flavours = {"STAND", "PFWGT", "PUPPI", "NOMUONPUPPI"};
+  const std::vector<std::string> components = {"CH", "NH", "Ph", "PU"};
+
+  for (size_t f = 0; f < Record::N_FLAVOURS; f++) {
+    if (!iConfig.existsAs<edm::ParameterSet>(flavours[f]))
+      continue;
+
+    const edm::ParameterSet& flavour = iConfig.getParameter<edm::ParameterSet>(flavours[f]);
+    for (size_t c = 0; c < Record::N_COMPONENTS; c++) {
+      if (flavour.existsAs<edm::InputTag>(components[c]))
+        srcSums_[f][c] = consumes<edm::ValueMap<double>>(flavour.getParameter<edm::InputTag>(components[c]));
+    }
+  }
+
+  produces<JME::MuonIsolationRecordCollection>();
+}
+
+
+////////////////////////////////////////////////////////////////////////////////
+// implementation of member functions
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+void MuonIsolationRecordProducer::produce(edm::Event& iEvent,const edm::EventSetup& iSetup)
+{
+  edm::Handle<edm::View<reco::Candidate>> muons;
+  iEvent.getByToken(src_, muons);
+
+  const size_t nMuons = muons->size();
+  std::auto_ptr<JME::MuonIsolationRecordCollection> records(new JME::MuonIsolationRecordCollection(nMuons));
+
+  // ValueMap keys of the muons, computed once for all the sums
+  std::vector<edm::Ptr<reco::Candidate>> muonPtrs;
+  muonPtrs.reserve(nMuons);
+  for (size_t i = 0; i < nMuons; i++)
+    muonPtrs.push_back(muons->ptrAt(i));
+
+  for (size_t f = 0; f < Record::N_FLAVOURS; f++) {
+    for (size_t c = 0; c < Record::N_COMPONENTS; c++) {
+      if (srcSums_[f][c].isUninitialized())
+        continue;
+
+      edm::Handle<edm::ValueMap<double>> sums;
+      iEvent.getByToken(srcSums_[f][c], sums);
+
+      for (size_t i = 0; i < nMuons; i++)
+        (*records)[i].sums[f][c] = sums->get(muonPtrs[i].id(), muonPtrs[i].key());
+    }
+  }
+
+  iEvent.put(records);
+}
+
+
+////////////////////////////////////////////////////////////////////////////////
+// plugin definition
+////////////////////////////////////////////////////////////////////////////////
+
+DEFINE_FWK_MODULE(MuonIsolationRecordProducer);
@@ -0,0 +1,164 @@
+////////////////////////////////////////////////////////////////////////////////
+//
+// PackedCandidatePartitionProducer
+// --------------------------------
+//
+// Split the packed candidates, in one pass, into the collections used as
+// isolation and PUPPI inputs. Each partition is a std::vector of Ptrs (like
+// the output of a CandPtrSelector), put as an instance named after it:
+//
+//   CHLV     fromPV>=2 && abs(charge) > 0       charged from the leading vertex
+//   CHPU     fromPV<=1 && abs(charge) > 0       charged from pileup
+//   Photons  pdgId==22
+//   NH       pdgId!=22 && abs(charge) == 0
+//   WoMuon   fromPV>=2 && abs(pdgId)!=13
+//
+// The optional 'partitions' vstring restricts the instances produced.
+////////////////////////////////////////////////////////////////////////////////
+
+
+#include "FWCore/Framework/interface/Frameworkfwd.h"
+#include "FWCore/Framework/interface/EDProducer.h"
+#include "FWCore/Framework/interface/Event.h"
+#include "FWCore/Framework/interface/EventSetup.h"
+#include "FWCore/Framework/interface/MakerMacros.h"
+
+#include "FWCore/ParameterSet/interface/ParameterSet.h"
+#include "FWCore/Utilities/interface/EDMException.h"
+
+#include "DataFormats/Common/interface/Handle.h"
+#include "DataFormats/Common/interface/Ptr.h"
+#include "DataFormats/Candidate/interface/Candidate.h"
+#include "DataFormats/PatCandidates/interface/PackedCandidate.h"
+
+#include <cstdlib>
+#include <memory>
+#include <string>
+#include <vector>
+
+
+////////////////////////////////////////////////////////////////////////////////
+// class definition
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+class PackedCandidatePartitionProducer : public edm::EDProducer
+{
+public:
+  // construction/destruction
+  PackedCandidatePartitionProducer(const edm::ParameterSet& iConfig);
+  ~PackedCandidatePartitionProducer() {;}
+
+  // member functions
+  void produce(edm::Event& iEvent,const edm::EventSetup& iSetup);
+
+private:
+  typedef std::vector<edm::Ptr<reco::Candidate>> CandPtrCollection;
+
+  enum Partition {
+    CHLV = 0,
+    CHPU,
+    PHOTONS,
+    NH,
+    WOMUON,
+    N_PARTITIONS
+  };
+
+  static const char* names_[N_PARTITIONS];
+
+  // member data
+  edm::EDGetTokenT<std::vector<pat::PackedCandidate>> src_;
+
+  bool enabled_[N_PARTITIONS];
+};
+
+
+const char* PackedCandidatePartitionProducer::names_[N_PARTITIONS] = {"CHLV", "CHPU", "Photons", "NH", "WoMuon"};
+
+
+////////////////////////////////////////////////////////////////////////////////
+// construction/destruction
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+PackedCandidatePartitionProducer::PackedCandidatePartitionProducer(const edm::ParameterSet& iConfig)
+  : src_(consumes<std::vector<pat::PackedCandidate>>(iConfig.getParameter<edm::InputTag>("src")))
+{
+  std::vector<std::string> partitions(names_, names_ + N_PARTITIONS);
+  if (iConfig.existsAs<std::vector<std::string>>("partitions"))
+    partitions = iConfig.getParameter<std::vector<std::string>>("partitions");
+
+  for (size_t p = 0; p < N_PARTITIONS; p++)
+    enabled_[p] = false;
+
+  for (const std::string& partition: partitions) {
+    size_t p = 0;
+    while (p < N_PARTITIONS && partition != names_[p])
+      p++;
+
+    if (p == N_PARTITIONS)
+      throw edm::Exception(edm::errors::Configuration) << "Unknown packed candidate partition '" << partition << "'";
+
+    enabled_[p] = true;
+  }
+
+  for (size_t p = 0; p < N_PARTITIONS; p++) {
+    if (enabled_[p])
+      produces<CandPtrCollection>(names_[p]);
+  }
+}
+
+
+////////////////////////////////////////////////////////////////////////////////
+// implementation of member functions
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+void PackedCandidatePartitionProducer::produce(edm::Event& iEvent,const edm::EventSetup& iSetup)
+{
+  edm::Handle<std::vector<pat::PackedCandidate>> cands;
+  iEvent.getByToken(src_, cands);
+
+  const size_t nCands = cands->size();
+
+  std::auto_ptr<CandPtrCollection> partitions[N_PARTITIONS];
+  for (size_t p = 0; p < N_PARTITIONS; p++) {
+    if (!enabled_[p])
+      continue;
+
+    partitions[p].reset(new CandPtrCollection());
+    partitions[p]->reserve(nCands);
+  }
+
+  for (size_t i = 0; i < nCands; i++) {
+    const pat::PackedCandidate& cand = (*cands)[i];
+
+    const bool charged = (cand.charge() != 0);
+    const bool fromLV = (cand.fromPV() >= 2);
+    const int pdgId = cand.pdgId();
+
+    bool selected[N_PARTITIONS];
+    selected[CHLV] = charged && fromLV;
+    selected[CHPU] = charged && !fromLV;
+    selected[PHOTONS] = (pdgId == 22);
+    selected[NH] = !charged && pdgId != 22;
+    selected[WOMUON] = fromLV && std::abs(pdgId) != 13;
+
+    for (size_t p = 0; p < N_PARTITIONS; p++) {
+      if (enabled_[p] && selected[p])
+        partitions[p]->push_back(edm::Ptr<reco::Candidate>(cands, i));
+    }
+  }
+
+  for (size_t p = 0; p < N_PARTITIONS; p++) {
+    if (enabled_[p])
+      iEvent.put(partitions[p], names_[p]);
+  }
+}
+
+
+////////////////////////////////////////////////////////////////////////////////
+// plugin definition
+////////////////////////////////////////////////////////////////////////////////
+
+DEFINE_FWK_MODULE(PackedCandidatePartitionProducer);
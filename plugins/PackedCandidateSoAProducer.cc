@@ -0,0 +1,130 @@
+////////////////////////////////////////////////////////////////////////////////
+//
+// PackedCandidateSoAProducer
+// --------------------------
+//
+// Build, once per event, the struct-of-arrays view of the packed candidates
+// and the vertex quantities used by the analyzers
+////////////////////////////////////////////////////////////////////////////////
+
+
+#include "FWCore/Framework/interface/Frameworkfwd.h"
+#include "FWCore/Framework/interface/EDProducer.h"
+#include "FWCore/Framework/interface/Event.h"
+#include "FWCore/Framework/interface/EventSetup.h"
+#include "FWCore/Framework/interface/MakerMacros.h"
+
+#include "FWCore/ParameterSet/interface/ParameterSet.h"
+
+#include "DataFormats/Common/interface/Handle.h"
+#include "DataFormats/PatCandidates/interface/PackedCandidate.h"
+#include "DataFormats/VertexReco/interface/Vertex.h"
+
+#include "JMEAnalysis/JMEValidator/interface/PackedCandidateSoA.h"
+#include "JMEAnalysis/JMEValidator/interface/SortedVertices.h"
+
+#include <cmath>
+#include <memory>
+#include <vector>
+
+
+////////////////////////////////////////////////////////////////////////////////
+// class definition
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+class PackedCandidateSoAProducer : public edm::EDProducer
+{
+public:
+  // construction/destruction
+  PackedCandidateSoAProducer(const edm::ParameterSet& iConfig);
+  ~PackedCandidateSoAProducer() {;}
+
+  // member functions
+  void produce(edm::Event& iEvent,const edm::EventSetup& iSetup);
+
+private:
+  // member data
+  edm::EDGetTokenT<std::vector<pat::PackedCandidate>> src_;
+  edm::EDGetTokenT<std::vector<reco::Vertex>> srcVtx_;
+
+  JME::SortedVertices sortedVertices_;
+};
+
+
+////////////////////////////////////////////////////////////////////////////////
+// construction/destruction
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+PackedCandidateSoAProducer::PackedCandidateSoAProducer(const edm::ParameterSet& iConfig)
+  : src_(consumes<std::vector<pat::PackedCandidate>>(iConfig.getParameter<edm::InputTag>("src")))
+  , srcVtx_(consumes<std::vector<reco::Vertex>>(iConfig.getParameter<edm::InputTag>("srcVtx")))
+{
+  produces<JME::PackedCandidateSoA>();
+}
+
+
+////////////////////////////////////////////////////////////////////////////////
+// implementation of member functions
+////////////////////////////////////////////////////////////////////////////////
+
+//______________________________________________________________________________
+void PackedCandidateSoAProducer::produce(edm::Event& iEvent,const edm::EventSetup& iSetup)
+{
+  edm::Handle<std::vector<pat::PackedCandidate>> cands;
+  edm::Handle<std::vector<reco::Vertex>> vtx;
+
+  iEvent.getByToken(src_, cands);
+  iEvent.getByToken(srcVtx_, vtx);
+
+  std::auto_ptr<JME::PackedCandidateSoA> soa(new JME::PackedCandidateSoA());
+
+  // Vertices
+  for (const auto& v: *vtx) {
+    if (!v.isFake() && v.ndof()>=4 && fabs(v.z())<=24)
+      soa->nGoodVertices++;
+  }
+
+  sortedVertices_.update(*vtx);
+  soa->vertexZ.assign(sortedVertices_.z().begin(), sortedVertices_.z().end());
+
+  // Candidates
+  size_t nCands = cands->size();
+  soa->source = cands.id();
+  soa->pt.reserve(nCands);
+  soa->eta.reserve(nCands);
+  soa->phi.reserve(nCands);
+  soa->charge.reserve(nCands);
+  soa->fromPV.reserve(nCands);
+  soa->dz.reserve(nCands);
+  soa->dzClosest.reserve(nCands);
+
+  for (const auto& cand: *cands) {
+    soa->pt.push_back(cand.pt());
+    soa->eta.push_back(cand.eta());
+    soa->phi.push_back(cand.phi());
+    soa->charge.push_back(cand.charge());
+
+    // Vertex information is only meaningful for charged candidates
+    if (cand.charge() != 0) {
+      soa->fromPV.push_back(cand.fromPV());
+      soa->dz.push_back(cand.dz());
+      soa->dzClosest.push_back(sortedVertices_.closestDz(cand, cand.dz()));
+    }
+    else {
+      soa->fromPV.push_back(-1);
+      soa->dz.push_back(0);
+      soa->dzClosest.push_back(0);
+    }
+  }
+
+  iEvent.put(soa);
+}
+
+
+////////////////////////////////////////////////////////////////////////////////
+// plugin definition
+////////////////////////////////////////////////////////////////////////////////
+
+DEFINE_FWK_MODULE(PackedCandidateSoAProducer);
@@ -0,0 +1,24 @@
+////////////////////////////////////////////////////////////////////////////////
+//
+// SealModule
+// ----------
+//
+// Plugin definitions of the analyzers and services implemented in the package
+// library (src/), which is a regular library so that the producers of this
+// directory can link against it.
+////////////////////////////////////////////////////////////////////////////////
+
+#include "FWCore/Framework/interface/MakerMacros.h"
+#include "FWCore/ServiceRegistry/interface/ServiceMaker.h"
+
+#include "JMEAnalysis/JMEValidator/interface/JetCorrectorService.h"
+#include "JMEAnalysis/JMEValidator/interface/JetMETAnalyzer.h"
+#include "JMEAnalysis/JMEValidator/interface/LeptonsAndMETAnalyzer.h"
+#include "JMEAnalysis/JMEValidator/interface/puppiAnalyzer.h"
+
+DEFINE_FWK_MODULE(JetMETAnalyzer);
+DEFINE_FWK_MODULE(LeptonsAndMETAnalyzer);
+DEFINE_FWK_MODULE(puppiAnalyzer);
+
+typedef JME::JetCorrectorService JetCorrectorService;
+DEFINE_FWK_SERVICE(JetCorrectorService);
@@ -3,6 +3,17 @@
 // convertPackedCandToRecoCand
 // ---------------------------
 //
+// Convert the packed candidates to reco::PFCandidates, for the modules
+// (PF2PAT, isolation) which need a PFCandidateCollection. Additional subsets
+// can be emitted in the same pass, as instances selected with a string cut:
+//
+//   selections = cms.VPSet(
+//       cms.PSet(instance = cms.string('WoMuon'), cut = cms.string('fromPV>=2 && abs(pdgId)!=13'))
+//   )
+//
+// Modules which only need the reco::Candidate interface should read the
+// packed candidates directly instead.
+//
 //                          01/08/2015 Alexx Perloff <aperloff@physics.tamu.edu>
 ////////////////////////////////////////////////////////////////////////////////
 
@@ -14,18 +25,16 @@
 #include "FWCore/Framework/interface/MakerMacros.h"
  
 #include "FWCore/ParameterSet/interface/ParameterSet.h"
-#include "FWCore/MessageLogger/interface/MessageLogger.h"
-#include "FWCore/ServiceRegistry/interface/Service.h"
  
 #include "DataFormats/Common/interface/Handle.h"
-#include "DataFormats/Candidate/interface/Candidate.h"
-#include "DataFormats/Candidate/interface/CandidateFwd.h"
 #include "DataFormats/ParticleFlowCandidate/interface/PFCandidate.h"
-#include "DataFormats/PatCandidates/interface/CompositeCandidate.h"
 #include "DataFormats/PatCandidates/interface/PackedCandidate.h"
 
-#include <iostream>
+#include "CommonTools/Utils/interface/StringCutObjectSelector.h"
+
 #include <memory>
+#include <string>
+#include <vector>
 
 using namespace std;
 using namespace edm;
@@ -46,14 +55,15 @@ public:
   
   // member functions
   void produce(edm::Event& iEvent,const edm::EventSetup& iSetup);
-  void endJob();
 
 private:
-  // member data
-  edm::InputTag src_;
+  typedef StringCutObjectSelector<pat::PackedCandidate> Selector;
 
-  std::string  moduleName_;
+  // member data
+  edm::EDGetTokenT<vector<pat::PackedCandidate>> src_;
 
+  vector<string>   instances_;
+  vector<Selector> selectors_;
 };
 
 
@@ -65,11 +75,17 @@ private:
 
 //______________________________________________________________________________
 convertPackedCandToRecoCand::convertPackedCandToRecoCand(const edm::ParameterSet& iConfig)
-  : src_(iConfig.getParameter<InputTag>("src"))
-  , moduleName_(iConfig.getParameter<string>("@module_label"))
+  : src_(consumes<vector<pat::PackedCandidate>>(iConfig.getParameter<InputTag>("src")))
 {
-  //produces<reco::PFCandidateCollection>("convertedPackedPFCandidates");
   produces<reco::PFCandidateCollection>();
+
+  if (iConfig.existsAs<vector<ParameterSet>>("selections")) {
+    for (const auto& selection: iConfig.getParameter<vector<ParameterSet>>("selections")) {
+      instances_.push_back(selection.getParameter<string>("instance"));
+      selectors_.push_back(Selector(selection.getParameter<string>("cut"), true));
+      produces<reco::PFCandidateCollection>(instances_.back());
+    }
+  }
 }
 
 
@@ -80,37 +96,35 @@ convertPackedCandToRecoCand::convertPackedCandToRecoCand(const edm::ParameterSet
 //______________________________________________________________________________
 void convertPackedCandToRecoCand::produce(edm::Event& iEvent,const edm::EventSetup& iSetup)
 {
-
-  edm::Handle<vector<pat::PackedCandidate> > packedCands_;
-  //edm::Handle<View<Candidate> > packedCands_;
+  edm::Handle<vector<pat::PackedCandidate> > packedCands;
+  iEvent.getByToken(src_,packedCands);
   
-  iEvent.getByLabel(src_,packedCands_);
+  const size_t nCands = packedCands->size();
   
-  size_t nCands = (size_t)packedCands_->size();
-  
-  auto_ptr<reco::PFCandidateCollection> recoCands(new vector<reco::PFCandidate>);
+  auto_ptr<reco::PFCandidateCollection> recoCands(new reco::PFCandidateCollection);
+  recoCands->reserve(nCands);
+
+  // The subsets are at most as large as the full collection
+  vector<unique_ptr<reco::PFCandidateCollection>> subsets;
+  for (size_t i = 0; i < selectors_.size(); i++) {
+    subsets.push_back(unique_ptr<reco::PFCandidateCollection>(new reco::PFCandidateCollection));
+    subsets.back()->reserve(nCands);
+  }
 
   reco::PFCandidate dummy;
     
-  for(unsigned int iCand = 0; iCand<nCands; iCand++) {
-    //reco::CandidateBaseRef intCandBaseRef = packedCands_->at(iCand).masterClone();
-    //reco::PFCandidateRef intPFCandRef = intCandBaseRef.castTo<reco::PFCandidateRef>();
-    //recoCands->push_back(*intPFCandRef);
-    
-    //reco::PFCandidate intPFCand = static_cast<reco::PFCandidate>(packedCands_->at(iCand));
+  for (const pat::PackedCandidate& packedCand: *packedCands) {
+    recoCands->push_back(reco::PFCandidate(packedCand.charge(),packedCand.p4(),dummy.translatePdgIdToType(packedCand.pdgId())));
 
-    reco::PFCandidate intPFCand(packedCands_->at(iCand).charge(),packedCands_->at(iCand).p4(),dummy.translatePdgIdToType(packedCands_->at(iCand).pdgId()));
-    recoCands->push_back(intPFCand);
+    for (size_t i = 0; i < selectors_.size(); i++) {
+      if (selectors_[i](packedCand))
+        subsets[i]->push_back(recoCands->back());
+    }
   }
   
-  //iEvent.put(recoCands,"convertedPackedPFCandidates");
   iEvent.put(recoCands);
-}
-
-
-//______________________________________________________________________________
-void convertPackedCandToRecoCand::endJob()
-{
+  for (size_t i = 0; i < selectors_.size(); i++)
+    iEvent.put(auto_ptr<reco::PFCandidateCollection>(subsets[i].release()),instances_[i]);
 }
 
 
@@ -101,3 +101,32 @@ def load_muonPFiso_sequence(proc, seq_name, algo, coneR, src, src_charged_hadron
     iso_seq *= iso_vals_seq
 
     setattr(proc, seq_name, iso_seq)
+
+def gridIsolationLabel(component, cone):
+    """Instance label of a MuonGridIsolationProducer sum: 'CHR0p4' for the CH
+    sum in a cone of 0.4, 'CHR1' in a cone of 1.0 (same as the C++ side)"""
+
+    return '%sR%s' % (component, ('%g' % cone).replace('.', 'p'))
+
+def load_muonPFiso_grid(proc, name, src, cones, src_candidates='packedPFCandidates', src_weights=''):
+    """
+    Single-pass alternative to load_muonPFiso_sequence: CH, NH, Ph and PU sums
+    for all the cones at once, with the same vetoes and thresholds. The sums
+    are in the ValueMaps <name>:<gridIsolationLabel(component, cone)>, e.g.
+    <name>:CHR0p4.
+    src_weights is an optional ValueMap<float> of per-candidate weights (e.g.
+    PUPPI), keyed by src_candidates.
+    """
+
+    grid = cms.EDProducer('MuonGridIsolationProducer',
+        src = cms.InputTag(src),
+        srcCandidates = cms.InputTag(src_candidates),
+        cones = cms.vdouble(cones),
+        # CH, NH, Ph, PU
+        vetos = cms.vdouble(0.0001, 0.01, 0.01, 0.01),
+        thresholds = cms.vdouble(0.0, 0.5, 0.5, 0.5)
+    )
+    if src_weights != '':
+        grid.srcWeights = cms.InputTag(src_weights)
+
+    setattr(proc, name, grid)
@@ -0,0 +1,140 @@
+"""
+Cache of fully expanded cms.Process configurations.
+
+Building the framework configuration (PAT tools, jetToolbox, PUPPI, muon
+isolation) takes tens of seconds, at every cmsRun start and CRAB submission.
+cachedProcess runs the builder once and stores the expanded process
+(process.dumpPython()); the next calls with the same inputs read it back:
+
+    process = cachedProcess(buildProcess, inputs={'jetsCollections': jetsCollections},
+            dependencies=['JMEAnalysis.JetToolbox.jetToolbox_cff'])
+
+The cache key is the SHA-256 of:
+  - the inputs (any value with a stable repr, or cms objects)
+  - the source code of the builder
+  - the content of the python files of this package, and of the dependencies
+  - the CMSSW release
+
+Setting $JME_CONFIG_CACHE to an empty string disables the cache.
+"""
+
+import hashlib
+import inspect
+import os
+import tempfile
+
+# Default location of the cached configurations, overridable with $JME_CONFIG_CACHE
+CACHE_DIR = os.environ.get('JME_CONFIG_CACHE', os.path.join(tempfile.gettempdir(), 'jme-config-cache-%d' % os.getuid()))
+
+
+def _sourceFile(moduleName):
+    """Path of the source of a module, found without importing it."""
+
+    try:
+        try:
+            from importlib.util import find_spec
+        except ImportError:
+            # python 2
+            import pkgutil
+            loader = pkgutil.find_loader(moduleName)
+            fileName = loader.get_filename() if loader else None
+        else:
+            spec = find_spec(moduleName)
+            fileName = spec.origin if spec else None
+    except ImportError:
+        return None
+
+    if fileName and fileName.endswith('.pyc'):
+        fileName = fileName[:-1]
+    return fileName
+
+
+def _canonical(value):
+    """Stable string of an input value."""
+
+    if hasattr(value, 'dumpPython'):
+        return value.dumpPython()
+    if isinstance(value, dict):
+        return '{%s}' % ','.join('%r:%s' % (key, _canonical(value[key])) for key in sorted(value))
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ','.join(_canonical(item) for item in value)
+    return repr(value)
+
+
+def cacheKey(builder, inputs={}, dependencies=()):
+    sha = hashlib.sha256()
+
+    sha.update(_canonical(inputs).encode('utf-8'))
+    try:
+        sha.update(inspect.getsource(builder).encode('utf-8'))
+    except (IOError, TypeError):
+        # Builder defined in a file which cannot be read back
+        sha.update(builder.__code__.co_code)
+    sha.update(os.environ.get('CMSSW_VERSION', '').encode('utf-8'))
+
+    package = os.path.dirname(os.path.abspath(__file__))
+    files = [os.path.join(package, name) for name in sorted(os.listdir(package)) if name.endswith('.py')]
+    files += [_sourceFile(name) for name in dependencies]
+
+    for fileName in files:
+        sha.update(str(fileName).encode('utf-8'))
+        if fileName and os.path.isfile(fileName):
+            with open(fileName, 'rb') as f:
+                sha.update(f.read())
+
+    return sha.hexdigest()
+
+
+def _load(fileName):
+    namespace = {}
+    with open(fileName) as f:
+        exec(compile(f.read(), fileName, 'exec'), namespace)
+    return namespace['process']
+
+
+def _store(process, fileName):
+    """Write the expanded process under a temporary name and rename it, so that
+    concurrent jobs never see a partially written file."""
+
+    directory = os.path.dirname(fileName)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(process.dumpPython())
+        os.chmod(tmp, 0o644)
+        os.rename(tmp, fileName)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def cachedProcess(builder, inputs={}, dependencies=(), cacheDir=CACHE_DIR):
+    """Return builder(), read from the cache when the same process was already
+    built. A cache entry which cannot be read is rebuilt, and a process which
+    cannot be stored is returned anyway."""
+
+    if not cacheDir:
+        return builder()
+
+    fileName = os.path.join(cacheDir, cacheKey(builder, inputs, dependencies) + '_cfg.py')
+
+    if os.path.isfile(fileName):
+        try:
+            return _load(fileName)
+        except Exception as e:
+            print('Ignoring unreadable cached configuration %s: %s' % (fileName, e))
+
+    process = builder()
+
+    # The cache is only an optimization: an unwritable cache directory or a
+    # full disk must not abort the configuration
+    try:
+        _store(process, fileName)
+    except (OSError, IOError) as e:
+        print('Unable to cache the configuration in %s: %s' % (fileName, e))
+
+    return process
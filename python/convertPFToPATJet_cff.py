@@ -3,9 +3,6 @@ import FWCore.ParameterSet.Config as cms
 from RecoJets.JetProducers.ak4PFJets_cfi import ak4PFJets
 from RecoJets.JetProducers.ak4GenJets_cfi import ak4GenJets
 
-from PhysicsTools.PatAlgos.tools.jetTools import addJetCollection
-from PhysicsTools.PatAlgos.tools.jetTools import switchJetCollection
-
 #from PhysicsTools.PatAlgos.recoLayer0.jetCorrections_cff import *
 from PhysicsTools.PatAlgos.recoLayer0.jetCorrFactors_cfi import *
 #from JetMETCorrections.Configuration.JetCorrectionServicesAllAlgos_cff import *
@@ -13,6 +10,9 @@ from PhysicsTools.PatAlgos.recoLayer0.jetCorrFactors_cfi import *
 
 def convertPFToPATJet(proc, inputColl, outputColl, alg, r, corrAlgo, corrLevels):
 
+	# imported here, so that loading this file does not load the PAT tools
+	from PhysicsTools.PatAlgos.tools.jetTools import addJetCollection
+
 	addJetCollection(
 		proc,
 		labelName = outputColl,
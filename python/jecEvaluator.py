@@ -0,0 +1,348 @@
+"""
+Vectorized evaluation of the jet energy correction text payloads.
+
+The classes in this module mirror the CMSSW ``JetCorrectorParameters`` and
+``FactorizedJetCorrector`` semantics (bin lookup, clamping of the parameter
+variables to the validity range of each bin, level-by-level rescaling of the
+jet pt and energy), but evaluate the corrections on whole NumPy arrays at once,
+without the need of a CMSSW release.
+
+Example:
+
+    from JMEAnalysis.JMEValidator.jecEvaluator import FactorizedJetCorrector
+
+    jec = FactorizedJetCorrector.fromEra('PHYS14_V2_MC', 'AK4PFchs',
+                                         ['L1FastJet', 'L2Relative', 'L3Absolute'])
+    corr = jec.correction(JetEta=eta, JetPt=pt, JetA=area, Rho=rho)
+"""
+
+import collections
+import os
+import warnings
+
+import numpy as np
+
+from JMEAnalysis.JMEValidator.jecFormula import VARIABLES, compileFormula
+from JMEAnalysis.JMEValidator import jecGrid
+
+# Directory holding the text payloads shipped with the package
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'data')
+
+
+def payloadFileName(era, level, payload, directory=DATA_DIR):
+    """Return the path of the text payload for a given era, level and payload, e.g.
+    ('PHYS14_V2_MC', 'L1FastJet', 'AK4PFchs') -> data/PHYS14_V2_MC_L1FastJet_AK4PFchs.txt"""
+
+    return os.path.join(directory, '%s_%s_%s.txt' % (era, level, payload))
+
+
+def readSections(fileName):
+    """Read all the sections of a payload in one pass, e.g. the sources of a
+    multi-section uncertainty file. Return an ordered mapping section name ->
+    (definitions line, list of tokenized records). A payload without section
+    has a single section named ''."""
+
+    sections = collections.OrderedDict()
+    current = None
+
+    with open(fileName) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('['):
+                current = sections.setdefault(line.strip('[]').strip(), [None, []])
+                continue
+            if current is None:
+                current = sections.setdefault('', [None, []])
+            if line.startswith('{'):
+                current[0] = line
+                continue
+            current[1].append(line.split())
+
+    for name, (header, lines) in sections.items():
+        if header is None:
+            raise ValueError('No definitions found in %s (section %r)' % (fileName, name))
+
+    return collections.OrderedDict((name, tuple(content)) for name, content in sections.items())
+
+
+class Definitions(object):
+    """Header of a payload section: bin variables, parameter variables, formula and level."""
+
+    def __init__(self, header):
+        self.header = header.strip()
+        tokens = self.header.lstrip('{').rstrip('}').split()
+        if not tokens:
+            raise ValueError('Empty payload definitions')
+
+        nBinVar = int(tokens[0])
+        self.binVar = tokens[1:1 + nBinVar]
+        nParVar = int(tokens[1 + nBinVar])
+        self.parVar = tokens[2 + nBinVar:2 + nBinVar + nParVar]
+
+        remaining = tokens[2 + nBinVar + nParVar:]
+        if len(remaining) < 3:
+            raise ValueError('Malformed payload definitions: %r' % header)
+
+        self.formula = ' '.join(remaining[:-2])
+        self.isResponse = (remaining[-2] == 'Response')
+        self.level = remaining[-1]
+
+    def nBinVar(self):
+        return len(self.binVar)
+
+    def nParVar(self):
+        return len(self.parVar)
+
+
+class JetCorrectorParameters(object):
+    """One section of a JEC text payload, stored as contiguous arrays.
+
+    - ``xMin``, ``xMax``: (nRecords, nBinVar) bin boundaries
+    - ``parMin``, ``parMax``: (nRecords, nParVar) validity range of the parameter variables
+    - ``parameters``: (nRecords, nParameters) formula parameters (NaN padded)
+    """
+
+    def __init__(self, fileName, section=''):
+        self.fileName = fileName
+        self.section = section
+
+        header, lines = self._read(fileName, section)
+        self.definitions = Definitions(header)
+        self._fill(lines)
+
+    @classmethod
+    def fromLines(cls, header, lines, fileName='', section=''):
+        """Build the parameters from an already read section, see readSections."""
+
+        self = cls.__new__(cls)
+        self.fileName = fileName
+        self.section = section
+        self.definitions = Definitions(header)
+        self._fill(lines)
+        return self
+
+    @classmethod
+    def fromArrays(cls, definitions, xMin, xMax, parMin, parMax, parameters, fileName='', section=''):
+        """Build the parameters from already parsed arrays, e.g. a compiled payload."""
+
+        self = cls.__new__(cls)
+        self.fileName = fileName
+        self.section = section
+        self.definitions = definitions
+        self.xMin, self.xMax = xMin, xMax
+        self.parMin, self.parMax = parMin, parMax
+        self.parameters = parameters
+        return self
+
+    @staticmethod
+    def _read(fileName, section):
+        header = None
+        lines = []
+        inSection = (section == '')
+
+        with open(fileName) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if line.startswith('['):
+                    if inSection and header is not None:
+                        break
+                    inSection = (line.strip('[]').strip() == section)
+                    continue
+                if not inSection:
+                    continue
+                if line.startswith('{'):
+                    header = line
+                    continue
+                lines.append(line.split())
+
+        if header is None:
+            raise ValueError('No definitions found in %s (section %r)' % (fileName, section))
+
+        return header, lines
+
+    def _fill(self, lines):
+        nBinVar = self.definitions.nBinVar()
+        nParVar = self.definitions.nParVar()
+        isUncertainty = (self.definitions.level == 'Uncertainty')
+
+        records = []
+        for tokens in lines:
+            values = [float(v) for v in tokens]
+            bounds = values[:2 * nBinVar]
+            count = int(values[2 * nBinVar])
+            payload = values[2 * nBinVar + 1:]
+            if len(payload) != count:
+                raise ValueError('%s: expected %d values, got %d' % (self.fileName, count, len(payload)))
+            records.append((bounds, payload))
+
+        nRecords = len(records)
+        self.xMin = np.empty((nRecords, nBinVar))
+        self.xMax = np.empty((nRecords, nBinVar))
+        for i, (bounds, _) in enumerate(records):
+            self.xMin[i] = bounds[0::2]
+            self.xMax[i] = bounds[1::2]
+
+        # Uncertainty payloads store (pt, up, down) triplets, without validity range
+        nRange = 0 if isUncertainty else 2 * nParVar
+        nParameters = max([len(payload) - nRange for _, payload in records] or [0])
+
+        self.parMin = np.full((nRecords, nParVar), -np.inf)
+        self.parMax = np.full((nRecords, nParVar), np.inf)
+        self.parameters = np.full((nRecords, nParameters), np.nan)
+        for i, (_, payload) in enumerate(records):
+            if nRange:
+                self.parMin[i] = payload[0:nRange:2]
+                self.parMax[i] = payload[1:nRange:2]
+            self.parameters[i, :len(payload) - nRange] = payload[nRange:]
+
+    def size(self):
+        return self.xMin.shape[0]
+
+    def binIndex(self, *x):
+        """Index of the bin containing each jet, -1 when outside of the payload range.
+
+        A bin contains x when xMin <= x < xMax for all the bin variables."""
+
+        x = [np.asarray(v, dtype=np.float64) for v in x]
+        if len(x) != self.definitions.nBinVar():
+            raise ValueError('Expected %d bin variables, got %d' % (self.definitions.nBinVar(), len(x)))
+
+        if len(x) == 1:
+            # Records are sorted along the bin variable: a sorted-edge search is enough
+            index = np.searchsorted(self.xMin[:, 0], x[0], side='right') - 1
+            valid = (index >= 0)
+            safe = np.where(valid, index, 0)
+            valid &= (x[0] < self.xMax[safe, 0])
+            return np.where(valid, index, -1)
+
+        index = np.full(np.broadcast(*x).shape, -1, dtype=np.intp)
+        for i in range(self.size()):
+            inside = np.ones(index.shape, dtype=bool)
+            for j, v in enumerate(x):
+                inside &= (v >= self.xMin[i, j]) & (v < self.xMax[i, j])
+            index = np.where((index < 0) & inside, i, index)
+        return index
+
+
+class SimpleJetCorrector(object):
+    """Evaluate one correction level on arrays of jets."""
+
+    def __init__(self, parameters):
+        if parameters.definitions.isResponse:
+            raise NotImplementedError('Response payloads are not supported')
+        if parameters.definitions.nParVar() > len(VARIABLES):
+            raise ValueError('At most %d parameter variables are supported' % len(VARIABLES))
+
+        self.parameters = parameters
+        self.kernel = compileFormula(parameters.definitions.formula)
+
+    def correction(self, variables):
+        """Correction for each jet. ``variables`` maps the payload variable names
+        (JetEta, JetPt, JetA, Rho, ...) to arrays."""
+
+        definitions = self.parameters.definitions
+        bins = self.parameters.binIndex(*[variables[name] for name in definitions.binVar])
+        valid = (bins >= 0)
+        safe = np.where(valid, bins, 0)
+
+        # Parameter variables are clamped to the validity range of their bin
+        args = []
+        for i, name in enumerate(definitions.parVar):
+            value = np.asarray(variables[name], dtype=np.float64)
+            args.append(np.clip(value, self.parameters.parMin[safe, i], self.parameters.parMax[safe, i]))
+        while len(args) < len(VARIABLES):
+            args.append(np.zeros(safe.shape))
+
+        p = self.parameters.parameters[safe].T
+        result = self.kernel(*(args + [p])) * np.ones(safe.shape)
+
+        return np.where(valid, result, 1.)
+
+
+class FactorizedJetCorrector(object):
+    """Chain of correction levels, each level being evaluated on the jet corrected by the previous ones.
+
+    In grid mode, the levels of jecGrid.DEFAULT_LEVELS (with ``grid=True``, the
+    only ones for which interpolating is faster than the formula) or the levels
+    listed in ``grid`` are tabulated per bin at construction (see jecGrid) and
+    the corrections are interpolated. Grid cells whose relative error against
+    the exact formula, sampled at several points of the cell, exceeds
+    ``gridTolerance`` are refused and answered with the exact formula.
+    ``gridReport`` gives, per level, the maximum sampled relative error of the
+    interpolated cells and the fraction of refused cells.
+    """
+
+    def __init__(self, parameters, grid=False, gridTolerance=jecGrid.DEFAULT_TOLERANCE, gridNodes=None):
+        self.correctors = [SimpleJetCorrector(p) for p in parameters]
+        self.gridReport = {}
+
+        if grid:
+            if grid is True:
+                grid = jecGrid.DEFAULT_LEVELS
+            for i, corrector in enumerate(self.correctors):
+                level = corrector.parameters.definitions.level
+                if level not in grid:
+                    continue
+                tabulated = jecGrid.GridJetCorrector(corrector, gridNodes, gridTolerance)
+                self.gridReport[level] = {
+                    'maxRelativeError': tabulated.maxRelativeError,
+                    'exactFraction': tabulated.exactFraction,
+                }
+                if tabulated.exactFraction == 1.:
+                    warnings.warn('%s: no grid cell within the tolerance %g, using the exact formula'
+                                  % (level, gridTolerance))
+                    continue
+                self.correctors[i] = tabulated
+
+    @classmethod
+    def fromFiles(cls, fileNames, cache=True, **kwargs):
+        """Load the payloads. With ``cache``, the memory-mapped compiled payloads
+        of jecPayloadCache are used instead of parsing the text files."""
+
+        if cache:
+            from JMEAnalysis.JMEValidator.jecPayloadCache import loadParameters
+            return cls([loadParameters(f) for f in fileNames], **kwargs)
+
+        return cls([JetCorrectorParameters(f) for f in fileNames], **kwargs)
+
+    @classmethod
+    def fromEra(cls, era, payload, levels, directory=DATA_DIR, cache=True, **kwargs):
+        return cls.fromFiles([payloadFileName(era, level, payload, directory) for level in levels], cache, **kwargs)
+
+    def levels(self):
+        return [c.parameters.definitions.level for c in self.correctors]
+
+    def subCorrections(self, **variables):
+        """Cumulative corrections after each level, as an array of shape (nLevels, nJets)."""
+
+        variables = dict((k, np.asarray(v, dtype=np.float64)) for k, v in variables.items())
+        shape = np.broadcast(*variables.values()).shape
+        variables = dict((k, np.broadcast_to(v, shape)) for k, v in variables.items())
+
+        pt = variables.get('JetPt')
+        energy = variables.get('JetE')
+
+        factor = np.ones(shape)
+        result = np.empty((len(self.correctors),) + shape)
+        for i, corrector in enumerate(self.correctors):
+            if pt is not None:
+                variables['JetPt'] = pt * factor
+            if energy is not None:
+                variables['JetE'] = energy * factor
+            factor = factor * corrector.correction(variables)
+            result[i] = factor
+
+        return result
+
+    def correction(self, **variables):
+        """Total correction for each jet, e.g. correction(JetEta=eta, JetPt=pt, JetA=area, Rho=rho)."""
+
+        if not self.correctors:
+            shape = np.broadcast(*[np.asarray(v) for v in variables.values()]).shape
+            return np.ones(shape)
+
+        return self.subCorrections(**variables)[-1]
@@ -0,0 +1,288 @@
+"""
+Translation of the TFormula expressions found in the JEC payload headers into
+vectorized NumPy callables.
+
+The expression is parsed with the C operator precedence used by TFormula
+(``^`` being the power operator), and translated into a fully parenthesized
+Python expression working on NumPy arrays. The result is a function
+
+    kernel(x, y, z, t, p)
+
+where x, y, z and t are the formula variables and p the sequence of formula
+parameters ([0], [1], ...). Each of them can be a scalar or an array.
+
+Compiled kernels are kept in a LRU cache keyed by the formula text, so that all
+the payloads sharing a functional form share the same kernel.
+"""
+
+import collections
+import math
+import re
+
+import numpy as np
+
+# Maximum number of compiled kernels kept in the cache
+CACHE_SIZE = 64
+
+VARIABLES = ('x', 'y', 'z', 't')
+
+
+def _lognormal(x, sigma, theta=0., m=1.):
+    # Same definition as TMath::LogNormal: 0 outside of the support
+    shifted = np.where(x > theta, x - theta, 1.)
+    pdf = np.exp(-0.5 * ((np.log(shifted) - np.log(m)) / sigma) ** 2) / (shifted * np.abs(sigma) * np.sqrt(2 * np.pi))
+    return np.where((x > theta) & (sigma > 0) & (m > 0), pdf, 0.)
+
+
+def _gaus(x, mean=0., sigma=1., norm=False):
+    # Same definition as TMath::Gaus
+    result = np.exp(-0.5 * ((x - mean) / sigma) ** 2)
+    return np.where(norm, result / (np.sqrt(2 * np.pi) * sigma), result)
+
+
+_erf = np.frompyfunc(math.erf, 1, 1)
+_erfc = np.frompyfunc(math.erfc, 1, 1)
+
+# Functions available in the formulas, with and without the TMath:: prefix
+FUNCTIONS = {
+    'log': np.log,
+    'log10': np.log10,
+    'exp': np.exp,
+    'sqrt': np.sqrt,
+    'pow': np.power,
+    'max': np.maximum,
+    'min': np.minimum,
+    'abs': np.abs,
+    'fabs': np.abs,
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'asin': np.arcsin,
+    'acos': np.arccos,
+    'atan': np.arctan,
+    'atan2': np.arctan2,
+    'sinh': np.sinh,
+    'cosh': np.cosh,
+    'tanh': np.tanh,
+    'TMath::Log': np.log,
+    'TMath::Log10': np.log10,
+    'TMath::Exp': np.exp,
+    'TMath::Sqrt': np.sqrt,
+    'TMath::Power': np.power,
+    'TMath::Max': np.maximum,
+    'TMath::Min': np.minimum,
+    'TMath::Abs': np.abs,
+    'TMath::Sin': np.sin,
+    'TMath::Cos': np.cos,
+    'TMath::Tan': np.tan,
+    'TMath::ATan': np.arctan,
+    'TMath::ATan2': np.arctan2,
+    'TMath::SinH': np.sinh,
+    'TMath::CosH': np.cosh,
+    'TMath::TanH': np.tanh,
+    'TMath::Erf': lambda x: np.asarray(_erf(x), dtype=np.float64),
+    'TMath::Erfc': lambda x: np.asarray(_erfc(x), dtype=np.float64),
+    'TMath::Gaus': _gaus,
+    'TMath::LogNormal': _lognormal,
+}
+
+CONSTANTS = {
+    'pi': math.pi,
+    'TMath::Pi': math.pi,
+    'TMath::E': math.e,
+}
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+      | (?P<parameter>\[\s*\d+\s*\])
+      | (?P<name>[A-Za-z_][A-Za-z_0-9]*(?:::[A-Za-z_][A-Za-z_0-9]*)?)
+      | (?P<operator>\*\*|&&|\|\||==|!=|<=|>=|[-+*/^<>!(),])
+    )''', re.VERBOSE)
+
+# Binary operators, from the lowest to the highest precedence
+_BINARY = [
+    ('||',),
+    ('&&',),
+    ('==', '!='),
+    ('<', '<=', '>', '>='),
+    ('+', '-'),
+    ('*', '/'),
+]
+
+
+def _tokenize(formula):
+    tokens = []
+    position = 0
+    formula = formula.rstrip()
+    while position < len(formula):
+        match = _TOKEN.match(formula, position)
+        if not match:
+            raise ValueError('Unexpected character %r at position %d in formula %r' % (formula[position], position, formula))
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+
+class _Translator(object):
+    """Recursive descent parser emitting a Python expression."""
+
+    def __init__(self, formula):
+        self.formula = formula
+        self.tokens = _tokenize(formula)
+        self.position = 0
+
+    def translate(self):
+        expression = self.binary(0)
+        if self.position != len(self.tokens):
+            self.error('unexpected %r' % self.tokens[self.position][1])
+        return expression
+
+    def error(self, message):
+        raise ValueError('Invalid formula %r: %s' % (self.formula, message))
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            self.error('unexpected end of formula')
+        self.position += 1
+        return token
+
+    def expect(self, value):
+        kind, token = self.next()
+        if token != value:
+            self.error('expected %r, got %r' % (value, token))
+
+    def binary(self, level):
+        if level == len(_BINARY):
+            return self.unary()
+
+        left = self.binary(level + 1)
+        while self.peek()[0] == 'operator' and self.peek()[1] in _BINARY[level]:
+            operator = self.next()[1]
+            right = self.binary(level + 1)
+            if operator == '||':
+                left = '(_or(%s, %s) * 1.)' % (left, right)
+            elif operator == '&&':
+                left = '(_and(%s, %s) * 1.)' % (left, right)
+            elif operator in ('==', '!=', '<', '<=', '>', '>='):
+                # Comparisons yield 0. or 1., as in TFormula
+                left = '((%s %s %s) * 1.)' % (left, operator, right)
+            else:
+                left = '(%s %s %s)' % (left, operator, right)
+        return left
+
+    def unary(self):
+        kind, token = self.peek()
+        if kind == 'operator' and token in ('-', '+'):
+            self.next()
+            return '(%s%s)' % (token, self.unary())
+        if kind == 'operator' and token == '!':
+            self.next()
+            return '(_not(%s) * 1.)' % self.unary()
+        return self.power()
+
+    def power(self):
+        base = self.primary()
+        kind, token = self.peek()
+        if kind == 'operator' and token in ('^', '**'):
+            self.next()
+            # Right associative, binds tighter than the unary minus of its base
+            exponent = self.unary()
+            return '(%s ** %s)' % (base, exponent)
+        return base
+
+    def primary(self):
+        kind, token = self.next()
+
+        if kind == 'number':
+            return repr(float(token))
+
+        if kind == 'parameter':
+            return 'p[%d]' % int(token.strip('[] '))
+
+        if kind == 'operator' and token == '(':
+            expression = self.binary(0)
+            self.expect(')')
+            return expression
+
+        if kind == 'name':
+            if self.peek()[1] == '(':
+                self.next()
+                arguments = []
+                if self.peek()[1] != ')':
+                    arguments.append(self.binary(0))
+                    while self.peek()[1] == ',':
+                        self.next()
+                        arguments.append(self.binary(0))
+                self.expect(')')
+
+                if token in CONSTANTS and not arguments:
+                    return repr(CONSTANTS[token])
+                if token not in FUNCTIONS:
+                    self.error('unsupported function %r' % token)
+                return '_f[%r](%s)' % (token, ', '.join(arguments))
+
+            if token in VARIABLES:
+                return token
+            if token in CONSTANTS:
+                return repr(CONSTANTS[token])
+            self.error('unknown identifier %r' % token)
+
+        self.error('unexpected %r' % token)
+
+
+def translate(formula):
+    """Translate a TFormula expression into the equivalent Python/NumPy expression."""
+
+    formula = formula.strip().strip('"').strip()
+    if not formula:
+        # Empty formulas (e.g. uncertainty payloads) are a constant 1
+        return '1.'
+    return _Translator(formula).translate()
+
+
+def _build(formula):
+    source = 'lambda x, y, z, t, p: %s' % translate(formula)
+    namespace = {'_f': FUNCTIONS, '_and': np.logical_and, '_or': np.logical_or, '_not': np.logical_not}
+    kernel = eval(compile(source, '<TFormula %s>' % formula, 'eval'), namespace)
+    kernel.formula = formula
+    kernel.source = source
+    return kernel
+
+
+_cache = collections.OrderedDict()
+_statistics = {'hits': 0, 'misses': 0}
+
+
+def compileFormula(formula):
+    """Return the NumPy kernel of a TFormula expression, compiling it only once
+    for all the payloads sharing the same formula text."""
+
+    try:
+        kernel = _cache.pop(formula)
+        _statistics['hits'] += 1
+    except KeyError:
+        kernel = _build(formula)
+        _statistics['misses'] += 1
+        while len(_cache) >= CACHE_SIZE:
+            _cache.popitem(last=False)
+    _cache[formula] = kernel
+    return kernel
+
+
+def cacheInfo():
+    """Number of cache hits and misses, and current cache size."""
+
+    return dict(_statistics, size=len(_cache), maxsize=CACHE_SIZE)
+
+
+def clearCache():
+    _cache.clear()
+    _statistics['hits'] = _statistics['misses'] = 0
@@ -0,0 +1,223 @@
+"""
+Lookup grids for the jet energy corrections.
+
+The parameters of a correction level only change with the eta bin, so the
+formula can be tabulated once per bin and the corrections answered by
+interpolation instead of evaluating the formula for each jet.
+
+Each parameter variable of a level gets its own axis, spanning the validity
+range of the bin: JetPt and JetE are sampled uniformly in log, the other
+variables (JetA, Rho, ...) linearly. Corrections are multilinear interpolations
+between the grid nodes. The L1FastJet offset is bilinear in (area, rho), so
+its rho x area dependence is reproduced exactly by the JetA and Rho axes, and
+only the log(pt) axis needs many nodes.
+
+The relative error of the interpolation is measured against the exact formula
+at several points of every grid cell: its corners, the middle of its edges and
+faces, its center and the quarter points along each axis (VALIDATION_POINTS).
+The error of a multilinear interpolation of the L1FastJet offset, for instance,
+is largest at the corners in (area, rho) and in the middle of the log(pt)
+interval, which the center alone misses. Cells exceeding the tolerance (e.g.
+cells containing the switch of a piecewise formula, or the max(0.0001, ...)
+floor of the L1FastJet offset) are refused: jets falling in them are evaluated
+with the exact formula. The error is only sampled: it is an estimate, not a
+bound, and single jets may exceed the tolerance slightly.
+
+Interpolating is only faster than a formula which is expensive to evaluate. On
+the PHYS14 payloads of data/ (2M jets), L2Relative goes from 0.62 s to 0.36 s,
+while L1FastJet (three axes, 8 table lookups per jet) goes from 0.36 s to 1.0 s
+and the constant L3Absolute from 0.08 s to 0.2 s: only the levels of
+DEFAULT_LEVELS are tabulated unless asked for explicitly.
+"""
+
+import itertools
+
+import numpy as np
+
+from JMEAnalysis.JMEValidator.jecFormula import VARIABLES
+
+# Default number of nodes per parameter variable
+DEFAULT_NODES = {
+    'JetPt': 512,
+    'JetE': 512,
+    'JetA': 2,
+    'Rho': 2,
+}
+DEFAULT_NODES_OTHER = 16
+
+# Default maximum relative interpolation error accepted for a grid
+DEFAULT_TOLERANCE = 1e-4
+
+# Levels for which the grid is faster than the formula, tabulated by default
+DEFAULT_LEVELS = ('L2Relative',)
+
+# Positions inside a cell, as fractions of its width along each axis, where the
+# interpolation error is measured
+VALIDATION_POINTS = (0., 0.25, 0.5, 0.75, 1.)
+
+_LOG_VARIABLES = ('JetPt', 'JetE')
+
+
+class GridJetCorrector(object):
+    """Tabulated version of a SimpleJetCorrector.
+
+    - ``table``: contiguous array of shape (nBins, nNodes[0], nNodes[1], ...)
+    - ``cellError``: maximum relative error at the VALIDATION_POINTS of each cell, shape (nBins, nNodes[0] - 1, ...)
+    - ``exactCells``: cells answered with the exact formula (error above ``tolerance``)
+    - ``maxRelativeError``: maximum relative error of the cells answered by interpolation
+    - ``exactFraction``: fraction of the cells answered with the exact formula
+    """
+
+    def __init__(self, corrector, nodes=None, tolerance=DEFAULT_TOLERANCE):
+        self.corrector = corrector
+        self.parameters = corrector.parameters
+
+        definitions = self.parameters.definitions
+        nodes = dict(DEFAULT_NODES, **(nodes or {}))
+        self.variables = list(definitions.parVar)
+        self.nodes = [max(2, int(nodes.get(name, DEFAULT_NODES_OTHER))) for name in self.variables]
+        self.isLog = [name in _LOG_VARIABLES for name in self.variables]
+
+        # Axis boundaries per bin, in the interpolation coordinate (log or linear)
+        self.lower = np.empty(self.parameters.parMin.shape)
+        self.upper = np.empty(self.parameters.parMax.shape)
+        for i, isLog in enumerate(self.isLog):
+            self.lower[:, i] = self._coordinate(self.parameters.parMin[:, i], isLog)
+            self.upper[:, i] = self._coordinate(self.parameters.parMax[:, i], isLog)
+        if not np.all(np.isfinite(self.lower)) or not np.all(np.isfinite(self.upper)):
+            raise ValueError('%s: grids need a finite validity range for all the parameter variables' % definitions.level)
+
+        self.table = np.ascontiguousarray(self._evaluate([np.linspace(0., 1., n) for n in self.nodes]))
+
+        self.tolerance = tolerance
+        self.cellError = self._validate()
+        self.exactCells = np.ascontiguousarray(self.cellError > tolerance)
+        accepted = self.cellError[~self.exactCells]
+        self.maxRelativeError = float(accepted.max()) if accepted.size else 0.
+        self.exactFraction = float(self.exactCells.mean()) if self.exactCells.size else 0.
+
+    @staticmethod
+    def _coordinate(value, isLog):
+        return np.log(value) if isLog else np.asarray(value, dtype=np.float64)
+
+    def _evaluate(self, fractions):
+        """Exact formula on the grid defined by the per-axis ``fractions`` of the range of each bin."""
+
+        nBins = self.parameters.size()
+        shape = (nBins,) + tuple(len(f) for f in fractions)
+
+        args = []
+        for i, (fraction, isLog) in enumerate(zip(fractions, self.isLog)):
+            axis = [1] * len(shape)
+            axis[i + 1] = len(fraction)
+            lower = self.lower[:, i].reshape((nBins,) + (1,) * len(fractions))
+            upper = self.upper[:, i].reshape((nBins,) + (1,) * len(fractions))
+            coordinate = lower + (upper - lower) * fraction.reshape(axis)
+            args.append(np.exp(coordinate) if isLog else coordinate)
+        while len(args) < len(VARIABLES):
+            args.append(np.zeros((1,) * len(shape)))
+
+        p = self.parameters.parameters.T.reshape((-1, nBins) + (1,) * len(fractions))
+        return self.corrector.kernel(*(args + [p])) * np.ones(shape)
+
+    def _validate(self):
+        """Maximum relative error of the interpolation of every grid cell, over
+        the VALIDATION_POINTS along each axis."""
+
+        nBins = self.parameters.size()
+        cells = tuple(n - 1 for n in self.nodes)
+        shape = (nBins,) + cells
+        bins = np.broadcast_to(np.arange(nBins).reshape((nBins,) + (1,) * len(cells)), shape)
+        cellError = np.zeros(shape)
+
+        for offsets in itertools.product(VALIDATION_POINTS, repeat=len(cells)):
+            fractions = [(np.arange(n) + offset) / n for n, offset in zip(cells, offsets)]
+            exact = self._evaluate(fractions)
+
+            # Each point is interpolated in its own cell, also on the upper edges
+            # shared with the next cell
+            cellIndex = [np.arange(n) for n in cells]
+            points = []
+            for i, fraction in enumerate(fractions):
+                axis = [1] * len(shape)
+                axis[i + 1] = len(fraction)
+                points.append(np.broadcast_to(fraction.reshape(axis), shape))
+                cellIndex[i] = np.broadcast_to(cellIndex[i].reshape(axis), shape)
+
+            interpolated = self._interpolate(bins.ravel(), [f.ravel() for f in points],
+                                             [c.ravel() for c in cellIndex]).reshape(shape)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                error = np.abs(interpolated - exact) / np.abs(exact)
+            error = np.where(exact == interpolated, 0., error)
+            cellError = np.maximum(cellError, np.where(np.isfinite(error), error, np.inf))
+
+        return cellError
+
+    def _cells(self, fractions, cells=None):
+        """Lower node index and interpolation weight along each axis. The cells
+        are found from the fractions, unless given."""
+
+        lower, weights = [], []
+        for i, (fraction, n) in enumerate(zip(fractions, self.nodes)):
+            position = np.clip(fraction, 0., 1.) * (n - 1)
+            if cells is None:
+                index = np.minimum(np.floor(position).astype(np.intp), n - 2)
+            else:
+                index = cells[i]
+            lower.append(index)
+            weights.append(position - index)
+        return lower, weights
+
+    def _interpolate(self, bins, fractions, cells=None):
+        """Multilinear interpolation of the table at the given per-axis fractions of the bin ranges."""
+
+        lower, weights = self._cells(fractions, cells)
+
+        # Flat index of the lower corner, and offsets of the other corners
+        strides = [s // self.table.itemsize for s in self.table.strides]
+        base = bins * strides[0]
+        for index, stride in zip(lower, strides[1:]):
+            base = base + index * stride
+
+        table = self.table.ravel()
+        result = np.zeros(bins.shape)
+        for corner in itertools.product((0, 1), repeat=len(self.nodes)):
+            weight = None
+            offset = 0
+            for upper, w, stride in zip(corner, weights, strides[1:]):
+                w = w if upper else 1. - w
+                weight = w if weight is None else weight * w
+                offset += upper * stride
+            result += weight * table.take(base + offset)
+        return result
+
+    def correction(self, variables):
+        """Interpolated correction for each jet, with the same interface as SimpleJetCorrector.
+        Jets falling in refused cells get the exact formula."""
+
+        definitions = self.parameters.definitions
+        bins = self.parameters.binIndex(*[variables[name] for name in definitions.binVar])
+        valid = (bins >= 0)
+        safe = np.where(valid, bins, 0)
+
+        fractions = []
+        for i, (name, isLog) in enumerate(zip(self.variables, self.isLog)):
+            value = np.asarray(variables[name], dtype=np.float64)
+            value = np.clip(value, self.parameters.parMin[safe, i], self.parameters.parMax[safe, i])
+            lower, upper = self.lower[safe, i], self.upper[safe, i]
+            width = np.where(upper > lower, upper - lower, 1.)
+            fractions.append((self._coordinate(value, isLog) - lower) / width)
+
+        if not fractions:
+            return np.where(valid, self.table[safe], 1.)
+
+        result = self._interpolate(safe, fractions)
+
+        exact = valid & self.exactCells[tuple([safe] + self._cells(fractions)[0])]
+        if np.any(exact):
+            shape = safe.shape
+            subset = dict((name, np.broadcast_to(np.asarray(value, dtype=np.float64), shape)[exact])
+                          for name, value in variables.items())
+            result[exact] = self.corrector.correction(subset)
+
+        return np.where(valid, result, 1.)
@@ -0,0 +1,161 @@
+"""
+Compiled binary cache for the JEC text payloads.
+
+A text payload section is compiled once into a fixed-layout binary file:
+
+    offset  size  content
+         0     8  magic 'JMEJEC\\0\\0'
+         8     4  format version (uint32)
+        12     4  number of records (uint32)
+        16     4  number of bin variables (uint32)
+        20     4  number of parameter variables (uint32)
+        24     4  number of formula parameters (uint32)
+        28     4  length of the definitions line (uint32)
+        32    32  SHA-256 of the text payload
+        64     -  definitions line, zero-padded to a multiple of 8 bytes
+              -   float64 arrays: xMin, xMax (nRecords x nBinVar),
+                  parMin, parMax (nRecords x nParVar), parameters (nRecords x nParameters)
+
+The binary file is memory-mapped read-only, so all the jobs running on a node
+share the same pages. The SHA-256 of the text payload is stored in the header:
+when the text file changes, the binary file is rebuilt automatically.
+"""
+
+import errno
+import hashlib
+import os
+import struct
+import tempfile
+import warnings
+
+import numpy as np
+
+from JMEAnalysis.JMEValidator.jecEvaluator import Definitions, JetCorrectorParameters
+
+MAGIC = b'JMEJEC\0\0'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sIIIIII32s')
+
+# Default location of the compiled payloads, overridable with $JME_JEC_CACHE
+CACHE_DIR = os.environ.get('JME_JEC_CACHE', os.path.join(tempfile.gettempdir(), 'jme-jec-cache-%d' % os.getuid()))
+
+
+def _digest(fileName):
+    with open(fileName, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def _padded(size):
+    return (size + 7) // 8 * 8
+
+
+def cacheFileName(fileName, section='', cacheDir=CACHE_DIR):
+    """Path of the compiled version of a text payload section. The name holds a
+    hash of the absolute path of the payload, so that payloads with the same file
+    name in different directories have their own entries."""
+
+    name = os.path.splitext(os.path.basename(fileName))[0]
+    if section:
+        name += '.' + section
+    path = hashlib.sha256(os.path.abspath(fileName).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cacheDir, '%s.%s.jecb' % (name, path))
+
+
+def compilePayload(fileName, output, section='', digest=None):
+    """Parse a text payload section and write its binary version to ``output``.
+
+    The file is written under a temporary name and renamed, so that concurrent
+    jobs never see a partially written file."""
+
+    if digest is None:
+        digest = _digest(fileName)
+
+    parameters = JetCorrectorParameters(fileName, section)
+    if parameters.size() == 0:
+        raise ValueError('No records in %s (section %r)' % (fileName, section))
+    definitions = parameters.definitions.header.encode('utf-8')
+
+    nRecords, nBinVar = parameters.xMin.shape
+    nParVar = parameters.parMin.shape[1]
+    nParameters = parameters.parameters.shape[1]
+
+    # Several jobs starting together may all try to create the directory
+    directory = os.path.dirname(os.path.abspath(output))
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, nRecords, nBinVar, nParVar, nParameters, len(definitions), digest))
+            f.write(definitions.ljust(_padded(len(definitions)), b'\0'))
+            for array in (parameters.xMin, parameters.xMax, parameters.parMin, parameters.parMax, parameters.parameters):
+                f.write(np.ascontiguousarray(array, dtype='<f8').tobytes())
+        os.chmod(tmp, 0o644)
+        os.rename(tmp, output)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _map(fileName, expectedDigest):
+    """Memory-map a compiled payload. Return None if it is missing, stale or corrupted."""
+
+    # An empty file cannot be memory-mapped
+    if not os.path.isfile(fileName) or os.path.getsize(fileName) < _HEADER.size:
+        return None
+
+    data = np.memmap(fileName, dtype=np.uint8, mode='r')
+
+    magic, version, nRecords, nBinVar, nParVar, nParameters, length, digest = _HEADER.unpack(data[:_HEADER.size].tobytes())
+    if magic != MAGIC or version != VERSION or digest != expectedDigest:
+        return None
+
+    offset = _HEADER.size
+    header = data[offset:offset + length].tobytes().decode('utf-8')
+    offset += _padded(length)
+
+    shapes = [(nRecords, nBinVar), (nRecords, nBinVar), (nRecords, nParVar), (nRecords, nParVar), (nRecords, nParameters)]
+    if data.size != offset + 8 * sum(r * c for r, c in shapes):
+        return None
+
+    arrays = []
+    for shape in shapes:
+        count = shape[0] * shape[1]
+        arrays.append(np.frombuffer(data, dtype='<f8', count=count, offset=offset).reshape(shape))
+        offset += 8 * count
+
+    return header, arrays
+
+
+def loadParameters(fileName, section='', cacheDir=CACHE_DIR):
+    """Return the JetCorrectorParameters of a text payload section, backed by a
+    read-only memory map of its compiled version. The compiled file is (re)built
+    when it does not exist or when the text payload changed. When the cache
+    directory cannot be written, the text payload is parsed instead."""
+
+    if os.path.getsize(fileName) == 0:
+        raise ValueError('Empty payload %s' % fileName)
+
+    digest = _digest(fileName)
+    output = cacheFileName(fileName, section, cacheDir)
+
+    mapped = _map(output, digest)
+    if mapped is None:
+        try:
+            compilePayload(fileName, output, section, digest)
+        except (OSError, IOError) as e:
+            warnings.warn('Unable to cache %s in %s, parsing the text payload: %s' % (fileName, cacheDir, e))
+            return JetCorrectorParameters(fileName, section)
+        mapped = _map(output, digest)
+        if mapped is None:
+            raise ValueError('Unable to read back compiled payload %s' % output)
+
+    header, (xMin, xMax, parMin, parMax, parameters) = mapped
+    return JetCorrectorParameters.fromArrays(Definitions(header), xMin, xMax, parMin, parMax, parameters,
+                                             fileName=fileName, section=section)
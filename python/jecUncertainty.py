@@ -0,0 +1,171 @@
+"""
+Vectorized evaluation of the JEC uncertainties for many sources at once.
+
+A multi-section uncertainty file (one [Source] section per systematic source,
+as used by JetCorrectionUncertainty) is read once. Each section stores, per eta
+bin, (pt, up, down) triplets; the uncertainty is linearly interpolated in pt
+inside the bin and kept constant beyond the first and last points, as in
+SimpleJetCorrectionUncertainty.
+
+Example:
+
+    from JMEAnalysis.JMEValidator.jecUncertainty import JetCorrectionUncertainty
+
+    unc = JetCorrectionUncertainty('Summer15_V5_MC_UncertaintySources_AK4PFchs.txt')
+    shifts = unc.uncertainties(eta, corrPt)   # (nJets, nSources, 2): up, down
+    histograms, edges = unc.correctedPtHistograms(rawPt, corr, eta, bins=50, range=(0., 500.))
+"""
+
+import numpy as np
+
+from JMEAnalysis.JMEValidator.jecEvaluator import JetCorrectorParameters, readSections
+
+UP, DOWN = 0, 1
+
+
+class _Source(object):
+    """Uncertainty tables of one source, with equal-length pt rows so that the
+    per-bin interpolation can be done with a single sorted-edge search."""
+
+    def __init__(self, parameters):
+        if parameters.definitions.nBinVar() != 1 or parameters.definitions.nParVar() != 1:
+            raise ValueError('%s: only uncertainties binned in one variable and parametrized in one variable are supported'
+                             % parameters.section)
+
+        self.parameters = parameters
+        values = parameters.parameters
+        nBins = values.shape[0]
+
+        # Number of (pt, up, down) points of each bin
+        counts = np.sum(~np.isnan(values), axis=1)
+        if np.any(counts % 3) or np.any(counts == 0):
+            raise ValueError('%s: the uncertainty parameters must be (pt, up, down) triplets' % parameters.section)
+        counts //= 3
+        nPoints = int(counts.max())
+
+        self.pt = np.empty((nBins, nPoints))
+        self.values = np.empty((2, nBins, nPoints))
+        for i in range(nBins):
+            n = counts[i]
+            triplets = values[i, :3 * n].reshape(n, 3)
+            # Shorter rows are padded with their last point, which keeps them sorted
+            # and does not change the interpolation
+            padding = np.repeat(triplets[-1:], nPoints - n, axis=0)
+            triplets = np.concatenate([triplets, padding])
+            self.pt[i] = triplets[:, 0]
+            self.values[UP, i] = triplets[:, 1]
+            self.values[DOWN, i] = triplets[:, 2]
+
+        # Rows shifted by a multiple of a span larger than the pt range of the
+        # whole table (not only of each row, whose ranges may not overlap): the
+        # flattened table is globally sorted and can be searched at once
+        self.span = float(np.nanmax(self.pt) - np.nanmin(self.pt)) + 1.
+        self.flat = (self.pt + self.span * np.arange(nBins)[:, None]).ravel()
+        self.nPoints = nPoints
+
+    def binning(self):
+        return self.parameters.xMin.tobytes() + self.parameters.xMax.tobytes()
+
+    def uncertainty(self, bins, pt, out):
+        """Fill ``out`` (shape (2, nJets)) with the up and down uncertainties."""
+
+        valid = (bins >= 0)
+        safe = np.where(valid, bins, 0)
+
+        first = self.pt[safe, 0]
+        last = self.pt[safe, -1]
+        x = np.clip(pt, first, last)
+
+        # Index of the point just below x in its row, kept one below the last point
+        position = np.searchsorted(self.flat, x + self.span * safe, side='right') - 1
+        index = np.clip(position - safe * self.nPoints, 0, self.nPoints - 2) if self.nPoints > 1 \
+            else np.zeros(safe.shape, dtype=np.intp)
+        next = np.minimum(index + 1, self.nPoints - 1)
+
+        x0 = self.pt[safe, index]
+        x1 = self.pt[safe, next]
+        width = np.where(x1 > x0, x1 - x0, 1.)
+        fraction = np.where(x1 > x0, (x - x0) / width, 0.)
+
+        for direction in (UP, DOWN):
+            y0 = self.values[direction, safe, index]
+            y1 = self.values[direction, safe, next]
+            out[direction] = np.where(valid, y0 + fraction * (y1 - y0), np.nan)
+
+
+class JetCorrectionUncertainty(object):
+    """All the uncertainty sources of a payload file, evaluated together.
+
+    ``sources`` restricts the evaluation to a subset of the sections of the file,
+    in the given order. A file without sections gives a single source named ''.
+    """
+
+    def __init__(self, fileName, sources=None):
+        sections = readSections(fileName)
+        if sources is None:
+            sources = list(sections.keys())
+
+        self.fileName = fileName
+        self.sources = list(sources)
+        self._sources = []
+        for name in self.sources:
+            if name not in sections:
+                raise KeyError('No section %r in %s' % (name, fileName))
+            header, lines = sections[name]
+            self._sources.append(_Source(JetCorrectorParameters.fromLines(header, lines, fileName, name)))
+
+    def uncertainties(self, eta, pt):
+        """Up and down uncertainties of every source for each jet, as an array of
+        shape (nJets, nSources, 2). ``pt`` is the corrected jet pt. Jets outside of
+        the eta range of a source get NaN."""
+
+        eta = np.asarray(eta, dtype=np.float64)
+        pt = np.asarray(pt, dtype=np.float64)
+        eta, pt = np.broadcast_arrays(eta, pt)
+
+        result = np.empty((2, len(self._sources)) + eta.shape)
+
+        # Sources sharing the same eta binning share the bin lookup
+        binIndices = {}
+        for i, source in enumerate(self._sources):
+            key = source.binning()
+            if key not in binIndices:
+                binIndices[key] = source.parameters.binIndex(eta)
+            source.uncertainty(binIndices[key], pt, result[:, i])
+
+        return np.moveaxis(result, (0, 1), (-1, -2))
+
+    def correctedPtHistograms(self, rawPt, correction, eta, bins=50, range=(0., 500.)):
+        """Histograms of the corrected jet pt, nominal and shifted up and down by
+        each source, as in the JetCorrectionsOnTheFly example:
+
+            corrPt     = corr * rawPt
+            corrPtUp   = corr * (1 + |up|) * rawPt
+            corrPtDown = corr * (1 - |down|) * rawPt
+
+        Return (histograms, edges) where histograms maps 'nominal' to the counts of
+        the nominal corrected pt, and each source name to an (up, down) pair of counts.
+        """
+
+        rawPt = np.asarray(rawPt, dtype=np.float64)
+        correctedPt = np.asarray(correction, dtype=np.float64) * rawPt
+
+        shifts = np.abs(self.uncertainties(eta, correctedPt))
+
+        counts, edges = np.histogram(correctedPt, bins=bins, range=range)
+        histograms = {'nominal': counts}
+        for i, name in enumerate(self.sources):
+            up = correctedPt * (1. + shifts[..., i, UP])
+            down = correctedPt * (1. - shifts[..., i, DOWN])
+            histograms[name] = (np.histogram(up[np.isfinite(up)], bins=edges)[0],
+                                np.histogram(down[np.isfinite(down)], bins=edges)[0])
+
+        return histograms, edges
+
+
+def fillTH1(histogram, values):
+    """Fill a ROOT histogram with all the entries of an array in one call."""
+
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if values.size:
+        histogram.FillN(values.size, values, np.ones(values.size))
@@ -3,70 +3,60 @@ import FWCore.ParameterSet.Config as cms
 from RecoJets.JetProducers.ak4PFJets_cfi import ak4PFJets
 from RecoJets.JetProducers.ak4GenJets_cfi import ak4GenJets
 
-from PhysicsTools.PatAlgos.tools.jetTools import addJetCollection
-from PhysicsTools.PatAlgos.tools.jetTools import switchJetCollection
+def jetRadiusLabel(r):
+	"""'4' for R = 0.4, '12' for R = 1.2, '0p25' for R = 0.25"""
 
-def load_PUPPIJet_sequence(proc, seq_name, rParam):
+	if abs(r * 10 - round(r * 10)) < 1e-6:
+		return '%d' % round(r * 10)
+	return ('%g' % r).replace('.', 'p')
+
+def load_PUPPIJet_sequence(proc, seq_name, rParam, src_puppi='particleFlowPUPPI', src_gen='packedGenParticles', pat=True):
+	"""Anti-kt PUPPI and gen jets for each radius of rParam (any list of radii):
+	ak<R>PUPPI and ak<R>GenJets, e.g. ak4PUPPI and ak12GenJets.
+
+	All the radii cluster the same PUPPI-weighted candidates (src_puppi) and
+	gen particles (src_gen). With pat=True, PAT jets (patJetsAK<R>PUPPIJets),
+	matched to partons and to the gen jets of the same radius, are added for
+	each radius; set pat=False for radius scans, where only the clustering is
+	needed."""
+
+	if pat:
+		# imported here, so that loading this file does not load the PAT tools
+		from PhysicsTools.PatAlgos.tools.jetTools import addJetCollection
 
 	puppi_seq = cms.Sequence()
 	for r in rParam:
-		if r==0.4:
-			ak4GenJets.src = 'packedGenParticles'
-			setattr(proc,"ak4GenJets",ak4GenJets)
-			# Select candidates that would pass CHS requirements
-			#AK4PFchs = cms.EDFilter("CandPtrSelector", src = cms.InputTag("packedPFCandidates"), cut = cms.string("fromPV"))
-			#setattr(proc,"ak4PFchsJets",AK4PFchs)
-			#AK4PUPPI = ak4PFJets.clone(src = 'packedPFCandidates')
-			ak4PUPPI = ak4PFJets.clone(src = 'particleFlowPUPPI')
-			setattr(proc,"ak4PUPPI",ak4PUPPI)
-			puppi_seq = cms.Sequence(puppi_seq*ak4GenJets*ak4PUPPI)
-			addJetCollection(
-				proc,
-				labelName = 'AK4PUPPIJets',
-				jetSource = cms.InputTag('ak4PUPPI'),
-				algo = 'ak4',
-				rParam = 0.4,
-				jetCorrections = None,
-				trackSource = cms.InputTag('unpackedTracksAndVertices'),
-				pvSource = cms.InputTag('unpackedTracksAndVertices'),
-				#btagDiscriminators = ['combinedSecondaryVertexBJetTags'],
-			)
-			for module in [proc.patJetsAK4PUPPIJets]:
-				module.addJetCharge = False
-				module.addBTagInfo = False
-				module.getJetMCFlavour = False
-				module.addAssociatedTracks = False
-			for module in [proc.patJetPartonMatchAK4PUPPIJets]:
-				module.matched='prunedGenParticles'
+		label = jetRadiusLabel(r)
+
+		genJets = ak4GenJets.clone(src = src_gen, rParam = r)
+		setattr(proc, 'ak%sGenJets' % label, genJets)
+
+		puppiJets = ak4PFJets.clone(src = src_puppi, rParam = r)
+		setattr(proc, 'ak%sPUPPI' % label, puppiJets)
+
+		puppi_seq = cms.Sequence(puppi_seq * genJets * puppiJets)
+
+		if not pat:
+			continue
 
-		elif r==0.8:
-			ak8GenJets = ak4GenJets.clone(rParam=0.8)
-			ak8GenJets.src = 'packedGenParticles'
-			setattr(proc,"ak8GenJets",ak8GenJets)
-			# Select candidates that would pass CHS requirements
-			#AK8PFchs = cms.EDFilter("CandPtrSelector", src = cms.InputTag("packedPFCandidates"), cut = cms.string("fromPV"))
-			#setattr(proc,"ak8PFchsJets",AK8PFchs)
-			#AK8PUPPI = ak4PFJets.clone(src = 'packedPFCandidates', rParam = 0.8)
-			ak8PUPPI = ak4PFJets.clone(src = 'particleFlowPUPPI', rParam = 0.8)
-			setattr(proc,"ak8PUPPI",ak8PUPPI)
-			puppi_seq = cms.Sequence(puppi_seq*ak8GenJets*ak8PUPPI)
-			addJetCollection(
-				proc,
-				labelName = 'AK8PUPPIJets',
-				jetSource = cms.InputTag('ak8PUPPI'),
-				algo = 'ak8',
-				rParam = 0.8,
-				jetCorrections = None,
-				trackSource = cms.InputTag('unpackedTracksAndVertices'),
-				pvSource = cms.InputTag('unpackedTracksAndVertices'),
-				#btagDiscriminators = ['combinedSecondaryVertexBJetTags'],
-			)
-			for module in [proc.patJetsAK8PUPPIJets]:
-				module.addJetCharge = False
-				module.addBTagInfo = False
-				module.getJetMCFlavour = False
-				module.addAssociatedTracks = False
-			for module in [proc.patJetPartonMatchAK8PUPPIJets]:
-				module.matched='prunedGenParticles'
+		addJetCollection(
+			proc,
+			labelName = 'AK%sPUPPIJets' % label,
+			jetSource = cms.InputTag('ak%sPUPPI' % label),
+			algo = 'ak%s' % label,
+			rParam = r,
+			jetCorrections = None,
+			trackSource = cms.InputTag('unpackedTracksAndVertices'),
+			pvSource = cms.InputTag('unpackedTracksAndVertices'),
+			genJetCollection = cms.InputTag('ak%sGenJets' % label),
+			#btagDiscriminators = ['combinedSecondaryVertexBJetTags'],
+		)
+		for module in [getattr(proc, 'patJetsAK%sPUPPIJets' % label)]:
+			module.addJetCharge = False
+			module.addBTagInfo = False
+			module.getJetMCFlavour = False
+			module.addAssociatedTracks = False
+		for module in [getattr(proc, 'patJetPartonMatchAK%sPUPPIJets' % label)]:
+			module.matched='prunedGenParticles'
 
-	setattr(proc, seq_name, puppi_seq)
\ No newline at end of file
+	setattr(proc, seq_name, puppi_seq)
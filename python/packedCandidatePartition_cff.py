@@ -0,0 +1,7 @@
+import FWCore.ParameterSet.Config as cms
+
+# One-pass split of the packed candidates into the CHLV, CHPU, Photons, NH and
+# WoMuon Ptr collections, as instances of the module (e.g. 'packedPFCandidatesPartition:WoMuon')
+packedPFCandidatesPartition = cms.EDProducer('PackedCandidatePartitionProducer',
+        src = cms.InputTag('packedPFCandidates')
+        )
@@ -0,0 +1,8 @@
+import FWCore.ParameterSet.Config as cms
+
+# Struct-of-arrays view of the packed candidates and vertex information,
+# built once per event and shared by the analyzers (srcPackedCandidates)
+packedCandidateSoA = cms.EDProducer('PackedCandidateSoAProducer',
+        src    = cms.InputTag('packedPFCandidates'),
+        srcVtx = cms.InputTag('offlineSlimmedPrimaryVertices')
+        )
@@ -1,18 +1,31 @@
 import FWCore.ParameterSet.Config as cms
 
-from CommonTools.PileupAlgos.Puppi_cff import *
+def load_pfPUPPI_sequence(proc, seq_name, algo, src_puppi='particleFlow', src_vtx='offlinePrimaryVertices', cone_puppi_central=0.3, select_input=True, split_in_one_pass=False):
+    """PUPPI weights of src_puppi, and the PUPPI candidates split in charged
+    hadrons, neutral hadrons and photons.
 
-from CommonTools.ParticleFlow.ParticleSelectors.pfAllChargedHadrons_cfi import *
-from CommonTools.ParticleFlow.ParticleSelectors.pfAllNeutralHadrons_cfi import *
-from CommonTools.ParticleFlow.ParticleSelectors.pfAllPhotons_cfi import *
+    select_input: add the selection of the hadrons and photons,
+    pfAllHadronsAndPhotonsFor<algo>, to be used as src_puppi
+    split_in_one_pass: split the candidates with one CandidatePdgIdSplitter,
+    pf<algo>Candidates with instances ChargedHadrons, NeutralHadrons and
+    Photons, instead of the three selectors pf<algo>ChargedHadrons, ..."""
 
-def load_pfPUPPI_sequence(proc, seq_name, algo, src_puppi='particleFlow', src_vtx='offlinePrimaryVertices', cone_puppi_central=0.3):
+    # imported here, so that loading this file stays cheap
+    from CommonTools.PileupAlgos.Puppi_cff import puppi
 
-    setattr(proc, 'pfAllHadronsAndPhotonsFor'+algo,
-      pfAllNeutralHadrons.clone( src = cms.InputTag('particleFlow'),
-        pdgId = cms.vint32(22,111,130,310,2112,211,-211,321,-321,999211,2212,-2212)
-      )
-    )
+    from CommonTools.ParticleFlow.ParticleSelectors.pfAllChargedHadrons_cfi import pfAllChargedHadrons
+    from CommonTools.ParticleFlow.ParticleSelectors.pfAllNeutralHadrons_cfi import pfAllNeutralHadrons
+    from CommonTools.ParticleFlow.ParticleSelectors.pfAllPhotons_cfi import pfAllPhotons
+
+    pf_puppi_seq = cms.Sequence()
+
+    if select_input:
+        setattr(proc, 'pfAllHadronsAndPhotonsFor'+algo,
+          pfAllNeutralHadrons.clone( src = cms.InputTag('particleFlow'),
+            pdgId = cms.vint32(22,111,130,310,2112,211,-211,321,-321,999211,2212,-2212)
+          )
+        )
+        pf_puppi_seq += getattr(proc, 'pfAllHadronsAndPhotonsFor'+algo)
 
     setattr(proc, 'particleFlow'+algo,
       puppi.clone( 
@@ -22,17 +35,27 @@ def load_pfPUPPI_sequence(proc, seq_name, algo, src_puppi='particleFlow', src_vt
     )
     # configure parameter PuppiCentral.cone
     getattr(proc, 'particleFlow'+algo).algos[0].puppiAlgos[0].cone = cone_puppi_central
-
-    setattr(proc, 'pf'+algo+'ChargedHadrons', pfAllChargedHadrons.clone(src = cms.InputTag('particleFlow'+algo)))
-    setattr(proc, 'pf'+algo+'NeutralHadrons', pfAllNeutralHadrons.clone(src = cms.InputTag('particleFlow'+algo)))
-    setattr(proc, 'pf'+algo+'Photons', pfAllPhotons.clone(src = cms.InputTag('particleFlow'+algo)))
-
-    pf_puppi_seq = cms.Sequence(
-        getattr(proc, 'pfAllHadronsAndPhotonsFor'+algo)
-      * getattr(proc, 'particleFlow'+algo)
-      * getattr(proc, 'pf'+algo+'ChargedHadrons')
-      * getattr(proc, 'pf'+algo+'NeutralHadrons')
-      * getattr(proc, 'pf'+algo+'Photons')
-    )
+    pf_puppi_seq += getattr(proc, 'particleFlow'+algo)
+
+    if split_in_one_pass:
+        setattr(proc, 'pf'+algo+'Candidates',
+          cms.EDProducer('CandidatePdgIdSplitter',
+            src = cms.InputTag('particleFlow'+algo),
+            splits = cms.PSet(
+              ChargedHadrons = pfAllChargedHadrons.pdgId,
+              NeutralHadrons = pfAllNeutralHadrons.pdgId,
+              Photons        = pfAllPhotons.pdgId
+            )
+          )
+        )
+        pf_puppi_seq += getattr(proc, 'pf'+algo+'Candidates')
+    else:
+        setattr(proc, 'pf'+algo+'ChargedHadrons', pfAllChargedHadrons.clone(src = cms.InputTag('particleFlow'+algo)))
+        setattr(proc, 'pf'+algo+'NeutralHadrons', pfAllNeutralHadrons.clone(src = cms.InputTag('particleFlow'+algo)))
+        setattr(proc, 'pf'+algo+'Photons', pfAllPhotons.clone(src = cms.InputTag('particleFlow'+algo)))
+
+        pf_puppi_seq += getattr(proc, 'pf'+algo+'ChargedHadrons')
+        pf_puppi_seq += getattr(proc, 'pf'+algo+'NeutralHadrons')
+        pf_puppi_seq += getattr(proc, 'pf'+algo+'Photons')
 
     setattr(proc, seq_name, pf_puppi_seq)
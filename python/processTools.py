@@ -0,0 +1,437 @@
+"""
+Passes over a finished cms.Process.
+
+The configuration tools used here (runMuonIsolation, load_pfPUPPI_sequence,
+load_PUPPIJet_sequence, jetToolbox, convertPFToPATJet, ...) each create the
+modules they need, so the same module often ends up in the process several
+times under different labels (e.g. ak4GenJets and AK4GenJets).
+
+mergeDuplicateModules(process) finds the producers and filters with the same
+type and the same parameters, keeps one of them, and moves all the InputTags
+and sequences to it:
+
+    from JMEAnalysis.JMEValidator.processTools import mergeDuplicateModules
+    mergeDuplicateModules(process, timeReport='previous_job.log')
+
+The products of a merged module are only written under the label kept: the
+modules whose products an output module keeps explicitly are never merged
+away, and the branches lost by the output modules keeping everything are
+reported.
+
+pruneUnusedProducers(process) follows the consumes graph from the analyzers,
+the output modules (outputCommands) and the filters of the paths, and removes
+the producers and filters that nothing reaches.
+
+When the log of a previous job with wantSummary is given, the reports show the
+time per event and the events per second saved.
+"""
+
+import fnmatch
+import re
+
+import FWCore.ParameterSet.Config as cms
+
+
+def _splitTag(tag, processName):
+    """(label, instance, process) of an InputTag or of its string form, with
+    the current process name replaced by ''."""
+
+    if isinstance(tag, cms.InputTag):
+        fields = [tag.getModuleLabel(), tag.getProductInstanceLabel(), tag.getProcessName()]
+    else:
+        fields = (str(tag).split(':') + ['', ''])[:3]
+
+    if fields[2] == processName:
+        fields[2] = ''
+    return tuple(fields)
+
+
+def _signature(param, processName):
+    """Canonical string of a parameter, with the InputTags resolved."""
+
+    if isinstance(param, cms.InputTag):
+        return 'InputTag%r' % (_splitTag(param, processName),)
+
+    if isinstance(param, cms.VInputTag):
+        return 'VInputTag[%s]' % ','.join(repr(_splitTag(tag, processName)) for tag in param)
+
+    if isinstance(param, cms.VPSet):
+        return 'VPSet[%s]' % ','.join(_signature(pset, processName) for pset in param)
+
+    if isinstance(param, cms.PSet) or hasattr(param, 'parameterNames_'):
+        fields = ['%s=%s' % (name, _signature(getattr(param, name), processName)) for name in sorted(param.parameterNames_())]
+        tracked = '' if not hasattr(param, 'isTracked') or param.isTracked() else 'untracked '
+        return '%s%s(%s)' % (tracked, type(param).__name__, ','.join(fields))
+
+    return param.dumpPython()
+
+
+def moduleSignature(module, processName=''):
+    """Canonical string of a module: kind, type and fully resolved parameters.
+    Two modules with the same signature produce the same products."""
+
+    return '%s(%r,%s)' % (type(module).__name__, module.type_(), _signature(module, processName))
+
+
+def _visitParameters(param, visitor):
+    """Call visitor(container, name) for each parameter below param."""
+
+    if isinstance(param, cms.VPSet):
+        for pset in param:
+            _visitParameters(pset, visitor)
+    elif hasattr(param, 'parameterNames_'):
+        for name in param.parameterNames_():
+            visitor(param, name)
+            _visitParameters(getattr(param, name), visitor)
+
+
+def _modules(process):
+    modules = {}
+    for modulesOfKind in [process.producers_(), process.filters_(), process.analyzers_(), process.outputModules_()]:
+        modules.update(modulesOfKind)
+    return modules
+
+
+def _stringValues(process):
+    """All the cms.string and cms.vstring values of the modules. A label found
+    here may be a module reference which is not an InputTag."""
+
+    values = set()
+
+    def visit(container, name):
+        param = getattr(container, name)
+        if isinstance(param, cms.string):
+            values.add(param.value())
+        elif isinstance(param, cms.vstring):
+            values.update(param)
+
+    for module in _modules(process).values():
+        _visitParameters(module, visit)
+
+    return values
+
+
+def _rewire(process, old, new):
+    """Point all the InputTags reading module old to module new."""
+
+    processName = process.name_()
+
+    def retarget(tag):
+        label, instance, processOfTag = _splitTag(tag, processName)
+        if label != old or processOfTag != '':
+            return tag
+        if isinstance(tag, cms.InputTag):
+            tag.setModuleLabel(new)
+            return tag
+        return ':'.join([new] + [field for field in str(tag).split(':')[1:]])
+
+    def visit(container, name):
+        param = getattr(container, name)
+        if isinstance(param, cms.InputTag):
+            retarget(param)
+        elif isinstance(param, cms.VInputTag):
+            for i in range(len(param)):
+                param[i] = retarget(param[i])
+
+    for module in _modules(process).values():
+        _visitParameters(module, visit)
+
+
+def readTimeReport(fileName):
+    """Real time per event of each module, and of the event loop (None if not
+    found), from the TimeReport printed with wantSummary in a job log."""
+
+    modules = {}
+    eventLoop = None
+    inModuleSummary = False
+
+    with open(fileName) as log:
+        for line in log:
+            match = re.search(r'event loop Real/event\s*=\s*([0-9.eE+-]+)', line)
+            if match:
+                eventLoop = float(match.group(1))
+                continue
+
+            if not line.startswith('TimeReport'):
+                inModuleSummary = False
+                continue
+
+            if '---' in line:
+                inModuleSummary = 'Module Summary' in line
+                continue
+
+            fields = line.split()[1:]
+            if not inModuleSummary or len(fields) < 2:
+                continue
+
+            try:
+                times = [float(field) for field in fields[:-1]]
+            except ValueError:
+                continue
+
+            # 'per event, per exec, per visit', for the CPU and real times in
+            # older releases: the real time per event is the first of the last three
+            modules[fields[-1]] = times[len(times) - 3] if len(times) >= 3 else times[0]
+
+    if eventLoop is None and modules:
+        eventLoop = sum(modules.values())
+
+    return modules, eventLoop
+
+
+def mergeDuplicateModules(process, timeReport=None, verbose=True):
+    """Merge the producers and filters with the same signature. Returns the
+    list of (removed label, kept label).
+
+    A module whose products an output module keeps explicitly (a keep statement
+    matching its label) is never removed, it can only be the one kept. The
+    output modules keeping all the products lose the branches of the removed
+    labels: they are listed in the report."""
+
+    processName = process.name_()
+    merged = []
+
+    # Merging modules makes their consumers identical: repeat until stable
+    while True:
+        stringValues = _stringValues(process)
+        candidates = dict(process.producers_())
+        candidates.update(process.filters_())
+        protected = _explicitlyKeptLabels(process, candidates)
+
+        groups = {}
+        for label in sorted(candidates):
+            if label in stringValues:
+                continue
+            groups.setdefault(moduleSignature(candidates[label], processName), []).append(label)
+
+        duplicates = []
+        for group in groups.values():
+            kept = [label for label in group if label in protected]
+            survivor = kept[0] if kept else group[0]
+            duplicates += [(label, survivor) for label in group if label != survivor and label not in kept]
+
+        if not duplicates:
+            break
+
+        for label, survivor in sorted(duplicates):
+            module, survivorModule = getattr(process, label), getattr(process, survivor)
+
+            _rewire(process, label, survivor)
+            for sequence in list(process.sequences_().values()) + list(process.paths_().values()) + list(process.endpaths_().values()):
+                sequence.replace(module, survivorModule)
+            delattr(process, label)
+
+            merged.append((label, survivor))
+
+    if verbose:
+        _printReport(merged, timeReport)
+        _printLostBranches(process, merged)
+
+    return merged
+
+
+def _printLostBranches(process, merged):
+    """Warn about the branches the output modules keeping all the products do
+    not write anymore, under the labels removed by mergeDuplicateModules."""
+
+    outputModules = sorted(label for label, module in process.outputModules_().items() if _keepsAll(module))
+    if not merged or not outputModules:
+        return
+
+    print('mergeDuplicateModules: WARNING: branches not written anymore by the output modules keeping all the products (%s):'
+          % ', '.join(outputModules))
+    for label, survivor in merged:
+        print('  %-60s now %s' % ('*_%s_*_%s' % (label, process.name_()), '*_%s_*_%s' % (survivor, process.name_())))
+
+
+def _printReport(merged, timeReport):
+    if not merged:
+        print('mergeDuplicateModules: no duplicate modules')
+        return
+
+    modules, eventLoop = readTimeReport(timeReport) if timeReport else ({}, None)
+
+    print('mergeDuplicateModules: %d modules merged' % len(merged))
+    print('  %-40s %-40s %12s %12s' % ('removed', 'kept', 'ms/event', 'events/s'))
+
+    saved = 0.
+    for label, survivor in merged:
+        if label in modules and eventLoop:
+            time = modules[label]
+            saved += time
+            gain = 1. / max(eventLoop - time, 1e-12) - 1. / eventLoop
+            print('  %-40s %-40s %12.3f %+12.2f' % (label, survivor, time * 1e3, gain))
+        else:
+            print('  %-40s %-40s %12s %12s' % (label, survivor, 'n/a', 'n/a'))
+
+    if eventLoop:
+        print('  total: %.3f ms/event saved, %.2f -> %.2f events/s' % (saved * 1e3, 1. / eventLoop, 1. / max(eventLoop - saved, 1e-12)))
+
+
+def _references(module, processName, labels):
+    """Labels of the modules read by a module: InputTags of the current process,
+    and strings equal to a module label (references which are not InputTags)."""
+
+    references = set()
+
+    def visit(container, name):
+        param = getattr(container, name)
+        if isinstance(param, cms.InputTag):
+            tags = [param]
+        elif isinstance(param, cms.VInputTag):
+            tags = list(param)
+        elif isinstance(param, cms.string):
+            tags = [param.value()] if param.value() in labels else []
+        elif isinstance(param, cms.vstring):
+            tags = [value for value in param if value in labels]
+        else:
+            return
+
+        for tag in tags:
+            label, instance, processOfTag = _splitTag(tag, processName)
+            if processOfTag == '':
+                references.add(label)
+
+    _visitParameters(module, visit)
+    return references
+
+
+def _keepStatements(outputModule):
+    """Patterns of the keep statements of an output module, None when it keeps
+    all the products (no outputCommands, or 'keep *')."""
+
+    commands = outputModule.outputCommands if hasattr(outputModule, 'outputCommands') else []
+    if len(commands) == 0:
+        return None
+
+    patterns = []
+    for command in commands:
+        fields = command.split()
+        if len(fields) != 2 or fields[0] != 'keep':
+            continue
+        if fields[1] == '*':
+            return None
+        patterns.append(fields[1])
+
+    return patterns
+
+
+def _keepsAll(outputModule):
+    return _keepStatements(outputModule) is None
+
+
+def _keptLabels(outputModule, labels):
+    """Labels of the modules with products kept by an output module. The
+    outputCommands are 'keep|drop type_label_instance_process' patterns; all
+    the products are kept when there are none. The drop statements are ignored,
+    which may keep too many modules but never too few."""
+
+    patterns = _keepStatements(outputModule)
+    if patterns is None:
+        return set(labels)
+
+    kept = set()
+    for pattern in patterns:
+        branch = (pattern.split('_') + ['*'] * 4)[:4]
+        kept.update(label for label in labels if fnmatch.fnmatchcase(label, branch[1]))
+
+    return kept
+
+
+def _explicitlyKeptLabels(process, labels):
+    """Labels matched by a keep statement of an output module which does not
+    keep all the products."""
+
+    kept = set()
+    for outputModule in process.outputModules_().values():
+        if not _keepsAll(outputModule):
+            kept |= _keptLabels(outputModule, labels)
+    return kept
+
+
+def _scheduledModules(process):
+    """Labels of the modules in the paths and end paths."""
+
+    class Visitor(object):
+        def __init__(self):
+            self.labels = set()
+
+        def enter(self, visitee):
+            if hasattr(visitee, 'label_') and hasattr(visitee, 'type_'):
+                self.labels.add(visitee.label_())
+
+        def leave(self, visitee):
+            pass
+
+    visitor = Visitor()
+    for path in list(process.paths_().values()) + list(process.endpaths_().values()):
+        path.visit(visitor)
+    return visitor.labels
+
+
+def unusedProducers(process):
+    """Labels of the producers and filters whose products reach no analyzer,
+    no output module and no filter of a path, in the consumes graph."""
+
+    processName = process.name_()
+    modules = _modules(process)
+    labels = set(modules)
+
+    producers = set(process.producers_()) | set(process.filters_())
+    scheduled = _scheduledModules(process)
+
+    # The consumers of the products: analyzers, output modules, and the filters
+    # deciding the paths
+    reached = set(process.analyzers_())
+    reached |= set(process.outputModules_())
+    reached |= set(label for label in process.filters_() if label in scheduled)
+    for outputModule in process.outputModules_().values():
+        reached |= _keptLabels(outputModule, producers)
+
+    toVisit = list(reached)
+    while toVisit:
+        label = toVisit.pop()
+        for reference in _references(modules[label], processName, labels):
+            if reference in modules and reference not in reached:
+                reached.add(reference)
+                toVisit.append(reference)
+
+    return sorted(producers - reached)
+
+
+def pruneUnusedProducers(process, timeReport=None, remove=True, verbose=True):
+    """Remove (or only report, with remove=False) the producers and filters that
+    nothing reaches. Returns their labels.
+
+    With allowUnscheduled, an unused producer which is in no path is never run:
+    removing it only saves its construction. The time per event saved, read
+    from the TimeReport of a previous job when given, comes from the ones
+    which are in a path."""
+
+    unused = unusedProducers(process)
+
+    if remove:
+        for label in unused:
+            module = getattr(process, label)
+            for sequence in list(process.sequences_().values()) + list(process.paths_().values()) + list(process.endpaths_().values()):
+                while sequence.remove(module):
+                    pass
+            delattr(process, label)
+
+    if verbose:
+        modules, eventLoop = readTimeReport(timeReport) if timeReport else ({}, None)
+
+        print('pruneUnusedProducers: %d unused producers%s' % (len(unused), ' removed' if remove else ''))
+
+        saved = 0.
+        for label in unused:
+            if label in modules:
+                saved += modules[label]
+                print('  %-60s %12.3f ms/event' % (label, modules[label] * 1e3))
+            else:
+                print('  %-60s %12s' % (label, 'not run'))
+
+        if eventLoop:
+            print('  total: %.3f ms/event saved, %.2f -> %.2f events/s' % (saved * 1e3, 1. / eventLoop, 1. / max(eventLoop - saved, 1e-12)))
+
+    return unused
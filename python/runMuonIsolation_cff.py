@@ -29,14 +29,13 @@ def runMuonIsolation(process):
 	process.load("PhysicsTools.PatAlgos.selectionLayer1.selectedPatCandidates_cff")
 	process.load("JMEAnalysis.JMEValidator.convertPackedCandToRecoCand_cff")
 	
-	process.packedPFCandidatesWoMuon  = cms.EDFilter("CandPtrSelector", src = cms.InputTag("packedPFCandidates"), cut = cms.string("fromPV>=2 && abs(pdgId)!=13 " ) )
-	convertedPackedPFCandidatesWoMuon = cms.EDProducer('convertCandToRecoCand',
-							   src = cms.InputTag('packedPFCandidatesWoMuon')
-							   )
-	
-	setattr( process, 'convertedPackedPFCandidatesWoMuon', convertedPackedPFCandidatesWoMuon )
-	process.patseq = cms.Sequence(process.convertedPackedPFCandidates *
-				      convertedPackedPFCandidatesWoMuon *
+	process.load("JMEAnalysis.JMEValidator.packedCandidatePartition_cff")
+	# Only the candidates without muons are used, as the PUPPI input below: the
+	# other partitions would be built and written for nothing
+	process.packedPFCandidatesPartition.partitions = cms.vstring('WoMuon')
+	
+	process.patseq = cms.Sequence(process.packedPFCandidatesPartition *
+				      process.convertedPackedPFCandidates *
 				      process.patCandidates * process.selectedPatCandidates)
 	process.p = cms.Path(process.patseq)
 	
@@ -68,25 +67,26 @@ def runMuonIsolation(process):
 	process.load('CommonTools.ParticleFlow.deltaBetaWeights_cff')
 	
 	# -- PUPPI
+	# PUPPI reads the packed candidates directly, and its output is split in
+	# charged hadrons, neutral hadrons and photons by one module per algo
+	# (pfPUPPICandidates:ChargedHadrons, ...)
 	from JMEAnalysis.JMEValidator.pfPUPPISequence_cff import *
 	load_pfPUPPI_sequence(process, 'pfPUPPISequence', algo = 'PUPPI',
-	  src_puppi = 'pfAllHadronsAndPhotonsForPUPPI',
-	  cone_puppi_central = 0.5
+	  src_puppi = 'packedPFCandidates',
+	  src_vtx = 'offlineSlimmedPrimaryVertices',
+	  cone_puppi_central = 0.5,
+	  select_input = False,
+	  split_in_one_pass = True
 	)
 	
-	# change the input collections
-	process.pfAllHadronsAndPhotonsForPUPPI.src = 'convertedPackedPFCandidates'
-	process.particleFlowPUPPI.candName = 'packedPFCandidates'
-	process.particleFlowPUPPI.vertexName = 'offlineSlimmedPrimaryVertices'
-	
 	# -- PUPPI isolation calculation without muon
 	load_pfPUPPI_sequence(process, 'pfNoMuonPUPPISequence', algo = 'NoMuonPUPPI',
-	  src_puppi = 'pfAllHadronsAndPhotonsForNoMuonPUPPI',
-	  cone_puppi_central = 0.5
+	  src_puppi = 'packedPFCandidatesPartition:WoMuon',
+	  src_vtx = 'offlineSlimmedPrimaryVertices',
+	  cone_puppi_central = 0.5,
+	  select_input = False,
+	  split_in_one_pass = True
 	)
-	process.pfAllHadronsAndPhotonsForNoMuonPUPPI.src = 'convertedPackedPFCandidatesWoMuon'
-	process.particleFlowNoMuonPUPPI.candName         = 'packedPFCandidatesWoMuon'
-	process.particleFlowNoMuonPUPPI.vertexName       = 'offlineSlimmedPrimaryVertices'
 	
 	from JMEAnalysis.JMEValidator.makePUPPIJets_cff import *
 	load_PUPPIJet_sequence(process,"PUPPIJetSequence",[0.4,0.8])
@@ -110,18 +110,11 @@ def runMuonIsolation(process):
 	from JMEAnalysis.JMEValidator.MuonPFIsolationSequence_cff import *
 	muon_src, cone_size = 'selectedPatMuons', 0.4
 	
-	process.pfCHLVForIso = cms.EDFilter("CandPtrSelector", src = cms.InputTag("packedPFCandidates"), cut = cms.string("fromPV>=2 && abs(charge) > 0"))
-	process.pfCHPUForIso = cms.EDFilter("CandPtrSelector", src = cms.InputTag("packedPFCandidates"), cut = cms.string("fromPV<=1 && abs(charge) > 0"))
-	process.pfPhotonsForIso = cms.EDFilter("CandPtrSelector", src = cms.InputTag("packedPFCandidates"), cut = cms.string("pdgId==22"))
-	process.pfNHForIso = cms.EDFilter("CandPtrSelector", src = cms.InputTag("packedPFCandidates"), cut = cms.string("pdgId!=22 && abs(charge) == 0" ))
-	
-	load_muonPFiso_sequence(process, 'MuonPFIsoSequenceSTAND', algo = 'R04STAND',
+	# Standard isolation, all the cones in one pass over the packed candidates (the
+	# CH, NH, Ph and PU selections are done by the MuonGridIsolationProducer)
+	load_muonPFiso_grid(process, 'muPFIsoGridSTAND',
 	  src = muon_src,
-	  src_charged_hadron = 'pfCHLVForIso',
-	  src_neutral_hadron = 'pfNHForIso',
-	  src_photon         = 'pfPhotonsForIso',
-	  src_charged_pileup = 'pfCHPUForIso',
-	  coneR = cone_size
+	  cones = [0.3, cone_size]
 	)
 	
 	load_muonPFiso_sequence(process, 'MuonPFIsoSequencePFWGT', algo = 'R04PFWGT',
@@ -133,17 +126,17 @@ def runMuonIsolation(process):
 	
 	load_muonPFiso_sequence(process, 'MuonPFIsoSequencePUPPI', algo = 'R04PUPPI',
 	  src = muon_src,
-	  src_charged_hadron = 'pfPUPPIChargedHadrons',
-	  src_neutral_hadron = 'pfPUPPINeutralHadrons',
-	  src_photon         = 'pfPUPPIPhotons',
+	  src_charged_hadron = 'pfPUPPICandidates:ChargedHadrons',
+	  src_neutral_hadron = 'pfPUPPICandidates:NeutralHadrons',
+	  src_photon         = 'pfPUPPICandidates:Photons',
 	  coneR = cone_size
 	)
 	
 	load_muonPFiso_sequence(process, 'MuonPFIsoSequenceNoMuonPUPPI', algo = 'R04NOMUONPUPPI',
 	  src = muon_src,
-	  src_charged_hadron = 'pfNoMuonPUPPIChargedHadrons',
-	  src_neutral_hadron = 'pfNoMuonPUPPINeutralHadrons',
-	  src_photon         = 'pfNoMuonPUPPIPhotons',
+	  src_charged_hadron = 'pfNoMuonPUPPICandidates:ChargedHadrons',
+	  src_neutral_hadron = 'pfNoMuonPUPPICandidates:NeutralHadrons',
+	  src_photon         = 'pfNoMuonPUPPICandidates:Photons',
 	  coneR = cone_size
 	)
 	
@@ -154,7 +147,7 @@ def runMuonIsolation(process):
 	process.p.remove(process.patMuons)
 	
 	process.MuonPFIsoSequences = cms.Sequence(
-	  process.MuonPFIsoSequenceSTAND *
+	  process.muPFIsoGridSTAND *
 	  process.MuonPFIsoSequencePFWGT *
 	  process.MuonPFIsoSequencePUPPI *
 	  process.MuonPFIsoSequenceNoMuonPUPPI
@@ -166,24 +159,42 @@ def runMuonIsolation(process):
 	  process.MuonPFIsoSequences
 	)
 	
+	# Isolation sums of all the flavours, one record per muon of muon_src. Only
+	# the sums computed by the sequences above are read, the others are 0
+	def isolationSums(algo, components):
+	  sums = cms.PSet()
+	  for component in components:
+	    setattr(sums, component, cms.InputTag('muPFIsoValue'+component+algo))
+	  return sums
+
+	def gridIsolationSums(grid, cone):
+	  sums = cms.PSet()
+	  for component in ['CH', 'NH', 'Ph', 'PU']:
+	    setattr(sums, component, cms.InputTag(grid, gridIsolationLabel(component, cone)))
+	  return sums
+
+	process.muonIsolationRecords = cms.EDProducer("MuonIsolationRecordProducer",
+	                                       src               = cms.InputTag( muon_src ),
+	                                       STAND             = gridIsolationSums('muPFIsoGridSTAND', cone_size),
+	                                       PFWGT             = isolationSums('R04PFWGT', ['NH', 'Ph']),
+	                                       PUPPI             = isolationSums('R04PUPPI', ['CH', 'NH', 'Ph']),
+	                                       NOMUONPUPPI       = isolationSums('R04NOMUONPUPPI', ['CH', 'NH', 'Ph'])
+	                                       )
+	
 	process.leptonsAndMET = cms.EDAnalyzer("LeptonsAndMETAnalyzer",
 	                                       srcIsoMuons = cms.InputTag("selectedMuonsForZ"),
 	                                       srcMET = cms.InputTag("slimmedMETs"),
 	                                       srcPUPPET = cms.InputTag("pfMetPuppi"),
 	                                       srcVtx            = cms.InputTag('offlineSlimmedPrimaryVertices'),
 	                                       srcMuons          = cms.InputTag( muon_src ),
-	                                       srcVMCHSTAND      = cms.InputTag('muPFIsoValueCHR04STAND'),
-	                                       srcVMNHSTAND      = cms.InputTag('muPFIsoValueNHR04STAND'),
-	                                       srcVMPhSTAND      = cms.InputTag('muPFIsoValuePhR04STAND'),
-	                                       srcVMPUSTAND      = cms.InputTag('muPFIsoValuePUR04STAND'),
-	                                       srcVMCHPFWGT      = cms.InputTag('muPFIsoValueCHR04PFWGT'),
-	                                       srcVMNHPFWGT      = cms.InputTag('muPFIsoValueNHR04PFWGT'),
-	                                       srcVMPhPFWGT      = cms.InputTag('muPFIsoValuePhR04PFWGT'),
-	                                       srcVMCHPUPPI      = cms.InputTag('muPFIsoValueCHR04PUPPI'),
-	                                       srcVMNHPUPPI      = cms.InputTag('muPFIsoValueNHR04PUPPI'),
-	                                       srcVMPhPUPPI      = cms.InputTag('muPFIsoValuePhR04PUPPI'),
-	                                       srcVMCHNOMUONPUPPI      = cms.InputTag('muPFIsoValueCHR04NOMUONPUPPI'),
-	                                       srcVMNHNOMUONPUPPI      = cms.InputTag('muPFIsoValueNHR04NOMUONPUPPI'),
-	                                       srcVMPhNOMUONPUPPI      = cms.InputTag('muPFIsoValuePhR04NOMUONPUPPI')
+	                                       srcIsolation      = cms.InputTag('muonIsolationRecords'),
+	                                       # Z candidate: opposite-charge pair closest to zMass ('closestMass') or with the highest pt ('highestPt')
+	                                       zMass             = cms.double(91.2),
+	                                       zMassWindow       = cms.double(15.),
+	                                       zSelection        = cms.string('closestMass'),
+	                                       # u_par / ZpT and u_perp in (ZpT, NPV) bins, mergeable with hadd, in
+	                                       # the 'recoil' directory. With writeTree = False, only these are written
+	                                       recoil            = cms.PSet(),
+	                                       writeTree         = cms.bool(True)
 	                                       )
 	
@@ -3,27 +3,217 @@
 
 #include "JMEAnalysis/JMEValidator/interface/Analyzer.h"
 
+#include <Compression.h>
+#include <TBranch.h>
+#include <TBranchElement.h>
 #include <TTree.h>
 
-JME::Analyzer::Analyzer(const edm::ParameterSet& iConfig)
-    : moduleLabel_(iConfig.getParameter<std::string>("@module_label")) {
+JME::AnalyzerOutput::AnalyzerOutput(const edm::ParameterSet& iConfig)
+    : moduleLabel(iConfig.getParameter<std::string>("@module_label"))
+    , writeTree(true)
+    , timing(iConfig.getUntrackedParameter<bool>("timing", false)) {
+
+        if (iConfig.existsAs<bool>("writeTree"))
+            writeTree = iConfig.getParameter<bool>("writeTree");
+
+        timingJSON = iConfig.getUntrackedParameter<std::string>("timingJSON", "");
+        if (timingJSON.empty())
+            timingJSON = moduleLabel + "_timing.json";
+    }
+
+JME::Analyzer::Analyzer(const edm::ParameterSet& iConfig, const AnalyzerOutput* output)
+    : moduleLabel_(iConfig.getParameter<std::string>("@module_label"))
+    , streamID_(-1)
+    , compressionLevel_(-1)
+    , basketSize_(0)
+    , autoFlush_(0) {
 
         if (iConfig.existsAs<std::string>("treeName"))
             treeName_ = iConfig.getParameter<std::string>("treeName");
         else
             treeName_ = "t";
+
+        if (iConfig.existsAs<std::vector<std::string>>("disabledBranchGroups")) {
+            const std::vector<std::string>& groups = iConfig.getParameter<std::vector<std::string>>("disabledBranchGroups");
+            disabledBranchGroups_.insert(groups.begin(), groups.end());
+        }
+
+        if (iConfig.existsAs<std::string>("compressionAlgorithm"))
+            compressionAlgorithm_ = iConfig.getParameter<std::string>("compressionAlgorithm");
+
+        if (iConfig.existsAs<int>("compressionLevel"))
+            compressionLevel_ = iConfig.getParameter<int>("compressionLevel");
+
+        if (iConfig.existsAs<int>("basketSize"))
+            basketSize_ = iConfig.getParameter<int>("basketSize");
+
+        if (iConfig.existsAs<long long>("autoFlush"))
+            autoFlush_ = iConfig.getParameter<long long>("autoFlush");
+
+        timing_.setEnabled(output->timing.enabled());
     }
 
 JME::Analyzer::~Analyzer() {
     // Empty
 }
 
-void JME::Analyzer::beginJob()
-{
+std::unique_ptr<JME::AnalyzerOutput> JME::Analyzer::initializeGlobalCache(const edm::ParameterSet& iConfig) {
+    return initializeOutput(std::unique_ptr<AnalyzerOutput>(new AnalyzerOutput(iConfig)), iConfig);
+}
+
+std::unique_ptr<JME::AnalyzerOutput> JME::Analyzer::initializeOutput(std::unique_ptr<AnalyzerOutput> output, const edm::ParameterSet& iConfig) {
+    // The tree is created at construction time, when the TFileService directory
+    // of the module is the current one. Its branches are created by the first stream
     edm::Service<TFileService> fs;
     if (!fs)
         throw edm::Exception(edm::errors::Configuration, "TFileService missing from configuration!");
 
-    TTree* tree_ = fs->make<TTree>(treeName_.c_str(), treeName_.c_str());
-    tree.init(tree_);
+    std::string treeName = iConfig.existsAs<std::string>("treeName") ? iConfig.getParameter<std::string>("treeName") : "t";
+    output->tree = fs->make<TTree>(treeName.c_str(), treeName.c_str());
+
+    return output;
+}
+
+void JME::Analyzer::globalEndJob(const AnalyzerOutput* output) {
+    // Branch addresses point to the buffers of the streams, which are gone
+    output->tree->ResetBranchAddresses();
+
+    output->timing.book();
+    output->timing.writeJSON(output->timingJSON, output->moduleLabel);
+
+    output->endJob();
+}
+
+void JME::Analyzer::declareBranchGroup(const std::string& group, const std::vector<std::string>& branches) {
+    std::vector<std::string>& groupBranches = branchGroups_[group];
+    groupBranches.insert(groupBranches.end(), branches.begin(), branches.end());
+}
+
+void JME::Analyzer::beginStream(edm::StreamID streamID)
+{
+    streamID_ = streamID.value();
+
+    // Tree of this stream, in memory only. It holds the branch buffers, and is
+    // never filled: commit() fills the output tree from its buffers
+    streamTree_.reset(new TTree(treeName_.c_str(), treeName_.c_str()));
+    streamTree_->SetDirectory(0);
+    tree.init(streamTree_.get());
+
+    removeDisabledBranches(streamTree_.get());
+
+    TTree* output = globalCache()->tree;
+    {
+        std::lock_guard<std::mutex> lock(globalCache()->mutex);
+        if (output->GetNbranches() == 0) {
+            TIter next(streamTree_->GetListOfBranches());
+            while (TBranch* branch = static_cast<TBranch*>(next())) {
+                if (branch->InheritsFrom(TBranchElement::Class())) {
+                    TBranchElement* element = static_cast<TBranchElement*>(branch);
+                    output->Branch(element->GetName(), element->GetClassName(), element->GetAddress());
+                } else {
+                    output->Branch(branch->GetName(), branch->GetAddress(), branch->GetTitle());
+                }
+            }
+
+            configureOutputTree(output);
+            beginOutput(output);
+
+            globalCache()->boundStream = -1;
+        }
+    }
+
+    branches_.clear();
+    TIter next(streamTree_->GetListOfBranches());
+    while (TBranch* branch = static_cast<TBranch*>(next())) {
+        TBranch* outputBranch = output->GetBranch(branch->GetName());
+        if (!outputBranch)
+            throw edm::Exception(edm::errors::LogicError) << "Branch '" << branch->GetName() << "' of module " << moduleLabel_ << " missing from the output tree";
+
+        branches_.push_back(std::make_pair(outputBranch, branch));
+    }
+
+    // TreeWrapper::fill() is still used to reset the values after each commit,
+    // but nothing is written in the tree of the stream
+    streamTree_->SetBranchStatus("*", 0);
+}
+
+void JME::Analyzer::endStream()
+{
+    std::lock_guard<std::mutex> lock(globalCache()->mutex);
+    globalCache()->timing.merge(timing_);
+
+    if (globalCache()->boundStream == streamID_)
+        globalCache()->boundStream = -1;
+}
+
+void JME::Analyzer::commit()
+{
+    if (globalCache()->writeTree) {
+        std::lock_guard<std::mutex> lock(globalCache()->mutex);
+
+        // Point the output branches to the buffers of this stream. Nothing to do
+        // if this stream was the last one to commit
+        if (globalCache()->boundStream != streamID_) {
+            for (auto& branches: branches_) {
+                if (branches.second->InheritsFrom(TBranchElement::Class()))
+                    static_cast<TBranchElement*>(branches.first)->SetObject(static_cast<TBranchElement*>(branches.second)->GetObject());
+                else
+                    branches.first->SetAddress(branches.second->GetAddress());
+            }
+            globalCache()->boundStream = streamID_;
+        }
+
+        globalCache()->tree->Fill();
+    }
+
+    // Reset the values for the next event of this stream
+    tree.fill();
+}
+
+void JME::Analyzer::removeDisabledBranches(TTree* tree_) {
+
+    // Remove the branches of the disabled groups from the tree: they are
+    // neither filled nor written
+    for (const std::string& group: disabledBranchGroups_) {
+        auto it = branchGroups_.find(group);
+        if (it == branchGroups_.end())
+            throw edm::Exception(edm::errors::Configuration) << "Unknown branch group '" << group << "' for module " << moduleLabel_;
+
+        for (const std::string& name: it->second) {
+            TBranch* branch = tree_->GetBranch(name.c_str());
+            if (!branch)
+                continue;
+
+            // The branch is not deleted: the TreeWrapper still refers to it
+            tree_->GetListOfBranches()->Remove(branch);
+            TIter leaves(branch->GetListOfLeaves());
+            while (TObject* leaf = leaves())
+                tree_->GetListOfLeaves()->Remove(leaf);
+        }
+    }
+    tree_->GetListOfBranches()->Compress();
+    tree_->GetListOfLeaves()->Compress();
+}
+
+void JME::Analyzer::configureOutputTree(TTree* tree_) {
+
+    // Compression
+    if (!compressionAlgorithm_.empty() || compressionLevel_ >= 0) {
+        ROOT::ECompressionAlgorithm algorithm = ROOT::kZLIB;
+        if (compressionAlgorithm_ == "LZMA")
+            algorithm = ROOT::kLZMA;
+        else if (!compressionAlgorithm_.empty() && compressionAlgorithm_ != "ZLIB")
+            throw edm::Exception(edm::errors::Configuration) << "Unknown compression algorithm '" << compressionAlgorithm_ << "' for module " << moduleLabel_;
+
+        int level = (compressionLevel_ >= 0) ? compressionLevel_ : 1;
+        TIter next(tree_->GetListOfBranches());
+        while (TBranch* branch = static_cast<TBranch*>(next()))
+            branch->SetCompressionSettings(ROOT::CompressionSettings(algorithm, level));
+    }
+
+    if (basketSize_ > 0)
+        tree_->SetBasketSize("*", basketSize_);
+
+    if (autoFlush_ != 0)
+        tree_->SetAutoFlush(autoFlush_);
 }
@@ -0,0 +1,92 @@
+#include "FWCore/Utilities/interface/EDMException.h"
+
+#include "JMEAnalysis/JMEValidator/interface/DileptonBuilder.h"
+
+#include <cmath>
+#include <cstdlib>
+
+JME::DileptonBuilder::DileptonBuilder(double mass, double window, Selection selection, bool sameFlavour)
+    : mass_(mass)
+    , window_(window)
+    , selection_(selection)
+    , sameFlavour_(sameFlavour)
+    , best_() {
+    }
+
+JME::DileptonBuilder::Selection JME::DileptonBuilder::selection(const std::string& name) {
+    if (name == "closestMass")
+        return CLOSEST_MASS;
+    else if (name == "highestPt")
+        return HIGHEST_PT;
+
+    throw edm::Exception(edm::errors::Configuration) << "Unknown dilepton selection '" << name << "', expected 'closestMass' or 'highestPt'";
+}
+
+void JME::DileptonBuilder::clear() {
+    px_.clear();
+    py_.clear();
+    pz_.clear();
+    energy_.clear();
+    charge_.clear();
+    flavour_.clear();
+
+    nPairs_ = 0;
+}
+
+void JME::DileptonBuilder::add(const reco::Candidate& lepton) {
+    px_.push_back(lepton.px());
+    py_.push_back(lepton.py());
+    pz_.push_back(lepton.pz());
+    energy_.push_back(lepton.energy());
+    charge_.push_back(lepton.charge());
+    flavour_.push_back(std::abs(lepton.pdgId()));
+}
+
+size_t JME::DileptonBuilder::build() {
+    nPairs_ = 0;
+
+    double bestScore = 0;
+    const size_t n = px_.size();
+    for (size_t i = 0; i < n; i++) {
+        for (size_t j = i + 1; j < n; j++) {
+            if (charge_[i] * charge_[j] >= 0)
+                continue;
+
+            if (sameFlavour_ && flavour_[i] != flavour_[j])
+                continue;
+
+            double px = px_[i] + px_[j];
+            double py = py_[i] + py_[j];
+            double pz = pz_[i] + pz_[j];
+            double energy = energy_[i] + energy_[j];
+
+            // Same convention as TLorentzVector::M for space-like pairs
+            double m2 = energy * energy - px * px - py * py - pz * pz;
+            double mass = (m2 >= 0) ? std::sqrt(m2) : -std::sqrt(-m2);
+            if (std::abs(mass - mass_) >= window_)
+                continue;
+
+            double pt = std::sqrt(px * px + py * py);
+            // Lower is better
+            double score = (selection_ == CLOSEST_MASS) ? std::abs(mass - mass_) : -pt;
+
+            if (nPairs_ == 0 || score < bestScore) {
+                bestScore = score;
+
+                best_.first = i;
+                best_.second = j;
+                best_.px = px;
+                best_.py = py;
+                best_.pz = pz;
+                best_.energy = energy;
+                best_.pt = pt;
+                best_.phi = (px == 0 && py == 0) ? 0 : std::atan2(py, px);
+                best_.mass = mass;
+            }
+
+            nPairs_++;
+        }
+    }
+
+    return nPairs_;
+}
@@ -0,0 +1,75 @@
+#include "FWCore/ParameterSet/interface/ParameterSet.h"
+#include "FWCore/ParameterSet/interface/FileInPath.h"
+#include "FWCore/ServiceRegistry/interface/SystemBounds.h"
+#include "FWCore/Utilities/interface/Exception.h"
+
+#include "JMEAnalysis/JMEValidator/interface/JetCorrectorService.h"
+
+#include <iostream>
+
+JME::JetCorrectorService::JetCorrectorService(const edm::ParameterSet& iConfig, edm::ActivityRegistry& iRegistry)
+    : era_("PHYS14_V2_MC")
+    , directory_("JMEAnalysis/JMEValidator/data") {
+
+        if (iConfig.existsAs<std::string>("era"))
+            era_ = iConfig.getParameter<std::string>("era");
+
+        if (iConfig.existsAs<std::string>("directory"))
+            directory_ = iConfig.getParameter<std::string>("directory");
+
+        // Legacy modules only run on the first stream
+        correctors_.resize(1);
+
+        iRegistry.watchPreallocate(this, &JetCorrectorService::preallocate);
+    }
+
+void JME::JetCorrectorService::preallocate(const edm::service::SystemBounds& bounds) {
+    correctors_.resize(bounds.maxNumberOfStreams());
+}
+
+std::string JME::JetCorrectorService::payloadFile(const std::string& payload, const std::string& level) const {
+    edm::FileInPath file(directory_ + "/" + era_ + "_" + level + "_" + payload + ".txt");
+    return file.fullPath();
+}
+
+JME::JetCorrectorService::Handle JME::JetCorrectorService::parameters(const std::string& payload, const std::vector<std::string>& levels) {
+    std::vector<std::string> files;
+    for (const std::string& level: levels)
+        files.push_back(payloadFile(payload, level));
+
+    return parameters(files);
+}
+
+JME::JetCorrectorService::Handle JME::JetCorrectorService::parameters(const std::vector<std::string>& files) {
+    std::lock_guard<std::mutex> lock(mutex_);
+
+    auto it = parameters_.find(files);
+    if (it != parameters_.end())
+        return it->second;
+
+    std::shared_ptr<Parameters> parameters = std::make_shared<Parameters>();
+    for (const std::string& file: files) {
+        std::cout << "|---- JetCorrectorService: Loading JEC payload " << file << std::endl;
+        parameters->push_back(JetCorrectorParameters(file));
+    }
+
+    Handle handle = parameters;
+    parameters_[files] = handle;
+
+    return handle;
+}
+
+FactorizedJetCorrector& JME::JetCorrectorService::corrector(const Handle& parameters, edm::StreamID streamID) {
+    if (!parameters)
+        throw edm::Exception(edm::errors::LogicError, "JetCorrectorService: requesting a corrector for empty parameters");
+
+    if (streamID.value() >= correctors_.size())
+        throw edm::Exception(edm::errors::LogicError, "JetCorrectorService: unexpected stream ") << streamID.value();
+
+    auto& correctors = correctors_[streamID.value()];
+    auto it = correctors.find(parameters.get());
+    if (it == correctors.end())
+        it = correctors.emplace(parameters.get(), std::unique_ptr<FactorizedJetCorrector>(new FactorizedJetCorrector(*parameters))).first;
+
+    return *it->second;
+}
@@ -48,6 +48,9 @@
 
 #include "JMEAnalysis/JMEValidator/interface/JetMETAnalyzer.h"
 
+#include <TNamed.h>
+#include <TTree.h>
+
 #include <vector>
 #include <iostream>
 #include <string>
@@ -57,11 +60,8 @@
 ////////////////////////////////////////////////////////////////////////////////
 
 //______________________________________________________________________________
-JetMETAnalyzer::JetMETAnalyzer(const edm::ParameterSet& iConfig)
-  : JME::Analyzer(iConfig)
-  , JetCorLabel_   (iConfig.getParameter<std::string>("JetCorLabel"))
-  , JetCorLevels_  (iConfig.getParameter<std::vector<std::string>>("JetCorLevels"))
-  , srcJet_        (consumes<std::vector<pat::Jet>>(iConfig.getParameter<edm::InputTag>("srcJet")))
+JetMETAnalyzer::JetMETAnalyzer(const edm::ParameterSet& iConfig, const JME::AnalyzerOutput* output)
+  : JME::Analyzer(iConfig, output)
   , srcRho_        (consumes<double>(iConfig.getParameter<edm::InputTag>("srcRho")))
   , srcVtx_        (consumes<std::vector<reco::Vertex>>(iConfig.getParameter<edm::InputTag>("srcVtx")))
   , srcMuons_      (consumes<std::vector<pat::Muon>>(iConfig.getParameter<edm::InputTag>("srcMuons")))
@@ -71,7 +71,7 @@ JetMETAnalyzer::JetMETAnalyzer(const edm::ParameterSet& iConfig)
   , deltaRMax_(0.0)
   , deltaPhiMin_(3.141)
   , deltaRPartonMax_(0.0)
-  , jetCorrector_(0)
+  , checkBetaStar_(iConfig.getUntrackedParameter<bool>("checkBetaStar", false))
 {
   if (iConfig.exists("deltaRMax")) {
     deltaRMax_=iConfig.getParameter<double>("deltaRMax");
@@ -80,29 +80,68 @@ JetMETAnalyzer::JetMETAnalyzer(const edm::ParameterSet& iConfig)
     throw cms::Exception("MissingParameter")<<"Set *either* deltaRMax (matching)"
 					    <<" *or* deltaPhiMin (balancing)";
 
-  // Jet CORRECTOR
-  // if(!JetCorLevels_.empty()) {
-  //   vector<JetCorrectorParameters> vPar;
-  //   string jetCorPar = "../data/PHYS14_V2_MC_L1FastJet_"+JetCorLabel_.substr(0,JetCorLabel_.size()-2)+".txt";
-  //   cout << "Getting JEC from file " << jetCorPar  << " ... ";
-  //   vPar.push_back(JetCorrectorParameters(jetCorPar));
-  //   jetCorrector_ = new FactorizedJetCorrector(vPar);
-  //   cout << "DONE" << endl;
-  // }
-  
-  std::cout << "|---- JetMETAnalyzer: Initialyzing..." << std::endl;
-  std::cout << "|---- JetMETAnalyzer: Applying these jet corrections: ( " << JetCorLabel_;
-  for (const std::string& level: JetCorLevels_)
-     std::cout << ", " << level;
-  std::cout << " )" << std::endl;
+  // Branch groups, can be disabled with disabledBranchGroups
+  declareBranchGroup("pileup", {"npus", "tnpus", "bxns"});
+  declareBranchGroup("reference", {"refrank", "refpdgid_algorithmicDef", "refpdgid_physicsDef", "refpdgid", "refdrjt",
+                                   "refe", "refpt", "refeta", "refphi", "refm", "refy", "refarea", "isMatched"});
+  declareBranchGroup("kinematics", {"jte", "jtpt", "jteta", "jtphi", "jtm", "jty", "jtarea", "jtjec"});
+  declareBranchGroup("pileupId", {"beta", "betaStar", "betaClassic", "betaStarClassic", "dZ",
+                                  "DRweighted", "nCh", "nNeutrals", "ptD"});
+  declareBranchGroup("rings", {"fRing0", "fRing1", "fRing2", "fRing3", "fRing4", "fRing5", "fRing6", "fRing7", "fRing8"});
+  declareBranchGroup("collections", {"jtcoll"});
+
+  doPileup_     = isBranchGroupEnabled("pileup");
+  doReference_  = isBranchGroupEnabled("reference");
+  doKinematics_ = isBranchGroupEnabled("kinematics");
+  doPileupId_   = isBranchGroupEnabled("pileupId");
+  doRings_      = isBranchGroupEnabled("rings");
+
+  if (iConfig.existsAs<edm::InputTag>("srcPackedCandidates"))
+    srcPackedCandidates_ = consumes<JME::PackedCandidateSoA>(iConfig.getParameter<edm::InputTag>("srcPackedCandidates"));
+
+  // Jet collections: either a list of collections, written in the same tree
+  // and told apart with jtcoll, or a single one
+  std::vector<edm::ParameterSet> collections;
+  if (iConfig.existsAs<std::vector<edm::ParameterSet>>("jetCollections")) {
+    collections = iConfig.getParameter<std::vector<edm::ParameterSet>>("jetCollections");
+    if (collections.empty())
+      throw edm::Exception(edm::errors::Configuration, "JetMETAnalyzer: jetCollections is empty");
+  }
+  else {
+    collections.push_back(iConfig);
+    // jtcoll is always 0 with a single collection
+    disableBranchGroup("collections");
+  }
 
-  std::cout << "|---- JetMETAnalyzer: RUNNING ON " << moduleLabel_ << " FOR "
-       << JetCorLabel_.substr(0,3) << " JETS";
-  if      (JetCorLabel_.find("chs") != std::string::npos)   std::cout << " USING CHS" << std::endl;
-  else if (JetCorLabel_.find("PUPPI") != std::string::npos) std::cout << " USING PUPPI" << std::endl;
-  else                                                      std::cout << std::endl;
+  std::cout << "|---- JetMETAnalyzer: Initialyzing..." << std::endl;
+  for (const edm::ParameterSet& collection: collections) {
+    JetCollection jetCollection;
+    jetCollection.JetCorLabel  = collection.getParameter<std::string>("JetCorLabel");
+    jetCollection.JetCorLevels = collection.getParameter<std::vector<std::string>>("JetCorLevels");
+    jetCollection.srcJet       = consumes<std::vector<pat::Jet>>(collection.getParameter<edm::InputTag>("srcJet"));
+
+    const std::string& JetCorLabel = jetCollection.JetCorLabel;
+    std::cout << "|---- JetMETAnalyzer: Applying these jet corrections: ( " << JetCorLabel;
+    for (const std::string& level: jetCollection.JetCorLevels)
+       std::cout << ", " << level;
+    std::cout << " )" << std::endl;
+
+    std::cout << "|---- JetMETAnalyzer: RUNNING ON " << moduleLabel_ << " FOR "
+         << JetCorLabel.substr(0,3) << " JETS";
+    if      (JetCorLabel.find("chs") != std::string::npos)   std::cout << " USING CHS";
+    else if (JetCorLabel.find("PUPPI") != std::string::npos) std::cout << " USING PUPPI";
+    if (collections.size() > 1)
+      std::cout << " (jtcoll = " << jetCollections_.size() << ")";
+    std::cout << std::endl;
+
+    jetCollections_.push_back(jetCollection);
+  }
+  doCollections_ = isBranchGroupEnabled("collections");
 
   m_puInfoToken = consumes<std::vector<PileupSummaryInfo>>(edm::InputTag("addPileupInfo"));
+
+  analyzeTiming_  = timing_.section("analyze", "jets");
+  betaStarTiming_ = timing_.section("computeBetaStar", "constituents");
 }
 
 
@@ -118,12 +157,25 @@ JetMETAnalyzer::~JetMETAnalyzer()
 ////////////////////////////////////////////////////////////////////////////////
 
 //______________________________________________________________________________
+void JetMETAnalyzer::beginOutput(TTree* output)
+{
+  // Names of the collections indexed by jtcoll, stored in the user info of the tree as jtcoll_<index>
+  if (isBranchGroupEnabled("collections")) {
+    for (size_t i = 0; i < jetCollections_.size(); i++) {
+      std::string name = "jtcoll_" + std::to_string(i);
+      output->GetUserInfo()->Add(new TNamed(name.c_str(), jetCollections_[i].JetCorLabel.c_str()));
+    }
+  }
+}
+
 
 //______________________________________________________________________________
 void JetMETAnalyzer::analyze(const edm::Event& iEvent,
                                   const edm::EventSetup& iSetup)
 {
 
+  JME::Timing::Scope timing(timing_, analyzeTiming_);
+
   // // EVENT DATA HANDLES
   edm::Handle<GenEventInfoProduct>               genInfo;
   edm::Handle<std::vector<PileupSummaryInfo> >        puInfos;  
@@ -132,6 +184,7 @@ void JetMETAnalyzer::analyze(const edm::Event& iEvent,
   edm::Handle<double>                            rho;
   edm::Handle<std::vector<reco::Vertex> >        vtx;
   edm::Handle<edm::View<pat::Muon> >             muons;
+  edm::Handle<JME::PackedCandidateSoA>           packedCandidates;
 
   //RHO INFORMATION
   rho_ = 0;
@@ -139,15 +192,28 @@ void JetMETAnalyzer::analyze(const edm::Event& iEvent,
     rho_ = *rho;
   }
  
+  // PACKED CANDIDATES AND VERTICES, computed once per event if available
+  if (!srcPackedCandidates_.isUninitialized())
+    iEvent.getByToken(srcPackedCandidates_, packedCandidates);
+
   //NPV INFORMATION
   npv = 0;
-  if (iEvent.getByToken(srcVtx_, vtx)) {
+  iEvent.getByToken(srcVtx_, vtx);
+  if (packedCandidates.isValid()) {
+     npv = packedCandidates->nGoodVertices;
+  }
+  else if (vtx.isValid()) {
      const reco::VertexCollection::const_iterator vtxEnd = vtx->end();
      for (reco::VertexCollection::const_iterator vtxIter = vtx->begin(); vtxEnd != vtxIter; ++vtxIter) {
         if (!vtxIter->isFake() && vtxIter->ndof()>=4 && fabs(vtxIter->z())<=24)
            npv++;
      }
   }
+
+  // Vertices sorted in z, for the closest vertex search of the constituents
+  // not found in the packed candidates view
+  if (doPileupId_)
+    sortedVertices_.update(vtx.isValid() ? *vtx : std::vector<reco::Vertex>());
  
   //EVENT INFORMATION
   run = iEvent.id().run();
@@ -155,7 +221,7 @@ void JetMETAnalyzer::analyze(const edm::Event& iEvent,
   event = iEvent.id().event();
 
   // MC PILEUP INFORMATION
-  if (iEvent.getByToken(m_puInfoToken, puInfos)) {
+  if (doPileup_ && iEvent.getByToken(m_puInfoToken, puInfos)) {
      for(unsigned int i=0; i<puInfos->size(); i++) {
         npus.push_back((*puInfos)[i].getPU_NumInteractions());
         tnpus.push_back((*puInfos)[i].getTrueNumInteractions());
@@ -164,69 +230,93 @@ void JetMETAnalyzer::analyze(const edm::Event& iEvent,
   }
 
   // REFERENCES & RECOJETS
-  iEvent.getByToken(srcJet_, jets);
-  
-  //loop over the jets and fill the ntuple
-  size_t nJet = (nJetMax_ == 0) ? jets->size() : std::min(nJetMax_, (unsigned int) jets->size());
-  for (size_t iJet = 0; iJet < nJet; iJet++) {
+  for (size_t iColl = 0; iColl < jetCollections_.size(); iColl++) {
 
-     pat::Jet const & jet = jets->at(iJet);
-     if (jet.pt() < 5)
-         continue;
+    iEvent.getByToken(jetCollections_[iColl].srcJet, jets);
 
-     const reco::GenJet* ref = jet.genJet();
+    // Index of the first jet of this collection in the tree, refrank being
+    // the rank of the jet within its own collection
+    int firstRef = nref;
 
-     if (ref) {
-       refdrjt.push_back( reco::deltaR(jet.eta(),jet.phi(),ref->eta(),ref->phi()) );
-       isMatched.push_back(true);
-     }
-     else {
-       refdrjt.push_back(0);
-       isMatched.push_back(false);
-     }
+    //loop over the jets and fill the ntuple
+    size_t nJet = (nJetMax_ == 0) ? jets->size() : std::min(nJetMax_, (unsigned int) jets->size());
+    for (size_t iJet = 0; iJet < nJet; iJet++) {
 
-     refrank.push_back( nref );
-     refpdgid_algorithmicDef.push_back( 0 );
-     refpdgid_physicsDef.push_back( 0 );
-     if(ref) { 
-        refpdgid.push_back( ref->pdgId() );
-        refe.push_back( ref->energy() );
-        refpt.push_back( ref->pt() );
-        refeta.push_back( ref->eta() );
-        refphi.push_back( ref->phi() );
-        refm.push_back( ref->mass() );
-        refy.push_back( ref->rapidity() );
-        refarea.push_back( ref->jetArea() );
-     }
-     else {
-        refpdgid.push_back( 0. );
-        refe.push_back( 0. );
-        refpt.push_back( 0. );
-        refeta.push_back( 0. );
-        refphi.push_back( 0. );
-        refm.push_back( 0. );
-        refy.push_back( 0. );
-        refarea.push_back( 0. );
-     }
+       pat::Jet const & jet = jets->at(iJet);
+       if (jet.pt() < 5)
+           continue;
+
+       if (doCollections_)
+          jtcoll.push_back(iColl);
+
+       if (doReference_)
+          fillReference(jet, nref - firstRef);
 
-     jte.push_back( jet.energy() );
-     jtpt.push_back( jet.pt() );
-     jteta.push_back( jet.eta() );
-     jtphi.push_back( jet.phi() );
-     jtm.push_back( jet.mass() );
-     jty.push_back( jet.rapidity() );
-     jtarea.push_back( jet.jetArea() );
-     jtjec.push_back( jet.jecFactor(0) );
+       if (doKinematics_) {
+          jte.push_back( jet.energy() );
+          jtpt.push_back( jet.pt() );
+          jteta.push_back( jet.eta() );
+          jtphi.push_back( jet.phi() );
+          jtm.push_back( jet.mass() );
+          jty.push_back( jet.rapidity() );
+          jtarea.push_back( jet.jetArea() );
+          jtjec.push_back( jet.jecFactor(0) );
+       }
 
-     computeBetaStar(jet, *vtx);
+       if (doPileupId_ || doRings_)
+          computeBetaStar(jet, *vtx, packedCandidates.isValid() ? packedCandidates.product() : nullptr);
+
+       nref++;
+       timing.add();
+    }
+  }
+
+  commit();
+}
+
+//______________________________________________________________________________
+void JetMETAnalyzer::fillReference(const pat::Jet& jet, int rank)
+{
+  const reco::GenJet* ref = jet.genJet();
 
-     nref++;
+  if (ref) {
+    refdrjt.push_back( reco::deltaR(jet.eta(),jet.phi(),ref->eta(),ref->phi()) );
+    isMatched.push_back(true);
+  }
+  else {
+    refdrjt.push_back(0);
+    isMatched.push_back(false);
   }
 
-  tree.fill();
+  refrank.push_back( rank );
+  refpdgid_algorithmicDef.push_back( 0 );
+  refpdgid_physicsDef.push_back( 0 );
+  if(ref) { 
+     refpdgid.push_back( ref->pdgId() );
+     refe.push_back( ref->energy() );
+     refpt.push_back( ref->pt() );
+     refeta.push_back( ref->eta() );
+     refphi.push_back( ref->phi() );
+     refm.push_back( ref->mass() );
+     refy.push_back( ref->rapidity() );
+     refarea.push_back( ref->jetArea() );
+  }
+  else {
+     refpdgid.push_back( 0. );
+     refe.push_back( 0. );
+     refpt.push_back( 0. );
+     refeta.push_back( 0. );
+     refphi.push_back( 0. );
+     refm.push_back( 0. );
+     refy.push_back( 0. );
+     refarea.push_back( 0. );
+  }
 }
 
-void JetMETAnalyzer::computeBetaStar(const pat::Jet& jet, const std::vector<reco::Vertex>& vertices) {
+void JetMETAnalyzer::computeBetaStar(const pat::Jet& jet, const std::vector<reco::Vertex>& vertices, const JME::PackedCandidateSoA* packedCandidates) {
+
+    JME::Timing::Scope timing(timing_, betaStarTiming_);
+    timing.add(jet.numberOfDaughters());
 
     int nCh_tmp(0), nNeutrals_tmp(0);
     float sumTkPt(0.0);
@@ -260,73 +350,107 @@ void JetMETAnalyzer::computeBetaStar(const pat::Jet& jet, const std::vector<reco
             index = nRings - 1;
         sum_rings[index] += weight;
 
+        // Only the ring fractions are needed
+        if (!doPileupId_)
+            continue;
+
+        // Charged track information: pt, fromPV, dz to the PV and to the closest vertex
+        float tkpt(0.0);
+        int fromPV(0);
+        double dZ0(0.0), dZ_tmp(0.0);
+
         reco::CandidatePtr pfJetConstituent = jet.sourceCandidatePtr(j);
-        const reco::Candidate* icand = pfJetConstituent.get();
-        const pat::PackedCandidate* lPack = dynamic_cast<const pat::PackedCandidate *>( icand );
-        if (lPack) {
-
-            if (fabs(lPack->charge()) > 0) {
-
-                if (lPack->pt() > pTMax) {
-                    pTMax = lPack->pt();
-                    dZ2 = lPack->dz();
-                }
-
-                float tkpt = lPack->pt();
-                sumTkPt += tkpt;
-                bool inVtx0 = (lPack->fromPV() == 3);
-                bool inAnyOther = (lPack->fromPV() == 0);
-                double dZ0 = lPack->dz();
-                double dZ_tmp = dZ0;
-
-                for (const auto& iv: vertices) {
-                    if (iv.isFake())
-                        continue;
-                    if (fabs(lPack->dz(iv.position())) < fabs(dZ_tmp)) {
-                        dZ_tmp = lPack->dz(iv.position());
-                    }
-                }
-
-                if (inVtx0) {
-                    betaClassic_tmp += tkpt;
-                }
-                else if (inAnyOther) {
-                    betaStarClassic_tmp += tkpt;
-                }
-                if (fabs(dZ0) < 0.2) {
-                    beta_tmp += tkpt;
-                }
-                else if (fabs(dZ_tmp) < 0.2) {
-                    betaStar_tmp += tkpt;
-                }
-            }
+        if (packedCandidates && packedCandidates->contains(pfJetConstituent.id())) {
+            // Packed candidate already unpacked by the PackedCandidateSoAProducer
+            size_t key = pfJetConstituent.key();
+            if (packedCandidates->charge[key] == 0)
+                continue;
+
+            tkpt = packedCandidates->pt[key];
+            fromPV = packedCandidates->fromPV[key];
+            dZ0 = packedCandidates->dz[key];
+            dZ_tmp = packedCandidates->dzClosest[key];
+        }
+        else {
+            const reco::Candidate* icand = pfJetConstituent.get();
+            const pat::PackedCandidate* lPack = dynamic_cast<const pat::PackedCandidate *>( icand );
+            if (!lPack || !(fabs(lPack->charge()) > 0))
+                continue;
+
+            tkpt = lPack->pt();
+            fromPV = lPack->fromPV();
+            dZ0 = lPack->dz();
+            dZ_tmp = sortedVertices_.closestDz(*lPack, dZ0);
+        }
+
+        if (checkBetaStar_) {
+            const pat::PackedCandidate* lPack = dynamic_cast<const pat::PackedCandidate *>( pfJetConstituent.get() );
+            // Same precision on both sides: dz and the closest dz are doubles,
+            // and the track pt a float in both the SoA and the branches
+            double dZ0_check = lPack->dz();
+            double dZ_check = JME::SortedVertices::closestDzBruteForce(*lPack, vertices, dZ0_check);
+            if (dZ_check != dZ_tmp || dZ0_check != dZ0 || tkpt != float(lPack->pt()) || fromPV != lPack->fromPV())
+                throw cms::Exception("BetaStarMismatch") << "Closest vertex dz differs between the sorted search ("
+                    << dZ0 << ", " << dZ_tmp << ") and the loop over all the vertices (" << dZ0_check << ", " << dZ_check << ")";
+        }
+
+        if (tkpt > pTMax) {
+            pTMax = tkpt;
+            dZ2 = dZ0;
+        }
+
+        sumTkPt += tkpt;
+        bool inVtx0 = (fromPV == 3);
+        bool inAnyOther = (fromPV == 0);
+
+        if (inVtx0) {
+            betaClassic_tmp += tkpt;
+        }
+        else if (inAnyOther) {
+            betaStarClassic_tmp += tkpt;
+        }
+        if (fabs(dZ0) < 0.2) {
+            beta_tmp += tkpt;
+        }
+        else if (fabs(dZ_tmp) < 0.2) {
+            betaStar_tmp += tkpt;
+        }
+    }
+
+    if (doRings_) {
+        if (sumW > 0) {
+            fRing0.push_back(sum_rings[0] / sumW);
+            fRing1.push_back(sum_rings[1] / sumW);
+            fRing2.push_back(sum_rings[2] / sumW);
+            fRing3.push_back(sum_rings[3] / sumW);
+            fRing4.push_back(sum_rings[4] / sumW);
+            fRing5.push_back(sum_rings[5] / sumW);
+            fRing6.push_back(sum_rings[6] / sumW);
+            fRing7.push_back(sum_rings[7] / sumW);
+            fRing8.push_back(sum_rings[8] / sumW);
+        }
+        else {
+            fRing0.push_back(-999);
+            fRing1.push_back(-999);
+            fRing2.push_back(-999);
+            fRing3.push_back(-999);
+            fRing4.push_back(-999);
+            fRing5.push_back(-999);
+            fRing6.push_back(-999);
+            fRing7.push_back(-999);
+            fRing8.push_back(-999);
         }
     }
 
+    if (!doPileupId_)
+        return;
+
     if (sumW > 0) {
         DRweighted.push_back(sumWdR2 / sumW2);
-        fRing0.push_back(sum_rings[0] / sumW);
-        fRing1.push_back(sum_rings[1] / sumW);
-        fRing2.push_back(sum_rings[2] / sumW);
-        fRing3.push_back(sum_rings[3] / sumW);
-        fRing4.push_back(sum_rings[4] / sumW);
-        fRing5.push_back(sum_rings[5] / sumW);
-        fRing6.push_back(sum_rings[6] / sumW);
-        fRing7.push_back(sum_rings[7] / sumW);
-        fRing8.push_back(sum_rings[8] / sumW);
         ptD.push_back(sqrt(sumW2) / sumW);
     }
     else{
         DRweighted.push_back(-999);
-        fRing0.push_back(-999);
-        fRing1.push_back(-999);
-        fRing2.push_back(-999);
-        fRing3.push_back(-999);
-        fRing4.push_back(-999);
-        fRing5.push_back(-999);
-        fRing6.push_back(-999);
-        fRing7.push_back(-999);
-        fRing8.push_back(-999);
         ptD.push_back(-999);
     }
     if (sumTkPt > 0) {
@@ -345,10 +469,3 @@ void JetMETAnalyzer::computeBetaStar(const pat::Jet& jet, const std::vector<reco
     nCh.push_back(nCh_tmp);
     nNeutrals.push_back(nNeutrals_tmp);
 }
-
-
-////////////////////////////////////////////////////////////////////////////////
-// define JetMETAnalyzer as a plugin
-////////////////////////////////////////////////////////////////////////////////
-#include "FWCore/Framework/interface/MakerMacros.h"
-DEFINE_FWK_MODULE(JetMETAnalyzer);
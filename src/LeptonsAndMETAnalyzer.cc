@@ -7,7 +7,7 @@
 ////////////////////////////////////////////////////////////////////////////////
 
 #include "FWCore/Framework/interface/Frameworkfwd.h"
-#include "FWCore/Framework/interface/EDAnalyzer.h"
+#include "FWCore/Framework/interface/stream/EDAnalyzer.h"
 #include "FWCore/Framework/interface/Event.h"
 #include "FWCore/Framework/interface/MakerMacros.h"
  
@@ -60,27 +60,52 @@
 ////////////////////////////////////////////////////////////////////////////////
 
 //______________________________________________________________________________
-LeptonsAndMETAnalyzer::LeptonsAndMETAnalyzer(const edm::ParameterSet& iConfig)
-    : JME::Analyzer(iConfig)
+LeptonsAndMETOutput::LeptonsAndMETOutput(const edm::ParameterSet& iConfig)
+  : JME::AnalyzerOutput(iConfig)
+  , doRecoil(iConfig.existsAs<edm::ParameterSet>("recoil"))
+{
+  if (doRecoil)
+    recoil = JME::RecoilAccumulator(iConfig.getParameter<edm::ParameterSet>("recoil"));
+}
+
+
+//______________________________________________________________________________
+void LeptonsAndMETOutput::endJob() const
+{
+  if (doRecoil)
+    recoil.book();
+}
+
+
+//______________________________________________________________________________
+LeptonsAndMETAnalyzer::LeptonsAndMETAnalyzer(const edm::ParameterSet& iConfig, const JME::AnalyzerOutput* output)
+    : JME::Analyzer(iConfig, output)
     , srcIsoMuons_   (consumes<edm::View<reco::Candidate>>(iConfig.getParameter<edm::InputTag>("srcIsoMuons")))
     , srcMET_        (consumes<std::vector<pat::MET>>(iConfig.getParameter<edm::InputTag>("srcMET")))
     , srcPUPPET_     (consumes<std::vector<reco::PFMET>>(iConfig.getParameter<edm::InputTag>("srcPUPPET")))
-    , srcVtx_        (iConfig.getParameter<edm::InputTag> ("srcVtx"))
-    , srcMuons_      (iConfig.getParameter<edm::InputTag> ("srcMuons"))
-    , srcVMCHSTAND_  (iConfig.getParameter<edm::InputTag> ("srcVMCHSTAND"))
-    , srcVMNHSTAND_  (iConfig.getParameter<edm::InputTag> ("srcVMNHSTAND"))
-    , srcVMPhSTAND_  (iConfig.getParameter<edm::InputTag> ("srcVMPhSTAND"))
-    , srcVMPUSTAND_  (iConfig.getParameter<edm::InputTag> ("srcVMPUSTAND"))
-    , srcVMNHPFWGT_  (iConfig.getParameter<edm::InputTag> ("srcVMNHPFWGT"))
-    , srcVMPhPFWGT_  (iConfig.getParameter<edm::InputTag> ("srcVMPhPFWGT"))
-    , srcVMCHPUPPI_  (iConfig.getParameter<edm::InputTag> ("srcVMCHPUPPI"))
-    , srcVMNHPUPPI_  (iConfig.getParameter<edm::InputTag> ("srcVMNHPUPPI"))
-    , srcVMPhPUPPI_  (iConfig.getParameter<edm::InputTag> ("srcVMPhPUPPI"))
-    , srcVMCHNOMUONPUPPI_  (iConfig.getParameter<edm::InputTag> ("srcVMCHNOMUONPUPPI"))
-    , srcVMNHNOMUONPUPPI_  (iConfig.getParameter<edm::InputTag> ("srcVMNHNOMUONPUPPI"))
-    , srcVMPhNOMUONPUPPI_  (iConfig.getParameter<edm::InputTag> ("srcVMPhNOMUONPUPPI"))
+    , srcVtx_        (consumes<std::vector<reco::Vertex>>(iConfig.getParameter<edm::InputTag>("srcVtx")))
+    , srcMuons_      (consumes<edm::View<pat::Muon>>(iConfig.getParameter<edm::InputTag>("srcMuons")))
+    , srcIsolation_  (consumes<JME::MuonIsolationRecordCollection>(iConfig.getParameter<edm::InputTag>("srcIsolation")))
 {
+  if (iConfig.existsAs<edm::InputTag>("srcPackedCandidates"))
+    srcPackedCandidates_ = consumes<JME::PackedCandidateSoA>(iConfig.getParameter<edm::InputTag>("srcPackedCandidates"));
+
+  // Z candidates: mass window around zMass, best pair chosen with zSelection
+  double zMass       = iConfig.existsAs<double>("zMass") ? iConfig.getParameter<double>("zMass") : 91.2;
+  double zMassWindow = iConfig.existsAs<double>("zMassWindow") ? iConfig.getParameter<double>("zMassWindow") : 15;
+  std::string zSelection = iConfig.existsAs<std::string>("zSelection") ? iConfig.getParameter<std::string>("zSelection") : "closestMass";
+  zBuilder_ = JME::DileptonBuilder(zMass, zMassWindow, JME::DileptonBuilder::selection(zSelection));
+
+  // Recoil accumulation, merged across the streams at the end of the job
+  doRecoil_ = iConfig.existsAs<edm::ParameterSet>("recoil");
+  if (doRecoil_) {
+    recoil_ = JME::RecoilAccumulator(iConfig.getParameter<edm::ParameterSet>("recoil"));
+    pfMETRecoil_  = recoil_.flavour("pfMET");
+    puppETRecoil_ = recoil_.flavour("puppET");
+  }
 
+  analyzeTiming_   = timing_.section("analyze", "muons");
+  isolationTiming_ = timing_.section("isolation", "muons");
 
 }
 
@@ -97,16 +122,29 @@ LeptonsAndMETAnalyzer::~LeptonsAndMETAnalyzer()
 ////////////////////////////////////////////////////////////////////////////////
 
 //______________________________________________________________________________
-void LeptonsAndMETAnalyzer::beginJob()
+std::unique_ptr<JME::AnalyzerOutput> LeptonsAndMETAnalyzer::initializeGlobalCache(const edm::ParameterSet& iConfig)
+{
+  return initializeOutput(std::unique_ptr<JME::AnalyzerOutput>(new LeptonsAndMETOutput(iConfig)), iConfig);
+}
+
+
+//______________________________________________________________________________
+void LeptonsAndMETAnalyzer::endStream()
 {
-  JME::Analyzer::beginJob();
-  eventCounter_ = 0;
+  JME::Analyzer::endStream();
+
+  if (doRecoil_) {
+    const LeptonsAndMETOutput* output = static_cast<const LeptonsAndMETOutput*>(globalCache());
+    std::lock_guard<std::mutex> lock(output->mutex);
+    output->recoil.merge(recoil_);
+  }
 }
 
 
 //______________________________________________________________________________
 void LeptonsAndMETAnalyzer::analyze(const edm::Event& iEvent, const edm::EventSetup& iSetup)
 {
+  JME::Timing::Scope timing(timing_, analyzeTiming_);
 
   edm::Handle<edm::View<reco::Candidate> >           muonsForZ;
   edm::Handle<std::vector<pat::MET> >            mets;
@@ -130,33 +168,17 @@ void LeptonsAndMETAnalyzer::analyze(const edm::Event& iEvent, const edm::EventSe
   puppETphi   = inPuppET.phi();
 
   iEvent.getByToken(srcIsoMuons_, muonsForZ);
-  // std::cout << muonsForZ->size() << std::endl;
-  int nZ = 0;
-  TLorentzVector theZCand;
-  for(size_t i = 0, n = muonsForZ->size(); i < n; ++i) {
-    edm::Ptr<reco::Candidate> muPtr1 = muonsForZ->ptrAt(i);
-    for(size_t j = 1, n = muonsForZ->size(); j < n; ++j) {
-      edm::Ptr<reco::Candidate> muPtr2 = muonsForZ->ptrAt(j);
-      if (muPtr1->charge()*muPtr2->charge() < 1){
-        // std::cout << " oppo " << std::endl;
-        TLorentzVector Zcand = TLorentzVector(muPtr1->px(),muPtr1->py(),muPtr1->pz(),muPtr1->energy()) + TLorentzVector(muPtr2->px(),muPtr2->py(),muPtr2->pz(),muPtr2->energy());
-        float Zmass = Zcand.M();
-        // std::cout << "Zmass = " << Zmass << std::endl;
-        float Zdiff = fabs(Zmass - 91.2);
-        if (Zdiff < 15){
-          nZ += 1;
-          theZCand = Zcand;
-        }
-      }
-    }
-  }
-  
+  zBuilder_.clear();
+  for (const reco::Candidate& muon: *muonsForZ)
+    zBuilder_.add(muon);
+  size_t nZ = zBuilder_.build();
 
   if (nZ > 0){
+    const JME::DileptonBuilder::Pair& theZCand = zBuilder_.best();
     nZcands = nZ;
-    ZpT = theZCand.Pt();
-    Zphi = theZCand.Phi();
-    Zmass = theZCand.M();
+    ZpT = theZCand.pt;
+    Zphi = theZCand.phi;
+    Zmass = theZCand.mass;
     pfMET_uPara = 0.;
     pfMET_uPerp = 0.;
     puppET_uPara = 0.;
@@ -204,41 +226,37 @@ void LeptonsAndMETAnalyzer::analyze(const edm::Event& iEvent, const edm::EventSe
   muIso_PHNOMUONPUPPI.clear();
 
   edm::Handle<edm::View<pat::Muon> >  muons;
-  edm::Handle<edm::ValueMap<double> > VMCHSTAND   ;
-  edm::Handle<edm::ValueMap<double> > VMNHSTAND   ;
-  edm::Handle<edm::ValueMap<double> > VMPhSTAND   ;
-  edm::Handle<edm::ValueMap<double> > VMPUSTAND   ;
-  edm::Handle<edm::ValueMap<double> > VMNHPFWGT   ;
-  edm::Handle<edm::ValueMap<double> > VMPhPFWGT   ;
-  edm::Handle<edm::ValueMap<double> > VMCHPUPPI   ;
-  edm::Handle<edm::ValueMap<double> > VMNHPUPPI   ;
-  edm::Handle<edm::ValueMap<double> > VMPhPUPPI   ;
-  edm::Handle<edm::ValueMap<double> > VMCHNOMUONPUPPI   ;
-  edm::Handle<edm::ValueMap<double> > VMNHNOMUONPUPPI   ;
-  edm::Handle<edm::ValueMap<double> > VMPhNOMUONPUPPI   ;
+  edm::Handle<JME::MuonIsolationRecordCollection> isolations;
   edm::Handle<std::vector<reco::Vertex> >        vtx;
 
-  iEvent.getByLabel(srcVtx_,vtx ); 
-  const reco::VertexCollection::const_iterator vtxEnd = vtx->end();
-  for (reco::VertexCollection::const_iterator vtxIter = vtx->begin(); vtxEnd != vtxIter; ++vtxIter) {
-    if (!vtxIter->isFake() && vtxIter->ndof()>=4 && fabs(vtxIter->z())<=24)
-      npv++;
+  edm::Handle<JME::PackedCandidateSoA>           packedCandidates;
+
+  iEvent.getByToken(srcVtx_,vtx ); 
+  if (!srcPackedCandidates_.isUninitialized())
+    iEvent.getByToken(srcPackedCandidates_, packedCandidates);
+
+  // Good vertices already counted by the PackedCandidateSoAProducer if available
+  if (packedCandidates.isValid()) {
+    npv = packedCandidates->nGoodVertices;
+  }
+  else {
+    const reco::VertexCollection::const_iterator vtxEnd = vtx->end();
+    for (reco::VertexCollection::const_iterator vtxIter = vtx->begin(); vtxEnd != vtxIter; ++vtxIter) {
+      if (!vtxIter->isFake() && vtxIter->ndof()>=4 && fabs(vtxIter->z())<=24)
+        npv++;
+    }
   }
 
-  iEvent.getByLabel(srcMuons_, muons);
-  iEvent.getByLabel(srcVMNHPFWGT_, VMNHPFWGT);
-  iEvent.getByLabel(srcVMPhPFWGT_, VMPhPFWGT);
-  iEvent.getByLabel(srcVMCHPUPPI_, VMCHPUPPI);
-  iEvent.getByLabel(srcVMNHPUPPI_, VMNHPUPPI);
-  iEvent.getByLabel(srcVMPhPUPPI_, VMPhPUPPI);
-  iEvent.getByLabel(srcVMCHSTAND_, VMCHSTAND);
-  iEvent.getByLabel(srcVMNHSTAND_, VMNHSTAND);
-  iEvent.getByLabel(srcVMPhSTAND_, VMPhSTAND);
-  iEvent.getByLabel(srcVMPUSTAND_, VMPUSTAND);
-  iEvent.getByLabel(srcVMCHNOMUONPUPPI_, VMCHNOMUONPUPPI);
-  iEvent.getByLabel(srcVMNHNOMUONPUPPI_, VMNHNOMUONPUPPI);
-  iEvent.getByLabel(srcVMPhNOMUONPUPPI_, VMPhNOMUONPUPPI);
+  JME::Timing::Scope isolationTiming(timing_, isolationTiming_);
+
+  iEvent.getByToken(srcMuons_, muons);
+  iEvent.getByToken(srcIsolation_, isolations);
+  if (isolations->size() != muons->size())
+    throw cms::Exception("MuonIsolationMismatch") << "LeptonsAndMETAnalyzer: " << isolations->size()
+      << " isolation records for " << muons->size() << " muons, srcIsolation must be built from srcMuons";
 
+  timing.add(muons->size());
+  isolationTiming.add(muons->size());
   for(size_t i = 0, n = muons->size(); i < n; ++i) {
     edm::Ptr<pat::Muon> muPtr = muons->ptrAt(i);
 
@@ -263,43 +281,62 @@ void LeptonsAndMETAnalyzer::analyze(const edm::Event& iEvent, const edm::EventSe
     muphi . push_back( muPtr->phi());
     mue   . push_back( muPtr->energy());
 
+    typedef JME::MuonIsolationRecord Iso;
+    const Iso& iso = (*isolations)[i];
+    double CHSTAND = iso.get(Iso::STAND, Iso::CH);
+    double NHSTAND = iso.get(Iso::STAND, Iso::NH);
+    double PhSTAND = iso.get(Iso::STAND, Iso::PH);
+    double PUSTAND = iso.get(Iso::STAND, Iso::PU);
+    double NHPFWGT = iso.get(Iso::PFWGT, Iso::NH);
+    double PhPFWGT = iso.get(Iso::PFWGT, Iso::PH);
+    double CHPUPPI = iso.get(Iso::PUPPI, Iso::CH);
+    double NHPUPPI = iso.get(Iso::PUPPI, Iso::NH);
+    double PhPUPPI = iso.get(Iso::PUPPI, Iso::PH);
+    double CHNOMUONPUPPI = iso.get(Iso::NOMUONPUPPI, Iso::CH);
+    double NHNOMUONPUPPI = iso.get(Iso::NOMUONPUPPI, Iso::NH);
+    double PhNOMUONPUPPI = iso.get(Iso::NOMUONPUPPI, Iso::PH);
+
     //Raw Isolation
     //I = [sumChargedHadronPt+ max(0.,sumNeutralHadronPt+sumPhotonPt]/pt
-    muIsoRAW . push_back ( ((*VMCHSTAND)[muPtr] + std::max(0.0,(*VMNHSTAND)[muPtr]+(*VMPhSTAND)[muPtr]))/muPtr->pt() ) ;
+    muIsoRAW . push_back ( (CHSTAND + std::max(0.0,NHSTAND+PhSTAND))/muPtr->pt() ) ;
     
     //Delta Beta (see https://twiki.cern.ch/twiki/bin/view/CMSPublic/SWGuideMuonId#Muon_Isolation for more details)
     //I = [sumChargedHadronPt+ max(0.,sumNeutralHadronPt+sumPhotonPt-0.5sumPUPt]/pt
-    muIsoSTAND . push_back( ((*VMCHSTAND)[muPtr] + std::max(0.0,(*VMNHSTAND)[muPtr]+(*VMPhSTAND)[muPtr]-(0.5*(*VMPUSTAND)[muPtr] ) ) )/muPtr->pt() );
+    muIsoSTAND . push_back( (CHSTAND + std::max(0.0,NHSTAND+PhSTAND-(0.5*PUSTAND) ) )/muPtr->pt() );
 
     // PF Weighted (see https://twiki.cern.ch/twiki/bin/viewauth/CMS/MuonIsolationForRun2 for more details)
-    muIsoPFWGT . push_back( ((*VMCHSTAND)[muPtr]+(*VMNHPFWGT)[muPtr]+(*VMPhPFWGT)[muPtr])/muPtr->pt() );
+    muIsoPFWGT . push_back( (CHSTAND+NHPFWGT+PhPFWGT)/muPtr->pt() );
     
     // PUPPI Weighted (see https://twiki.cern.ch/twiki/bin/viewauth/CMS/MuonIsolationForRun2 for more details)
-    muIsoPUPPI . push_back( ((*VMCHPUPPI)[muPtr]+(*VMNHPUPPI)[muPtr]+(*VMPhPUPPI)[muPtr])/muPtr->pt() );
+    muIsoPUPPI . push_back( (CHPUPPI+NHPUPPI+PhPUPPI)/muPtr->pt() );
 
     // PUPPI Weighted without muons
-    muIsoNOMUONPUPPI . push_back( ((*VMCHNOMUONPUPPI)[muPtr]+(*VMNHNOMUONPUPPI)[muPtr]+(*VMPhNOMUONPUPPI)[muPtr])/muPtr->pt() );
-
-    muIso_CH   .push_back( (*VMCHSTAND)[muPtr] );
-    muIso_NU   .push_back( (*VMNHSTAND)[muPtr] );
-    muIso_PH   .push_back( (*VMPhSTAND)[muPtr] );
-    muIso_PU   .push_back( (*VMPUSTAND)[muPtr] );
-    muIso_NUPFW  .push_back( (*VMNHPFWGT)[muPtr] );
-    muIso_PHPFW  .push_back( (*VMPhPFWGT)[muPtr] );
-    muIso_CHPUPPI .push_back( (*VMCHPUPPI)[muPtr] );
-    muIso_NUPUPPI .push_back( (*VMNHPUPPI)[muPtr] );
-    muIso_PHPUPPI .push_back( (*VMPhPUPPI)[muPtr] );
-    muIso_CHNOMUONPUPPI .push_back( (*VMCHNOMUONPUPPI)[muPtr] );
-    muIso_NUNOMUONPUPPI .push_back( (*VMNHNOMUONPUPPI)[muPtr] );
-    muIso_PHNOMUONPUPPI .push_back( (*VMPhNOMUONPUPPI)[muPtr] );
+    muIsoNOMUONPUPPI . push_back( (CHNOMUONPUPPI+NHNOMUONPUPPI+PhNOMUONPUPPI)/muPtr->pt() );
+
+    muIso_CH   .push_back( CHSTAND );
+    muIso_NU   .push_back( NHSTAND );
+    muIso_PH   .push_back( PhSTAND );
+    muIso_PU   .push_back( PUSTAND );
+    muIso_NUPFW  .push_back( NHPFWGT );
+    muIso_PHPFW  .push_back( PhPFWGT );
+    muIso_CHPUPPI .push_back( CHPUPPI );
+    muIso_NUPUPPI .push_back( NHPUPPI );
+    muIso_PHPUPPI .push_back( PhPUPPI );
+    muIso_CHNOMUONPUPPI .push_back( CHNOMUONPUPPI );
+    muIso_NUNOMUONPUPPI .push_back( NHNOMUONPUPPI );
+    muIso_PHNOMUONPUPPI .push_back( PhNOMUONPUPPI );
 
   }
 
 
 
 
-  tree.fill();  
-  eventCounter_++;
+  if (doRecoil_ && nZ > 0) {
+    recoil_.fill(pfMETRecoil_, ZpT, npv, pfMET_uPara, pfMET_uPerp);
+    recoil_.fill(puppETRecoil_, ZpT, npv, puppET_uPara, puppET_uPerp);
+  }
+
+  commit();
 }
 
 void LeptonsAndMETAnalyzer::recoilComputation( float &met, float &metPhi, float &Zpt, float &Zphi, float &upara, float &uperp){
@@ -313,10 +350,3 @@ void LeptonsAndMETAnalyzer::recoilComputation( float &met, float &metPhi, float
   uperp   = p1U*p1Sin;
 
 }
-
-
-////////////////////////////////////////////////////////////////////////////////
-// define LeptonsAndMETAnalyzer as a plugin
-////////////////////////////////////////////////////////////////////////////////
-#include "FWCore/Framework/interface/MakerMacros.h"
-DEFINE_FWK_MODULE(LeptonsAndMETAnalyzer);
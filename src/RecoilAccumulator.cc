@@ -0,0 +1,194 @@
+#include "FWCore/ParameterSet/interface/ParameterSet.h"
+#include "FWCore/ServiceRegistry/interface/Service.h"
+#include "FWCore/Utilities/interface/EDMException.h"
+#include "CommonTools/UtilAlgos/interface/TFileService.h"
+
+#include "JMEAnalysis/JMEValidator/interface/RecoilAccumulator.h"
+
+#include <TH3F.h>
+#include <TProfile2D.h>
+
+#include <algorithm>
+
+void JME::RecoilAccumulator::Moments::add(double x) {
+    n++;
+    double delta = x - mean;
+    mean += delta / n;
+    m2 += delta * (x - mean);
+}
+
+void JME::RecoilAccumulator::Moments::merge(const Moments& other) {
+    if (other.n == 0)
+        return;
+
+    uint64_t total = n + other.n;
+    double delta = other.mean - mean;
+    mean += delta * other.n / total;
+    m2 += other.m2 + delta * delta * (double(n) * other.n / total);
+    n = total;
+}
+
+JME::RecoilAccumulator::RecoilAccumulator()
+    : RecoilAccumulator(edm::ParameterSet()) {
+    }
+
+JME::RecoilAccumulator::RecoilAccumulator(const edm::ParameterSet& iConfig) {
+    zPtBins_ = {0, 10, 20, 30, 40, 50, 75, 100, 150, 200, 300};
+    npvBins_ = {0, 5, 10, 15, 20, 25, 30, 40, 60};
+    std::vector<double> responseBins = {120, -4., 2.};
+    std::vector<double> perpBins = {100, -100., 100.};
+
+    if (iConfig.existsAs<std::vector<double>>("zPtBins"))
+        zPtBins_ = iConfig.getParameter<std::vector<double>>("zPtBins");
+    if (iConfig.existsAs<std::vector<double>>("npvBins"))
+        npvBins_ = iConfig.getParameter<std::vector<double>>("npvBins");
+    if (iConfig.existsAs<std::vector<double>>("responseBins"))
+        responseBins = iConfig.getParameter<std::vector<double>>("responseBins");
+    if (iConfig.existsAs<std::vector<double>>("perpBins"))
+        perpBins = iConfig.getParameter<std::vector<double>>("perpBins");
+
+    if (zPtBins_.size() < 2 || !std::is_sorted(zPtBins_.begin(), zPtBins_.end()) ||
+            npvBins_.size() < 2 || !std::is_sorted(npvBins_.begin(), npvBins_.end()))
+        throw edm::Exception(edm::errors::Configuration, "RecoilAccumulator: zPtBins and npvBins must have at least two sorted edges");
+
+    if (responseBins.size() != 3 || perpBins.size() != 3 || responseBins[0] < 1 || perpBins[0] < 1)
+        throw edm::Exception(edm::errors::Configuration, "RecoilAccumulator: responseBins and perpBins must be (number of bins, min, max)");
+
+    responseAxis_ = {size_t(responseBins[0]), responseBins[1], responseBins[2]};
+    perpAxis_ = {size_t(perpBins[0]), perpBins[1], perpBins[2]};
+}
+
+size_t JME::RecoilAccumulator::flavour(const std::string& name) {
+    for (size_t i = 0; i < flavours_.size(); i++) {
+        if (flavours_[i].name == name)
+            return i;
+    }
+
+    const size_t nCells = (zPtBins_.size() - 1) * (npvBins_.size() - 1);
+
+    Flavour flavour;
+    flavour.name = name;
+    flavour.response.resize(nCells);
+    flavour.perp.resize(nCells);
+    flavour.responseHistogram.resize(nCells * (responseAxis_.nBins + 2), 0);
+    flavour.perpHistogram.resize(nCells * (perpAxis_.nBins + 2), 0);
+    flavours_.push_back(flavour);
+
+    return flavours_.size() - 1;
+}
+
+int JME::RecoilAccumulator::find(const std::vector<double>& edges, double x) {
+    if (x < edges.front() || x >= edges.back())
+        return -1;
+
+    return std::upper_bound(edges.begin(), edges.end(), x) - edges.begin() - 1;
+}
+
+size_t JME::RecoilAccumulator::find(const Axis& axis, double x) {
+    if (x < axis.min)
+        return 0;
+    if (x >= axis.max)
+        return axis.nBins + 1;
+
+    return std::min<size_t>((x - axis.min) / (axis.max - axis.min) * axis.nBins, axis.nBins - 1) + 1;
+}
+
+void JME::RecoilAccumulator::fill(size_t index, double zPt, double npv, double uPara, double uPerp) {
+    int iZPt = find(zPtBins_, zPt);
+    int iNpv = find(npvBins_, npv);
+    if (iZPt < 0 || iNpv < 0 || zPt <= 0)
+        return;
+
+    Flavour& flavour = flavours_[index];
+    const size_t cell = iZPt * (npvBins_.size() - 1) + iNpv;
+    const double response = uPara / zPt;
+
+    flavour.response[cell].add(response);
+    flavour.perp[cell].add(uPerp);
+
+    flavour.responseHistogram[cell * (responseAxis_.nBins + 2) + find(responseAxis_, response)]++;
+    flavour.perpHistogram[cell * (perpAxis_.nBins + 2) + find(perpAxis_, uPerp)]++;
+}
+
+void JME::RecoilAccumulator::merge(const RecoilAccumulator& other) {
+    for (const Flavour& otherFlavour: other.flavours_) {
+        Flavour& flavour = flavours_[this->flavour(otherFlavour.name)];
+
+        for (size_t i = 0; i < flavour.response.size(); i++) {
+            flavour.response[i].merge(otherFlavour.response[i]);
+            flavour.perp[i].merge(otherFlavour.perp[i]);
+        }
+        for (size_t i = 0; i < flavour.responseHistogram.size(); i++)
+            flavour.responseHistogram[i] += otherFlavour.responseHistogram[i];
+        for (size_t i = 0; i < flavour.perpHistogram.size(); i++)
+            flavour.perpHistogram[i] += otherFlavour.perpHistogram[i];
+    }
+}
+
+namespace {
+    // Set the sums of a TProfile2D bin from running moments: hadd then adds the
+    // sums of the jobs, which is exact
+    template <typename Moments>
+    void setProfileBin(TProfile2D* profile, int bin, const Moments& moments) {
+        double sum = moments.n * moments.mean;
+        double sum2 = moments.m2 + moments.n * moments.mean * moments.mean;
+
+        profile->SetBinEntries(bin, moments.n);
+        profile->fArray[bin] = sum;
+        profile->GetSumw2()->fArray[bin] = sum2;
+    }
+}
+
+void JME::RecoilAccumulator::book() const {
+    edm::Service<TFileService> fs;
+    TFileDirectory recoil = fs->mkdir("recoil");
+
+    const int nZPt = zPtBins_.size() - 1;
+    const int nNpv = npvBins_.size() - 1;
+
+    // Edges of the value axes, for TH3F which needs variable binning on all axes
+    auto edges = [](const Axis& axis) {
+        std::vector<double> edges(axis.nBins + 1);
+        for (size_t i = 0; i <= axis.nBins; i++)
+            edges[i] = axis.min + (axis.max - axis.min) * i / axis.nBins;
+        return edges;
+    };
+    const std::vector<double> responseEdges = edges(responseAxis_);
+    const std::vector<double> perpEdges = edges(perpAxis_);
+
+    for (const Flavour& flavour: flavours_) {
+        TFileDirectory dir = recoil.mkdir(flavour.name);
+
+        TProfile2D* responseProfile = dir.make<TProfile2D>("uParaOverZpT_profile", (flavour.name + ";Z p_{T} (GeV);NPV;u_{#parallel} / Z p_{T}").c_str(),
+                nZPt, zPtBins_.data(), nNpv, npvBins_.data(), "s");
+        TProfile2D* perpProfile = dir.make<TProfile2D>("uPerp_profile", (flavour.name + ";Z p_{T} (GeV);NPV;u_{#perp} (GeV)").c_str(),
+                nZPt, zPtBins_.data(), nNpv, npvBins_.data(), "s");
+
+        TH3F* responseHistogram = dir.make<TH3F>("uParaOverZpT", (flavour.name + ";Z p_{T} (GeV);NPV;u_{#parallel} / Z p_{T}").c_str(),
+                nZPt, zPtBins_.data(), nNpv, npvBins_.data(), responseAxis_.nBins, responseEdges.data());
+        TH3F* perpHistogram = dir.make<TH3F>("uPerp", (flavour.name + ";Z p_{T} (GeV);NPV;u_{#perp} (GeV)").c_str(),
+                nZPt, zPtBins_.data(), nNpv, npvBins_.data(), perpAxis_.nBins, perpEdges.data());
+
+        uint64_t entries = 0;
+        for (int iZPt = 0; iZPt < nZPt; iZPt++) {
+            for (int iNpv = 0; iNpv < nNpv; iNpv++) {
+                const size_t cell = iZPt * nNpv + iNpv;
+                const int bin = responseProfile->GetBin(iZPt + 1, iNpv + 1);
+
+                setProfileBin(responseProfile, bin, flavour.response[cell]);
+                setProfileBin(perpProfile, bin, flavour.perp[cell]);
+                entries += flavour.response[cell].n;
+
+                for (size_t i = 0; i < responseAxis_.nBins + 2; i++)
+                    responseHistogram->SetBinContent(iZPt + 1, iNpv + 1, i, flavour.responseHistogram[cell * (responseAxis_.nBins + 2) + i]);
+                for (size_t i = 0; i < perpAxis_.nBins + 2; i++)
+                    perpHistogram->SetBinContent(iZPt + 1, iNpv + 1, i, flavour.perpHistogram[cell * (perpAxis_.nBins + 2) + i]);
+            }
+        }
+
+        responseProfile->SetEntries(entries);
+        perpProfile->SetEntries(entries);
+        responseHistogram->SetEntries(entries);
+        perpHistogram->SetEntries(entries);
+    }
+}
@@ -0,0 +1,102 @@
+#include "JMEAnalysis/JMEValidator/interface/SortedVertices.h"
+
+#include <algorithm>
+#include <cmath>
+#include <numeric>
+
+namespace {
+    // Margin on the pruning bound, in cm, covering the rounding of PackedCandidate::dz
+    const double DZ_TOLERANCE = 1e-3;
+}
+
+void JME::SortedVertices::update(const std::vector<reco::Vertex>& vertices) {
+    std::vector<size_t> indices;
+    indices.reserve(vertices.size());
+    for (size_t i = 0; i < vertices.size(); i++) {
+        if (!vertices[i].isFake())
+            indices.push_back(i);
+    }
+
+    std::stable_sort(indices.begin(), indices.end(), [&vertices](size_t a, size_t b) {
+            return vertices[a].z() < vertices[b].z();
+            });
+
+    z_.clear();
+    positions_.clear();
+    indices_ = indices;
+    maxRadius_ = 0;
+    z_.reserve(indices.size());
+    positions_.reserve(indices.size());
+    for (size_t index: indices) {
+        const reco::Vertex::Point& position = vertices[index].position();
+        z_.push_back(position.z());
+        positions_.push_back(position);
+        maxRadius_ = std::max(maxRadius_, std::hypot(position.x(), position.y()));
+    }
+}
+
+double JME::SortedVertices::closestDz(const pat::PackedCandidate& candidate, double initial) const {
+    double best = initial;
+    if (z_.empty())
+        return best;
+
+    // As in the loop over the vertices, a vertex replaces the best one if it is
+    // strictly closer, or as close and before it in the input collection. The
+    // initial value comes before all the vertices
+    size_t bestIndex = 0;
+    bool found = false;
+    auto consider = [&](size_t i) {
+        double dz = candidate.dz(positions_[i]);
+        if (std::abs(dz) < std::abs(best) || (found && std::abs(dz) == std::abs(best) && indices_[i] < bestIndex)) {
+            best = dz;
+            bestIndex = indices_[i];
+            found = true;
+        }
+    };
+
+    double pt = candidate.pt();
+    if (!(pt > 0)) {
+        // No direction to bound dz with: look at all the vertices
+        for (size_t i = 0; i < positions_.size(); i++)
+            consider(i);
+        return best;
+    }
+
+    const reco::Candidate::Point& vertex = candidate.vertex();
+    double ux = candidate.px() / pt;
+    double uy = candidate.py() / pt;
+    double a = candidate.pz() / pt;
+    double z0 = vertex.z() - a * (vertex.x() * ux + vertex.y() * uy);
+    double slack = std::abs(a) * maxRadius_ + DZ_TOLERANCE;
+
+    size_t start = std::lower_bound(z_.begin(), z_.end(), z0) - z_.begin();
+
+    // Walk upwards from z0
+    for (size_t i = start; i < z_.size(); i++) {
+        if (z_[i] - z0 - slack > std::abs(best))
+            break;
+        consider(i);
+    }
+
+    // Walk downwards from z0
+    for (size_t i = start; i > 0; i--) {
+        if (z0 - z_[i - 1] - slack > std::abs(best))
+            break;
+        consider(i - 1);
+    }
+
+    return best;
+}
+
+double JME::SortedVertices::closestDzBruteForce(const pat::PackedCandidate& candidate, const std::vector<reco::Vertex>& vertices, double initial) {
+    double best = initial;
+    for (const auto& iv: vertices) {
+        if (iv.isFake())
+            continue;
+        if (fabs(candidate.dz(iv.position())) < fabs(best)) {
+            best = candidate.dz(iv.position());
+        }
+    }
+
+    return best;
+}
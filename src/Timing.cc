@@ -0,0 +1,106 @@
+#include "FWCore/ServiceRegistry/interface/Service.h"
+#include "CommonTools/UtilAlgos/interface/TFileService.h"
+
+#include "JMEAnalysis/JMEValidator/interface/Timing.h"
+
+#include <TH1F.h>
+
+#include <algorithm>
+#include <cmath>
+#include <fstream>
+
+namespace {
+    // Bin of log10(ns) in [0, 10], with underflow (0) and overflow (N_BINS + 1) bins
+    size_t bin(double nanoseconds, size_t nBins) {
+        double x = std::log10(std::max(nanoseconds, 1.)) / 10. * nBins;
+        return std::min<size_t>(x, nBins) + 1;
+    }
+}
+
+size_t JME::Timing::section(const std::string& name, const std::string& unit) {
+    for (size_t i = 0; i < sections_.size(); i++) {
+        if (sections_[i].name == name)
+            return i;
+    }
+
+    Section section;
+    section.name = name;
+    section.unit = unit;
+    sections_.push_back(section);
+
+    return sections_.size() - 1;
+}
+
+void JME::Timing::record(size_t index, uint64_t nanoseconds, uint64_t items) {
+    Section& section = sections_[index];
+    section.calls++;
+    section.items += items;
+    section.nanoseconds += nanoseconds;
+
+    section.timePerCall[bin(nanoseconds, N_BINS)]++;
+    if (items > 0)
+        section.timePerItem[bin(double(nanoseconds) / items, N_BINS)]++;
+}
+
+void JME::Timing::merge(const Timing& other) {
+    for (const Section& otherSection: other.sections_) {
+        Section& section = sections_[this->section(otherSection.name, otherSection.unit)];
+        section.calls += otherSection.calls;
+        section.items += otherSection.items;
+        section.nanoseconds += otherSection.nanoseconds;
+        for (size_t i = 0; i < section.timePerCall.size(); i++) {
+            section.timePerCall[i] += otherSection.timePerCall[i];
+            section.timePerItem[i] += otherSection.timePerItem[i];
+        }
+    }
+}
+
+void JME::Timing::book() const {
+    if (!enabled_)
+        return;
+
+    edm::Service<TFileService> fs;
+    TFileDirectory dir = fs->mkdir("timing");
+    for (const Section& section: sections_) {
+        TH1F* timePerCall = dir.make<TH1F>((section.name + "_perCall").c_str(),
+                (section.name + ";log_{10}(time per call / ns);calls").c_str(), N_BINS, 0., 10.);
+        TH1F* timePerItem = dir.make<TH1F>((section.name + "_per_" + section.unit).c_str(),
+                (section.name + ";log_{10}(time per " + section.unit + " / ns);calls").c_str(), N_BINS, 0., 10.);
+
+        for (size_t i = 0; i < section.timePerCall.size(); i++) {
+            timePerCall->SetBinContent(i, section.timePerCall[i]);
+            timePerItem->SetBinContent(i, section.timePerItem[i]);
+        }
+        timePerCall->SetEntries(section.calls);
+        uint64_t itemEntries = 0;
+        for (uint64_t entries: section.timePerItem)
+            itemEntries += entries;
+        timePerItem->SetEntries(itemEntries);
+    }
+}
+
+void JME::Timing::writeJSON(const std::string& fileName, const std::string& moduleLabel) const {
+    if (!enabled_)
+        return;
+
+    std::ofstream out(fileName);
+    out << "{\n";
+    out << "  \"module\": \"" << moduleLabel << "\",\n";
+    out << "  \"sections\": {";
+    for (size_t i = 0; i < sections_.size(); i++) {
+        const Section& section = sections_[i];
+        double perCall = section.calls ? double(section.nanoseconds) / section.calls : 0;
+        double perItem = section.items ? double(section.nanoseconds) / section.items : 0;
+
+        out << ((i == 0) ? "\n" : ",\n");
+        out << "    \"" << section.name << "\": {";
+        out << "\"unit\": \"" << section.unit << "\", ";
+        out << "\"calls\": " << section.calls << ", ";
+        out << "\"items\": " << section.items << ", ";
+        out << "\"total_ns\": " << section.nanoseconds << ", ";
+        out << "\"ns_per_call\": " << perCall << ", ";
+        out << "\"ns_per_item\": " << perItem << "}";
+    }
+    out << "\n  }\n";
+    out << "}\n";
+}
@@ -0,0 +1,15 @@
+#include "DataFormats/Common/interface/Wrapper.h"
+
+#include "JMEAnalysis/JMEValidator/interface/MuonIsolationRecord.h"
+#include "JMEAnalysis/JMEValidator/interface/PackedCandidateSoA.h"
+
+namespace {
+    struct dictionary {
+        JME::PackedCandidateSoA soa;
+        edm::Wrapper<JME::PackedCandidateSoA> soaWrapper;
+
+        JME::MuonIsolationRecord muonIsolation;
+        JME::MuonIsolationRecordCollection muonIsolations;
+        edm::Wrapper<JME::MuonIsolationRecordCollection> muonIsolationsWrapper;
+    };
+}
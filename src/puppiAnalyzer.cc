@@ -7,7 +7,7 @@
 ////////////////////////////////////////////////////////////////////////////////
 
 #include "FWCore/Framework/interface/Frameworkfwd.h"
-#include "FWCore/Framework/interface/EDAnalyzer.h"
+#include "FWCore/Framework/interface/stream/EDAnalyzer.h"
 #include "FWCore/Framework/interface/Event.h"
 #include "FWCore/Framework/interface/MakerMacros.h"
  
@@ -51,24 +51,49 @@
 
 #include "JMEAnalysis/JMEValidator/interface/puppiAnalyzer.h"
 
+#include <cstring>
 #include <vector>
 
+namespace {
+    // 64 bits mix function (splitmix64 finalizer)
+    uint64_t mix(uint64_t x) {
+        x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ULL;
+        x = (x ^ (x >> 27)) * 0x94d049bb133111ebULL;
+        return x ^ (x >> 31);
+    }
+}
+
 ////////////////////////////////////////////////////////////////////////////////
 // construction/destruction
 ////////////////////////////////////////////////////////////////////////////////
 
 //______________________________________________________________________________
-puppiAnalyzer::puppiAnalyzer(const edm::ParameterSet& iConfig)
-    : JME::Analyzer(iConfig)
+puppiAnalyzer::puppiAnalyzer(const edm::ParameterSet& iConfig, const JME::AnalyzerOutput* output)
+    : JME::Analyzer(iConfig, output)
 {
-  eventLimit_     = iConfig.getParameter<int>("maxEvents");
-    
+  prescale_     = iConfig.existsAs<unsigned int>("prescale") ? iConfig.getParameter<unsigned int>("prescale") : 1;
+  ptMin_        = iConfig.existsAs<double>("ptMin") ? iConfig.getParameter<double>("ptMin") : 0;
+  compact_      = iConfig.existsAs<bool>("compact") ? iConfig.getParameter<bool>("compact") : false;
+  mantissaBits_ = iConfig.existsAs<int>("mantissaBits") ? iConfig.getParameter<int>("mantissaBits") : 23;
+
+  if (prescale_ == 0)
+    throw edm::Exception(edm::errors::Configuration, "puppiAnalyzer: prescale must be at least 1");
+  if (mantissaBits_ < 1 || mantissaBits_ > 23)
+    throw edm::Exception(edm::errors::Configuration, "puppiAnalyzer: mantissaBits must be between 1 and 23");
+
+  // Branch groups, only one of the two candidate encodings is written
+  declareBranchGroup("candidates", {"px", "py", "pz", "e", "id", "charge", "fromPV"});
+  declareBranchGroup("compact", {"pt", "eta", "phi", "pdgId", "q", "pv"});
+  disableBranchGroup(compact_ ? "candidates" : "compact");
+
   nAlgosToken_ = consumes<double>(iConfig.getParameter<edm::InputTag>("nAlgos"));
   rawAlphasToken_ = consumes<std::vector<double>>(iConfig.getParameter<edm::InputTag>("rawAlphas"));
   alphasToken_ = consumes<std::vector<double>>(iConfig.getParameter<edm::InputTag>("alphas"));
   alphasMedToken_ = consumes<std::vector<double>>(iConfig.getParameter<edm::InputTag>("alphasMed"));
   alphasRmsToken_ = consumes<std::vector<double>>(iConfig.getParameter<edm::InputTag>("alphasRms"));
   packedPFCandidatesToken_ = consumes<reco::CandidateView>(iConfig.getParameter<edm::InputTag>("packedPFCandidates"));
+
+  candidatesTiming_ = timing_.section("candidates", "candidates");
 }
 
 
@@ -84,18 +109,43 @@ puppiAnalyzer::~puppiAnalyzer()
 ////////////////////////////////////////////////////////////////////////////////
 
 //______________________________________________________________________________
-void puppiAnalyzer::beginJob()
+bool puppiAnalyzer::isSelected(const edm::EventID& id) const
 {
-  JME::Analyzer::beginJob();
-  eventCounter_ = 0;
+  if (prescale_ == 1)
+    return true;
+
+  uint64_t hash = mix(id.run());
+  hash = mix(hash ^ id.luminosityBlock());
+  hash = mix(hash ^ id.event());
+
+  return (hash % prescale_) == 0;
 }
 
 
 //______________________________________________________________________________
-void puppiAnalyzer::analyze(const edm::Event& iEvent, const edm::EventSetup& iSetup)
+float puppiAnalyzer::reduce(float value) const
 {
+  if (mantissaBits_ >= 23)
+    return value;
+
+  // Round to nearest, and clear the dropped bits of the mantissa. A carry
+  // into the exponent gives the correctly rounded power of two
+  uint32_t bits;
+  std::memcpy(&bits, &value, sizeof(bits));
+  const int shift = 23 - mantissaBits_;
+  bits += uint32_t(1) << (shift - 1);
+  bits &= ~((uint32_t(1) << shift) - 1);
+  std::memcpy(&value, &bits, sizeof(bits));
+
+  return value;
+}
 
-  if (eventCounter_ > eventLimit_) return;
+
+//______________________________________________________________________________
+void puppiAnalyzer::analyze(const edm::Event& iEvent, const edm::EventSetup& iSetup)
+{
+  // Decided before reading any product
+  if (!isSelected(iEvent.id())) return;
 
   edm::Handle<double> nalgosHandle;
   iEvent.getByToken(nAlgosToken_, nalgosHandle);
@@ -123,37 +173,55 @@ void puppiAnalyzer::analyze(const edm::Event& iEvent, const edm::EventSetup& iSe
 
   nalgos = *nalgosHandle;
 
-  int ctr = 0;
+  JME::Timing::Scope timing(timing_, candidatesTiming_);
+  timing.add(pfCol->size());
+
+  // Candidates written, to select the same candidates in the raw alphas
+  std::vector<bool> selected(pfCol->size(), false);
+
+  int ctr = -1;
   for(reco::CandidateView::const_iterator itPF = pfCol->begin(); itPF!=pfCol->end(); itPF++) {
-    px.push_back( itPF->px() );
-    py.push_back( itPF->py() );
-    pz.push_back( itPF->pz() );
-    e.push_back( itPF->energy() );
-    id.push_back( float(itPF->pdgId()) );
-    charge.push_back( float(itPF->charge()) );
-
-    thealphas.push_back( (*TheAlphas)[ctr] );
-    thealphasmed.push_back( (*TheAlphasMed)[ctr] );
-    thealphasrms.push_back( (*TheAlphasRms)[ctr] );
-    
-    const pat::PackedCandidate *lPack = dynamic_cast<const pat::PackedCandidate*>(&(*itPF));
-    fromPV.push_back( float(lPack->fromPV()) );
     ctr++;
+    if (itPF->pt() < ptMin_) continue;
+    selected[ctr] = true;
+
+    const pat::PackedCandidate *lPack = dynamic_cast<const pat::PackedCandidate*>(&(*itPF));
+
+    if (compact_) {
+      pt.push_back( reduce(itPF->pt()) );
+      eta.push_back( reduce(itPF->eta()) );
+      phi.push_back( reduce(itPF->phi()) );
+      pdgId.push_back( itPF->pdgId() );
+      q.push_back( itPF->charge() );
+      pv.push_back( lPack->fromPV() );
+
+      thealphas.push_back( reduce((*TheAlphas)[ctr]) );
+      thealphasmed.push_back( reduce((*TheAlphasMed)[ctr]) );
+      thealphasrms.push_back( reduce((*TheAlphasRms)[ctr]) );
+    }
+    else {
+      px.push_back( itPF->px() );
+      py.push_back( itPF->py() );
+      pz.push_back( itPF->pz() );
+      e.push_back( itPF->energy() );
+      id.push_back( float(itPF->pdgId()) );
+      charge.push_back( float(itPF->charge()) );
+      fromPV.push_back( float(lPack->fromPV()) );
+
+      thealphas.push_back( (*TheAlphas)[ctr] );
+      thealphasmed.push_back( (*TheAlphasMed)[ctr] );
+      thealphasrms.push_back( (*TheAlphasRms)[ctr] );
+    }
   }
 
 
+  // The raw alphas are one block of candidates per PUPPI algorithm: the
+  // candidates below ptMin_ are removed from each block, so that alphas keeps
+  // nalgos blocks lining up with the candidate branches
   for(unsigned int i = 0; i < rawAlphas->size(); i++){
-    alphas.push_back( (*rawAlphas)[i] );
+    if (!selected.empty() && !selected[i % selected.size()]) continue;
+    alphas.push_back( compact_ ? reduce((*rawAlphas)[i]) : (*rawAlphas)[i] );
   }
 
-  tree.fill();
-  
-  eventCounter_++;
+  commit();
 }
-
-
-////////////////////////////////////////////////////////////////////////////////
-// define puppiAnalyzer as a plugin
-////////////////////////////////////////////////////////////////////////////////
-#include "FWCore/Framework/interface/MakerMacros.h"
-DEFINE_FWK_MODULE(puppiAnalyzer);
@@ -65,6 +65,9 @@ process.TFileService = cms.Service("TFileService",
   fileName = cms.string('jetCorrectionsOnTheFlyExample.root')
 )
 
+# JEC payloads are parsed once per job and shared by all the modules using them
+process.JetCorrectorService = cms.Service("JetCorrectorService")
+
 
 ##  ____             _ ____                           
 ## |  _ \ ___   ___ | / ___|  ___  _   _ _ __ ___ ___ 
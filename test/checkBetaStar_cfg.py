@@ -0,0 +1,17 @@
+# Regression test of the closest vertex search used for betaStar.
+#
+# Runs the JetMETAnalyzers of runFramework.py with checkBetaStar enabled: for
+# every charged constituent, the sorted vertex search is compared to the loop
+# over all the vertices, and the job stops with a BetaStarMismatch exception
+# at the first difference.
+#
+#   cmsRun checkBetaStar_cfg.py
+
+from runFramework import *
+
+process.maxEvents.input = 200
+
+for name in process.jmfw_analyzers.moduleNames():
+    getattr(process, name).checkBetaStar = cms.untracked.bool(True)
+
+process.TFileService.fileName = cms.string('checkBetaStar.root')
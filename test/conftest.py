@@ -0,0 +1,20 @@
+"""
+Make the python/ directory of the package importable as JMEAnalysis.JMEValidator,
+as it is in a CMSSW release, so that the NumPy modules can be tested without one.
+"""
+
+import os
+import sys
+import types
+
+PYTHON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python')
+
+if 'JMEAnalysis.JMEValidator' not in sys.modules:
+    _top = sys.modules.setdefault('JMEAnalysis', types.ModuleType('JMEAnalysis'))
+    if not hasattr(_top, '__path__'):
+        _top.__path__ = []
+
+    _package = types.ModuleType('JMEAnalysis.JMEValidator')
+    _package.__path__ = [PYTHON_DIR]
+    sys.modules['JMEAnalysis.JMEValidator'] = _package
+    _top.JMEValidator = _package
@@ -1,3 +1,5 @@
+import os
+
 import FWCore.ParameterSet.Config as cms
 
 # Common parameters used in all modules
@@ -13,17 +15,18 @@ CommonParameters = cms.PSet(
     deltaRPartonMax = cms.double(0.25),
     # consider all matched references
     nJetMax         = cms.uint32(0),
+    # branch groups not written: pileup, reference, kinematics, pileupId, rings
+    disabledBranchGroups = cms.vstring(),
+    # output tree settings, trading CPU against output size
+    compressionAlgorithm = cms.string('ZLIB'),
+    compressionLevel     = cms.int32(1),
+    basketSize           = cms.int32(32000),
+    autoFlush            = cms.int64(-30000000),
+    # time the hot sections of the analyzers (histograms in the 'timing'
+    # directory and <module label>_timing.json at the end of the job)
+    timing               = cms.untracked.bool(False),
 )
  
-process = cms.Process("JRA")
-
-process.load("Configuration.StandardSequences.FrontierConditions_GlobalTag_cff")
-process.load("Configuration.EventContent.EventContent_cff")
-process.load('Configuration.StandardSequences.Geometry_cff')
-process.load('Configuration.StandardSequences.MagneticField_38T_cff')
-process.GlobalTag.globaltag = "PHYS14_25_V2::All"
-
-
 #!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
 #! Input
 #!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!  
@@ -155,27 +158,6 @@ inputFiles = cms.untracked.vstring(
 
     )
 
-process.maxEvents = cms.untracked.PSet(input = cms.untracked.int32(1000))
-process.source = cms.Source("PoolSource", fileNames = inputFiles )
-
-# Services
-process.load('FWCore.MessageLogger.MessageLogger_cfi')
-process.MessageLogger.cerr.FwkReport.reportEvery = 10
-process.load('CommonTools.UtilAlgos.TFileService_cfi')
-process.TFileService.fileName = cms.string('output.root')
-
-process.out = cms.OutputModule("PoolOutputModule",
-        outputCommands  = cms.untracked.vstring(),
-        fileName       = cms.untracked.string("output_edm.root")
-        )
-
-#- - - - - - - - - - - 
-# muon isolation study
-#- - - - - - - - - - - 
-from JMEAnalysis.JMEValidator.runMuonIsolation_cff import runMuonIsolation
-runMuonIsolation(process)
-
-
 # Create all needed jets collections
 
 # jetsCollections is a dictionnary containing all the informations needed for creating a new jet collection. The format used is :
@@ -202,42 +184,122 @@ jetsCollections = {
             },
         }
 
-from JMEAnalysis.JetToolbox.jetToolbox_cff import *
+def buildProcess():
+    """Conditions, muon isolation study and jet collections: the slow part of
+    the configuration, cached by cachedProcess"""
 
-for name, params in jetsCollections.items():
-    for index, pu_method in enumerate(params['pu_methods']):
-        # Add the jet collection
-        jetToolbox(process, params['algo'], 'dummy', 'out', PUMethod = pu_method, JETCorrPayload = params['jec_payloads'][index], JETCorrLevels = params['jec_levels'])
+    process = cms.Process("JRA")
+
+    process.load("Configuration.StandardSequences.FrontierConditions_GlobalTag_cff")
+    process.load("Configuration.EventContent.EventContent_cff")
+    process.load('Configuration.StandardSequences.Geometry_cff')
+    process.load('Configuration.StandardSequences.MagneticField_38T_cff')
+    process.GlobalTag.globaltag = "PHYS14_25_V2::All"
+
+    process.out = cms.OutputModule("PoolOutputModule",
+            outputCommands  = cms.untracked.vstring(),
+            fileName       = cms.untracked.string("output_edm.root")
+            )
+
+    #- - - - - - - - - - - 
+    # muon isolation study
+    #- - - - - - - - - - - 
+    from JMEAnalysis.JMEValidator.runMuonIsolation_cff import runMuonIsolation
+    runMuonIsolation(process)
+
+    from JMEAnalysis.JetToolbox.jetToolbox_cff import jetToolbox
+
+    for name, params in jetsCollections.items():
+        for index, pu_method in enumerate(params['pu_methods']):
+            # Add the jet collection
+            jetToolbox(process, params['algo'], 'dummy', 'out', PUMethod = pu_method, JETCorrPayload = params['jec_payloads'][index], JETCorrLevels = params['jec_levels'])
+
+    return process
+
+# The expanded process is stored in $JME_CONFIG_CACHE (set it to '' to disable
+# the cache), and read back as long as the inputs below do not change
+from JMEAnalysis.JMEValidator.configCache import cachedProcess
+process = cachedProcess(buildProcess,
+        inputs = {'jetsCollections': jetsCollections},
+        dependencies = ['JMEAnalysis.JetToolbox.jetToolbox_cff', 'CommonTools.PileupAlgos.Puppi_cff', 'PhysicsTools.PatAlgos.tools.jetTools']
+        )
+
+process.maxEvents = cms.untracked.PSet(input = cms.untracked.int32(1000))
+process.source = cms.Source("PoolSource", fileNames = inputFiles )
+
+# Services
+process.load('FWCore.MessageLogger.MessageLogger_cfi')
+process.MessageLogger.cerr.FwkReport.reportEvery = 10
+process.load('CommonTools.UtilAlgos.TFileService_cfi')
+process.TFileService.fileName = cms.string('output.root')
 
 
 # Configure the analyzers
 
+# Packed candidates and vertex information, computed once per event for all the analyzers
+process.load('JMEAnalysis.JMEValidator.packedCandidateSoA_cff')
+
+# If True, a single JetMETAnalyzer writes all the jet collections in one tree:
+# event information is stored once, and jets are told apart with the jtcoll
+# branch (names of the collections in the jtcoll_<index> objects of the tree user info)
+singleJetMETAnalyzer = False
+
 process.jmfw_analyzers = cms.Sequence()
 
+EventParameters = cms.PSet(
+        srcRho        = cms.InputTag('fixedGridRhoAllFastjet'),
+        srcVtx        = cms.InputTag('offlineSlimmedPrimaryVertices'),
+        srcMuons      = cms.InputTag('selectedPatMuons'),
+        srcPackedCandidates = cms.InputTag('packedCandidateSoA')
+        )
+
+jetMETCollections = cms.VPSet()
+
 for name, params in jetsCollections.items():
     for index, pu_method in enumerate(params['pu_methods']):
 
         algo = params['algo'].upper()
         jetCollection = 'selectedPatJets%sPF%s' % (algo, pu_method)
 
+        collection = cms.PSet(
+                JetCorLabel   = cms.string(params['jec_payloads'][index]),
+                JetCorLevels  = cms.vstring(params['jec_levels']),
+                srcJet        = cms.InputTag(jetCollection)
+                )
+
+        if singleJetMETAnalyzer:
+            print('Adding jets collection \'%s\' to the analyzer' % jetCollection)
+            jetMETCollections.append(collection)
+            continue
+
         print('Adding analyzer for jets collection \'%s\'' % jetCollection)
 
         analyzer = cms.EDAnalyzer('JetMETAnalyzer',
                 CommonParameters,
-                JetCorLabel   = cms.string(params['jec_payloads'][index]),
-                JetCorLevels  = cms.vstring(params['jec_levels']),
-                srcJet        = cms.InputTag(jetCollection),
-                srcRho        = cms.InputTag('fixedGridRhoAllFastjet'),
-                srcVtx        = cms.InputTag('offlineSlimmedPrimaryVertices'),
-                srcMuons      = cms.InputTag('selectedPatMuons')
+                EventParameters,
+                collection
                 )
 
         setattr(process, 'jmfw_%s' % params['jec_payloads'][index], analyzer)
         process.jmfw_analyzers += analyzer
 
+if singleJetMETAnalyzer:
+    process.jmfw = cms.EDAnalyzer('JetMETAnalyzer',
+            CommonParameters,
+            EventParameters,
+            jetCollections = jetMETCollections
+            )
+    process.jmfw_analyzers += process.jmfw
+
 process.puppiReader = cms.EDAnalyzer("puppiAnalyzer",
                                         treeName = cms.string("puppiTree"),
-										maxEvents = cms.int32(1000),
+                                        # keep one event out of 10, chosen from the event id
+                                        prescale = cms.uint32(10),
+                                        # (pt, eta, phi) rounded to 10 bits of mantissa and integer
+                                        # pdgId, charge and fromPV, instead of (px, py, pz, e) as floats
+                                        compact = cms.bool(True),
+                                        mantissaBits = cms.int32(10),
+                                        ptMin = cms.double(0.),
                                         nAlgos = cms.InputTag("puppi", "PuppiNAlgos", "JRA"),
                                         rawAlphas = cms.InputTag("puppi", "PuppiRawAlphas", "JRA"),
                                         alphas = cms.InputTag("puppi", "PuppiAlphas", "JRA"),
@@ -246,6 +308,8 @@ process.puppiReader = cms.EDAnalyzer("puppiAnalyzer",
                                         packedPFCandidates = cms.InputTag("packedPFCandidates", "", "PAT")
 									)
 
+process.leptonsAndMET.srcPackedCandidates = cms.InputTag('packedCandidateSoA')
+
 from RecoMET.METProducers.PFMET_cfi import pfMet
 process.pfMetPuppi = pfMet.clone();
 process.pfMetPuppi.src = cms.InputTag('puppi')
@@ -266,9 +330,29 @@ process.p *= process.pfMetPuppi + process.selectedMuonsForZ + process.puppiReade
 process.options   = cms.untracked.PSet( wantSummary = cms.untracked.bool(True) )
 process.options.allowUnscheduled = cms.untracked.bool(True)
 
+# The analyzers are stream modules: events are processed concurrently, and the
+# trees are filled in the order the events are committed. Single-threaded by
+# default, $JME_THREADS sets the number of threads (runLocal.py sets its own)
+process.options.numberOfThreads = cms.untracked.uint32(int(os.environ.get('JME_THREADS', 1)))
+process.options.numberOfStreams = cms.untracked.uint32(0)
+
 # schedule definition                                                                                                       
 process.outpath  = cms.EndPath(process.out) 
 
+# Merge the identical modules created by the different configuration tools, and
+# report the producers whose products are never used (give the log of a previous
+# job as timeReport to see the time saved). The merge removes the other labels
+# of the merged modules from output_edm.root, which keeps everything: it is
+# only enabled when the EDM output is not read under these labels. Only the
+# InputTags of the configuration are seen, not the labels consumed directly by
+# the C++ code (e.g. addPileupInfo): check the report before removing them
+from JMEAnalysis.JMEValidator.processTools import mergeDuplicateModules, pruneUnusedProducers
+mergeDuplicates = False
+removeUnusedProducers = False
+if mergeDuplicates:
+    mergeDuplicateModules(process)
+pruneUnusedProducers(process, remove=removeUnusedProducers)
+
 #!
 #! THAT'S ALL! CAN YOU BELIEVE IT? :-D
 #!
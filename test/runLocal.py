@@ -0,0 +1,264 @@
+#! /usr/bin/env python
+
+"""
+Run a cmsRun configuration (runFramework.py by default) locally, split in
+jobs run by N worker processes, and merge the outputs.
+
+    ./runLocal.py -j 16                                   # one job per input file
+    ./runLocal.py -j 64 --files-per-job 2 --threads 1
+    ./runLocal.py -j 8 --events-per-job 500 --total-events 10000
+    ./runLocal.py -j 8 --input-files files.txt            # one file name per line
+
+The configuration is built once; each job reads it back and only changes the
+input (fileNames, or skipEvents and maxEvents) and the number of threads. Every
+job runs in its own directory (<work-dir>/job_<i>), where its TFileService and
+PoolOutputModule files and its log are written.
+
+The state of the jobs is kept in <work-dir>/status.json: running the same
+command again only runs the jobs not done yet (failed or interrupted). When all
+the jobs are done, the TFileService outputs are merged with hadd, and the EDM
+outputs with edmCopyPickMerge, in <work-dir>/merged.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from multiprocessing.pool import ThreadPool
+
+STATUS_FILE = 'status.json'
+
+JOB_TEMPLATE = """import os
+import FWCore.ParameterSet.Config as cms
+
+_base = %(base)r
+exec(compile(open(_base).read(), _base, 'exec'))
+
+process.source.fileNames = cms.untracked.vstring(%(files)r)
+process.source.skipEvents = cms.untracked.uint32(%(skipEvents)d)
+process.maxEvents.input = %(maxEvents)d
+
+if not hasattr(process, 'options'):
+    process.options = cms.untracked.PSet()
+process.options.numberOfThreads = cms.untracked.uint32(%(threads)d)
+process.options.numberOfStreams = cms.untracked.uint32(0)
+
+# Output files in the directory of the job
+if hasattr(process, 'TFileService'):
+    process.TFileService.fileName = os.path.basename(process.TFileService.fileName.value())
+for module in process.outputModules_().values():
+    module.fileName = os.path.basename(module.fileName.value())
+"""
+
+
+def loadProcess(cfg):
+    """Execute a configuration file, as cmsRun does, and return its process."""
+
+    cfg = os.path.abspath(cfg)
+    sys.path.insert(0, os.path.dirname(cfg))
+
+    namespace = {'__file__': cfg, '__name__': '__cfg__'}
+    exec(compile(open(cfg).read(), cfg, 'exec'), namespace)
+    return namespace['process']
+
+
+def writeAtomically(fileName, content):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fileName), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+    os.chmod(tmp, 0o644)
+    os.rename(tmp, fileName)
+
+
+def makeJobs(args, files, cfgMaxEvents):
+    """Job definitions: input files, events to skip and maximum number of events."""
+
+    jobs = []
+
+    if args.events_per_job:
+        total = args.total_events if args.total_events else cfgMaxEvents
+        if total <= 0:
+            raise SystemExit('--total-events is needed to split in event ranges when the configuration has no maxEvents')
+
+        for skip in range(0, total, args.events_per_job):
+            jobs.append({'files': files, 'skipEvents': skip, 'maxEvents': min(args.events_per_job, total - skip)})
+    else:
+        for first in range(0, len(files), args.files_per_job):
+            jobs.append({'files': files[first:first + args.files_per_job], 'skipEvents': 0, 'maxEvents': -1})
+
+    return jobs
+
+
+def prepare(args):
+    """Build the configuration and the job definitions, or read them back from a
+    previous run in the same work directory."""
+
+    statusFile = os.path.join(args.work_dir, STATUS_FILE)
+
+    if os.path.isfile(statusFile):
+        with open(statusFile) as f:
+            status = json.load(f)
+
+        if status['cfg'] != os.path.abspath(args.cfg):
+            raise SystemExit('%s was created for %s, use another --work-dir' % (args.work_dir, status['cfg']))
+
+        # The splitting options are those of the first run
+        print('Resuming %d jobs in %s' % (len(status['jobs']), args.work_dir))
+        return status
+
+    if not os.path.isdir(args.work_dir):
+        os.makedirs(args.work_dir)
+
+    process = loadProcess(args.cfg)
+
+    if args.input_files:
+        with open(args.input_files) as f:
+            files = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    else:
+        files = list(process.source.fileNames)
+
+    if not files:
+        raise SystemExit('No input files')
+
+    cfgMaxEvents = process.maxEvents.input.value() if hasattr(process, 'maxEvents') else -1
+    jobs = makeJobs(args, files, cfgMaxEvents)
+
+    base = os.path.join(os.path.abspath(args.work_dir), 'base_cfg.py')
+    writeAtomically(base, process.dumpPython())
+
+    for index, job in enumerate(jobs):
+        job['dir'] = os.path.join(os.path.abspath(args.work_dir), 'job_%d' % index)
+        job['status'] = 'pending'
+        job['attempts'] = 0
+
+        if not os.path.isdir(job['dir']):
+            os.makedirs(job['dir'])
+
+        writeAtomically(os.path.join(job['dir'], 'job_cfg.py'), JOB_TEMPLATE % {
+            'base': base,
+            'files': job['files'],
+            'skipEvents': job['skipEvents'],
+            'maxEvents': job['maxEvents'],
+            'threads': args.threads
+            })
+
+    status = {'cfg': os.path.abspath(args.cfg), 'jobs': jobs}
+    writeAtomically(statusFile, json.dumps(status, indent=2))
+
+    print('Created %d jobs in %s' % (len(jobs), args.work_dir))
+    return status
+
+
+def runJob(job):
+    start = time.time()
+    with open(os.path.join(job['dir'], 'cmsRun.log'), 'w') as log:
+        returnCode = subprocess.call(['cmsRun', 'job_cfg.py'], cwd=job['dir'], stdout=log, stderr=subprocess.STDOUT)
+    return job, returnCode, time.time() - start
+
+
+def run(args, status):
+    statusFile = os.path.join(args.work_dir, STATUS_FILE)
+    jobs = status['jobs']
+
+    todo = [job for job in jobs if job['status'] != 'done']
+    if not todo:
+        return True
+
+    print('Running %d jobs (%d already done) with %d workers' % (len(todo), len(jobs) - len(todo), args.workers))
+
+    pool = ThreadPool(args.workers)
+    try:
+        finished = 0
+        for job, returnCode, duration in pool.imap_unordered(runJob, todo):
+            finished += 1
+            job['attempts'] += 1
+            job['status'] = 'done' if returnCode == 0 else 'failed'
+            job['returnCode'] = returnCode
+
+            # Saved after each job, so that an interrupted run can be resumed
+            writeAtomically(statusFile, json.dumps(status, indent=2))
+
+            print('[%d/%d] %s %s in %.0f s%s' % (finished, len(todo), os.path.basename(job['dir']), job['status'], duration,
+                '' if returnCode == 0 else ' (exit code %d, see %s)' % (returnCode, os.path.join(job['dir'], 'cmsRun.log'))))
+    finally:
+        pool.terminate()
+
+    failed = [job for job in jobs if job['status'] != 'done']
+    if failed:
+        print('%d jobs failed, run the same command again to retry them' % len(failed))
+        return False
+
+    return True
+
+
+def merge(args, status):
+    """Merge the TFileService outputs with hadd, and the EDM outputs with
+    edmCopyPickMerge, file by file name."""
+
+    process = loadProcess(os.path.join(args.work_dir, 'base_cfg.py'))
+
+    histogramFiles = [os.path.basename(process.TFileService.fileName.value())] if hasattr(process, 'TFileService') else []
+    edmFiles = [os.path.basename(module.fileName.value()) for module in process.outputModules_().values()]
+
+    output = os.path.join(args.work_dir, 'merged')
+    if not os.path.isdir(output):
+        os.makedirs(output)
+
+    success = True
+    for name in histogramFiles + edmFiles:
+        inputs = [os.path.join(job['dir'], name) for job in status['jobs'] if os.path.isfile(os.path.join(job['dir'], name))]
+        if not inputs:
+            continue
+
+        target = os.path.join(output, name)
+        print('Merging %d files into %s' % (len(inputs), target))
+
+        if name in histogramFiles:
+            command = ['hadd', '-f', target] + inputs
+        else:
+            command = ['edmCopyPickMerge', 'outputFile=' + os.path.abspath(target)] + ['inputFiles=file:' + os.path.abspath(f) for f in inputs]
+
+        if subprocess.call(command) != 0:
+            print('Merging %s failed' % target)
+            success = False
+
+    return success
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a cmsRun configuration locally with several processes, and merge the outputs')
+    parser.add_argument('cfg', nargs='?', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runFramework.py'), help='configuration (default: runFramework.py)')
+    parser.add_argument('-j', '--workers', type=int, help='number of jobs run at the same time (default: number of cores / threads)')
+    parser.add_argument('-w', '--work-dir', default='local', help='directory of the jobs and of the merged outputs (default: local)')
+    parser.add_argument('--threads', type=int, default=1, help='threads of each cmsRun (default: 1)')
+    parser.add_argument('--input-files', help='file with the input file names, one per line (default: the fileNames of the configuration)')
+    parser.add_argument('--files-per-job', type=int, default=1, help='split the input files in jobs of this many files (default: 1)')
+    parser.add_argument('--events-per-job', type=int, help='split in event ranges of this many events instead of in files')
+    parser.add_argument('--total-events', type=int, help='number of events to process with --events-per-job (default: maxEvents of the configuration)')
+    parser.add_argument('--no-merge', action='store_true', help='do not merge the outputs')
+
+    args = parser.parse_args()
+
+    if args.workers is None:
+        import multiprocessing
+        args.workers = max(1, multiprocessing.cpu_count() // args.threads)
+
+    status = prepare(args)
+
+    if not run(args, status):
+        return 1
+
+    if not args.no_merge and not merge(args, status):
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+////////////////////////////////////////////////////////////////////////////////
+//
+// testSortedVertices
+// ------------------
+//
+// Compare JME::SortedVertices::closestDz with the loop over all the vertices
+// (closestDzBruteForce) on synthetic vertices and packed candidates, without
+// any input file:
+//   - random vertices and candidates, including forward tracks
+//   - vertices at the same |dz| on both sides of the candidate (ties)
+//   - a single vertex, no vertex, and fake vertices
+//   - candidates beyond the first and the last vertex in z
+//
+//   scram b runtests
+////////////////////////////////////////////////////////////////////////////////
+
+#include "DataFormats/Candidate/interface/LeafCandidate.h"
+#include "DataFormats/PatCandidates/interface/PackedCandidate.h"
+#include "DataFormats/VertexReco/interface/Vertex.h"
+
+#include "JMEAnalysis/JMEValidator/interface/SortedVertices.h"
+
+#include <cmath>
+#include <iostream>
+#include <random>
+#include <string>
+#include <vector>
+
+namespace {
+    unsigned int failures = 0;
+    unsigned int checks = 0;
+
+    reco::Vertex vertex(double x, double y, double z, bool fake = false) {
+        reco::Vertex::Error error;
+        error(0, 0) = error(1, 1) = error(2, 2) = 1e-4;
+        if (fake)
+            return reco::Vertex(reco::Vertex::Point(x, y, z), error, 0., 0., 0);
+        return reco::Vertex(reco::Vertex::Point(x, y, z), error, 1., 1., 0);
+    }
+
+    pat::PackedCandidate candidate(double pt, double eta, double phi, double x, double y, double z) {
+        reco::LeafCandidate leaf(1, reco::Candidate::PolarLorentzVector(pt, eta, phi, 0.13957), reco::Candidate::Point(x, y, z), 211);
+        return pat::PackedCandidate(leaf, reco::VertexRefProd(), 0);
+    }
+
+    // Both searches must give the same signed dz
+    void check(const std::string& name, const std::vector<reco::Vertex>& vertices, const pat::PackedCandidate& c, double initial) {
+        JME::SortedVertices sorted;
+        sorted.update(vertices);
+
+        double expected = JME::SortedVertices::closestDzBruteForce(c, vertices, initial);
+        double result = sorted.closestDz(c, initial);
+
+        checks++;
+        if (result != expected) {
+            failures++;
+            std::cerr << name << ": closestDz " << result << " != closestDzBruteForce " << expected
+                      << " (candidate z " << c.vertex().z() << ", eta " << c.eta() << ", " << vertices.size() << " vertices)" << std::endl;
+        }
+    }
+}
+
+int main() {
+    std::mt19937 generator(42);
+    std::normal_distribution<double> beamSpot(0., 0.01);
+    std::normal_distribution<double> luminousRegion(0., 5.);
+    std::uniform_real_distribution<double> eta(-2.5, 2.5);
+    std::uniform_real_distribution<double> phi(-M_PI, M_PI);
+    std::uniform_real_distribution<double> logPt(std::log(0.5), std::log(200.));
+
+    // Random events, with a beam spot away from the origin
+    for (size_t event = 0; event < 200; event++) {
+        std::vector<reco::Vertex> vertices;
+        size_t nVertices = 1 + event % 60;
+        for (size_t i = 0; i < nVertices; i++)
+            vertices.push_back(vertex(0.07 + beamSpot(generator), -0.03 + beamSpot(generator), luminousRegion(generator), i % 17 == 16));
+
+        for (size_t i = 0; i < 50; i++) {
+            pat::PackedCandidate c = candidate(std::exp(logPt(generator)), eta(generator), phi(generator),
+                    0.07 + beamSpot(generator), -0.03 + beamSpot(generator), luminousRegion(generator));
+            check("random", vertices, c, c.dz());
+            check("random, large initial value", vertices, c, 1e9);
+        }
+    }
+
+    // Ties: a central candidate (pz = 0) from the origin has dz(v) = -vz
+    pat::PackedCandidate central = candidate(10., 0., 0.3, 0., 0., 0.);
+    check("tie, upper vertex first", {vertex(0., 0., 0.5), vertex(0., 0., -0.5), vertex(0., 0., 3.)}, central, 1e9);
+    check("tie, lower vertex first", {vertex(0., 0., -0.5), vertex(0., 0., 0.5), vertex(0., 0., 3.)}, central, 1e9);
+    check("tie, same position", {vertex(0., 0., 0.5), vertex(0., 0., 0.5)}, central, 1e9);
+    check("tie with the initial value", {vertex(0., 0., 0.5), vertex(0., 0., -0.5)}, central, 0.5);
+    check("tie with the initial value", {vertex(0., 0., 0.5), vertex(0., 0., -0.5)}, central, -0.5);
+    check("tie behind a fake vertex", {vertex(0., 0., 0.25, true), vertex(0., 0., 0.5), vertex(0., 0., -0.5)}, central, 1e9);
+
+    // One vertex, no vertex, only fake vertices
+    for (double z: {-20., -1., 0., 0.4, 1., 20.}) {
+        for (double candidateEta: {-2.4, -0.5, 0., 0.5, 2.4}) {
+            pat::PackedCandidate c = candidate(2., candidateEta, 1., 0.01, 0.02, 0.1);
+            check("single vertex", {vertex(0.05, -0.02, z)}, c, c.dz());
+            check("single vertex, large initial value", {vertex(0.05, -0.02, z)}, c, 1e9);
+            check("fake vertices only", {vertex(0.05, -0.02, z, true), vertex(0., 0., 0., true)}, c, c.dz());
+            check("no vertex", {}, c, c.dz());
+        }
+    }
+
+    // Candidates beyond the first and the last vertex, central and forward
+    std::vector<reco::Vertex> vertices;
+    for (double z: {-3., -1., -0.2, 0.4, 2.5})
+        vertices.push_back(vertex(0.1, 0.05, z));
+    for (double z: {-30., -3.5, -3., 2.5, 2.6, 30.}) {
+        for (double candidateEta: {-2.5, -1., 0., 1., 2.5}) {
+            for (double candidatePhi: {-2., 0.5, 3.}) {
+                pat::PackedCandidate c = candidate(5., candidateEta, candidatePhi, 0.02, -0.1, z);
+                check("beyond the vertices", vertices, c, c.dz());
+                check("beyond the vertices, large initial value", vertices, c, 1e9);
+            }
+        }
+    }
+
+    std::cout << "testSortedVertices: " << checks << " checks, " << failures << " failures" << std::endl;
+    return failures == 0 ? 0 : 1;
+}
@@ -0,0 +1,111 @@
+import math
+
+import numpy as np
+import pytest
+
+from JMEAnalysis.JMEValidator.jecEvaluator import FactorizedJetCorrector, payloadFileName
+from JMEAnalysis.JMEValidator.jecPayloadCache import loadParameters
+
+LEVELS = ['L1FastJet', 'L2Relative', 'L3Absolute']
+
+
+def logNormal(x, sigma, theta, m):
+    # TMath::LogNormal
+    if x <= theta or sigma <= 0 or m <= 0:
+        return 0.
+    return math.exp(-0.5 * ((math.log(x - theta) - math.log(m)) / sigma) ** 2) / ((x - theta) * sigma * math.sqrt(2 * math.pi))
+
+
+def l1FastJet(p, pt, area, rho):
+    return max(0.0001, 1 - area * (p[0] + (p[1] * rho) * (1 + p[2] * math.log(pt))) / pt)
+
+
+def l2Relative(p, pt):
+    if pt <= p[10]:
+        return p[0] + logNormal(math.log10(pt), p[1], p[2], p[3])
+    return p[4] + p[5] / (math.log10(pt) ** 2 + p[6]) + p[7] * math.exp(-p[8] * (math.log10(pt) - p[9]) ** 2)
+
+
+# Per-jet implementation of the formulas of the payloads in data/
+FORMULAS = {
+    'L1FastJet': l1FastJet,
+    'L2Relative': l2Relative,
+    'L3Absolute': lambda p, pt: 1.,
+}
+
+
+def readPayload(fileName):
+    """(parameter variables, list of (etaMin, etaMax, ranges, parameters))"""
+
+    records = []
+    with open(fileName) as f:
+        header = f.readline().strip('{}\n').split()
+        parVar = header[3:3 + int(header[2])]
+        for line in f:
+            values = [float(v) for v in line.split()]
+            if not values:
+                continue
+            ranges = [(values[3 + 2 * i], values[4 + 2 * i]) for i in range(len(parVar))]
+            records.append((values[0], values[1], ranges, values[3 + 2 * len(parVar):]))
+    return parVar, records
+
+
+def scalarCorrection(payloads, jet):
+    """Jet by jet FactorizedJetCorrector: each level sees the pt corrected by the previous ones."""
+
+    factor = 1.
+    for level, (parVar, records) in payloads:
+        variables = dict(jet, JetPt=jet['JetPt'] * factor)
+        for etaMin, etaMax, ranges, p in records:
+            if etaMin <= jet['JetEta'] < etaMax:
+                args = [min(max(variables[name], low), high) for name, (low, high) in zip(parVar, ranges)]
+                factor *= FORMULAS[level](p, *args)
+                break
+    return factor
+
+
+def jets(n=2000, seed=5):
+    rng = np.random.RandomState(seed)
+    # Outside of the eta range, on the first, last and inner bin edges, and pt,
+    # area and rho below and above the validity ranges
+    eta = np.concatenate([[-6., 6., -5.191, 5.191, 5.19, -4.889, 4.889, 0., 0., 0., 0., 0.],
+                          rng.uniform(-5.3, 5.3, n)])
+    pt = np.concatenate([[50., 50., 30., 30., 30., 30., 30., 0.5, 1e5, 50., 50., 20.],
+                         np.exp(rng.uniform(np.log(1.), np.log(1e4), n))])
+    area = np.concatenate([[0.5] * 9 + [0., 5., 0.5], rng.uniform(0., 1.2, n)])
+    rho = np.concatenate([[10.] * 9 + [0., 100., 1e3], rng.uniform(0., 60., n)])
+    return dict(JetEta=eta, JetPt=pt, JetA=area, Rho=rho)
+
+
+@pytest.mark.parametrize('cache', [False, True])
+@pytest.mark.parametrize('payload', ['AK4PFchs', 'AK8PFchs'])
+@pytest.mark.parametrize('levels', [[level] for level in LEVELS] + [LEVELS])
+def test_against_scalar(levels, payload, cache, tmpdir):
+    fileNames = [payloadFileName('PHYS14_V2_MC', level, payload) for level in levels]
+    if cache:
+        jec = FactorizedJetCorrector([loadParameters(f, cacheDir=str(tmpdir)) for f in fileNames])
+    else:
+        jec = FactorizedJetCorrector.fromFiles(fileNames, cache=False)
+    payloads = [(level, readPayload(f)) for level, f in zip(levels, fileNames)]
+
+    variables = jets()
+    expected = [scalarCorrection(payloads, dict((k, v[i]) for k, v in variables.items()))
+                for i in range(len(variables['JetEta']))]
+
+    np.testing.assert_allclose(jec.correction(**variables), expected, rtol=1e-12, atol=0.)
+
+
+def test_out_of_range():
+    jec = FactorizedJetCorrector.fromEra('PHYS14_V2_MC', 'AK4PFchs', LEVELS, cache=False)
+    correction = jec.correction(JetEta=[-5.2, 5.191, 7.], JetPt=30., JetA=0.5, Rho=10.)
+    np.testing.assert_array_equal(correction, 1.)
+
+
+def test_sub_corrections():
+    jec = FactorizedJetCorrector.fromEra('PHYS14_V2_MC', 'AK4PFchs', LEVELS, cache=False)
+    variables = jets(100)
+
+    cumulative = jec.subCorrections(**variables)
+    for i in range(len(LEVELS)):
+        partial = FactorizedJetCorrector.fromEra('PHYS14_V2_MC', 'AK4PFchs', LEVELS[:i + 1], cache=False)
+        np.testing.assert_allclose(cumulative[i], partial.correction(**variables), rtol=1e-15)
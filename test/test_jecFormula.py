@@ -0,0 +1,61 @@
+import math
+
+import numpy as np
+import pytest
+
+from JMEAnalysis.JMEValidator import jecFormula
+
+X, Y, Z, T = 2.5, 0.7, 3., -1.5
+P = [0.5, 2., -3., 4.]
+
+CASES = [
+    # TFormula precedence: ^ binds tighter than the unary minus, and is right associative
+    ('-x^2', -X ** 2),
+    ('2^3^2', 2. ** 9),
+    ('x^-1', 1. / X),
+    ('[0]+[1]*x^[2]', P[0] + P[1] * X ** P[2]),
+    ('x-y-z', X - Y - Z),
+    ('x/y/z', X / Y / Z),
+    ('(x<=[1])*y+(x>[1])*z', Z),
+    ('x>y && z<t || !(x==y)', 1.),
+    ('max(0.0001,1-y*([0]+([1]*z)*(1+[2]*log(x)))/x)', max(0.0001, 1 - Y * (P[0] + (P[1] * Z) * (1 + P[2] * math.log(X))) / X)),
+    ('TMath::Log10(x)+log10(z)+TMath::Exp(t)+pow(x,y)', math.log10(X) + math.log10(Z) + math.exp(T) + X ** Y),
+    ('TMath::Max(x,z)*TMath::Min(t,y)+fabs(t)', Z * T + abs(T)),
+    ('TMath::Erf(y)+TMath::Erfc(y)', 1.),
+    ('TMath::Gaus(x,[0],[1])', math.exp(-0.5 * ((X - P[0]) / P[1]) ** 2)),
+    ('TMath::LogNormal(x,[1],[0],[3])',
+     math.exp(-0.5 * ((math.log(X - P[0]) - math.log(P[3])) / P[1]) ** 2) / ((X - P[0]) * P[1] * math.sqrt(2 * math.pi))),
+    ('TMath::LogNormal(t,[1],[0],[3])', 0.),
+    ('TMath::Pi()*pi', math.pi ** 2),
+    ('1.5e-1*x', 0.15 * X),
+    ('', 1.),
+]
+
+
+@pytest.mark.parametrize('formula,expected', CASES)
+def test_scalar(formula, expected):
+    kernel = jecFormula.compileFormula(formula)
+    assert kernel(X, Y, Z, T, P) == pytest.approx(expected, rel=1e-14)
+
+
+@pytest.mark.parametrize('formula,expected', CASES)
+def test_arrays(formula, expected):
+    kernel = jecFormula.compileFormula(formula)
+    n = 5
+    p = [np.full(n, value) for value in P]
+    result = kernel(np.full(n, X), np.full(n, Y), np.full(n, Z), np.full(n, T), p) * np.ones(n)
+    np.testing.assert_allclose(result, expected, rtol=1e-14)
+
+
+@pytest.mark.parametrize('formula', ['x+', 'foo(x)', 'x y', 'x $ y', '(x'])
+def test_invalid(formula):
+    with pytest.raises(ValueError):
+        jecFormula.translate(formula)
+
+
+def test_cache():
+    jecFormula.clearCache()
+    first = jecFormula.compileFormula('x*[0]')
+    assert jecFormula.compileFormula('x*[0]') is first
+    assert jecFormula.cacheInfo()['hits'] == 1
+    assert jecFormula.cacheInfo()['misses'] == 1
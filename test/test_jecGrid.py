@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from JMEAnalysis.JMEValidator import jecGrid
+from JMEAnalysis.JMEValidator.jecEvaluator import FactorizedJetCorrector
+
+LEVELS = ['L1FastJet', 'L2Relative', 'L3Absolute']
+
+
+def jets(n=200000, seed=3):
+    rng = np.random.RandomState(seed)
+    # Outside of the eta range, on the bin edges, and pt, area and rho below
+    # and above the validity ranges
+    eta = np.concatenate([[-6., 6., -5.191, 5.191, -4.889, 0.], rng.uniform(-5.3, 5.3, n)])
+    pt = np.concatenate([[50., 50., 1., 1e4, 10., 3000.], np.exp(rng.uniform(np.log(1.), np.log(1e4), n))])
+    area = np.concatenate([[0.5] * 6, rng.uniform(0., 1.2, n)])
+    rho = np.concatenate([[10.] * 6, rng.uniform(0., 60., n)])
+    return dict(JetEta=eta, JetPt=pt, JetA=area, Rho=rho)
+
+
+@pytest.mark.parametrize('payload', ['AK4PFchs', 'AK8PFchs'])
+@pytest.mark.parametrize('level', LEVELS)
+def test_grid_against_formula(payload, level):
+    exact = FactorizedJetCorrector.fromEra('PHYS14_V2_MC', payload, [level], cache=False)
+    grid = FactorizedJetCorrector.fromEra('PHYS14_V2_MC', payload, [level], cache=False, grid=[level])
+
+    report = grid.gridReport[level]
+    assert report['maxRelativeError'] <= jecGrid.DEFAULT_TOLERANCE
+
+    variables = jets()
+    np.testing.assert_allclose(grid.correction(**variables), exact.correction(**variables),
+                               rtol=jecGrid.DEFAULT_TOLERANCE, atol=0.)
+
+
+def test_default_levels():
+    jec = FactorizedJetCorrector.fromEra('PHYS14_V2_MC', 'AK4PFchs', LEVELS, cache=False, grid=True)
+    assert sorted(jec.gridReport) == sorted(jecGrid.DEFAULT_LEVELS)
+
+
+def test_validation_points():
+    """The sampled cell error is at least the error at the cell centers."""
+
+    exact = FactorizedJetCorrector.fromEra('PHYS14_V2_MC', 'AK4PFchs', ['L1FastJet'], cache=False)
+    grid = jecGrid.GridJetCorrector(exact.correctors[0])
+
+    fractions = [(np.arange(n - 1) + 0.5) / (n - 1) for n in grid.nodes]
+    centers = grid._evaluate(fractions)
+    shape = centers.shape
+    bins = np.broadcast_to(np.arange(shape[0]).reshape((-1, 1, 1, 1)), shape)
+    points = [np.broadcast_to(f.reshape([1 if j != i else -1 for j in range(4)]), shape)
+              for i, f in enumerate(fractions, 1)]
+    interpolated = grid._interpolate(bins.ravel(), [p.ravel() for p in points]).reshape(shape)
+    centerError = np.abs(interpolated / centers - 1.)
+
+    assert np.all(grid.cellError >= centerError * (1. - 1e-9))
+    assert np.any(grid.cellError > centerError * 1.5)
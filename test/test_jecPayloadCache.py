@@ -0,0 +1,90 @@
+import errno
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from JMEAnalysis.JMEValidator.jecEvaluator import JetCorrectorParameters, payloadFileName
+from JMEAnalysis.JMEValidator import jecPayloadCache
+from JMEAnalysis.JMEValidator.jecPayloadCache import cacheFileName, loadParameters
+
+
+@pytest.fixture
+def payload():
+    return payloadFileName('PHYS14_V2_MC', 'L2Relative', 'AK4PFchs')
+
+
+def test_same_as_text(payload, tmp_path):
+    text = JetCorrectorParameters(payload)
+    for _ in range(2):
+        compiled = loadParameters(payload, cacheDir=str(tmp_path))
+        assert compiled.definitions.header == text.definitions.header
+        for name in ('xMin', 'xMax', 'parMin', 'parMax', 'parameters'):
+            np.testing.assert_array_equal(getattr(compiled, name), getattr(text, name))
+
+
+def test_same_name_in_other_directory(payload, tmp_path):
+    copy = tmp_path / 'other' / os.path.basename(payload)
+    copy.parent.mkdir()
+    shutil.copy(payload, str(copy))
+
+    first = cacheFileName(payload, cacheDir=str(tmp_path))
+    second = cacheFileName(str(copy), cacheDir=str(tmp_path))
+    assert first != second
+
+    loadParameters(payload, cacheDir=str(tmp_path))
+    loadParameters(str(copy), cacheDir=str(tmp_path))
+    assert os.path.isfile(first) and os.path.isfile(second)
+
+
+def test_truncated_cache_is_rebuilt(payload, tmp_path):
+    output = cacheFileName(payload, cacheDir=str(tmp_path))
+    loadParameters(payload, cacheDir=str(tmp_path))
+
+    for size in (0, 10):
+        with open(output, 'r+b') as f:
+            f.truncate(size)
+        parameters = loadParameters(payload, cacheDir=str(tmp_path))
+        assert parameters.size() == JetCorrectorParameters(payload).size()
+
+
+def test_empty_payload(tmp_path):
+    empty = tmp_path / 'Empty_L2Relative_AK4PFchs.txt'
+    empty.write_text('')
+    with pytest.raises(ValueError):
+        loadParameters(str(empty), cacheDir=str(tmp_path))
+
+    headerOnly = tmp_path / 'HeaderOnly_L2Relative_AK4PFchs.txt'
+    headerOnly.write_text('{1 JetEta 1 JetPt [0] Correction L2Relative}\n')
+    with pytest.raises(ValueError):
+        loadParameters(str(headerOnly), cacheDir=str(tmp_path))
+
+
+def test_existing_empty_cache_directory(payload, tmp_path):
+    cacheDir = tmp_path / 'cache'
+    cacheDir.mkdir()
+    parameters = loadParameters(payload, cacheDir=str(cacheDir))
+    assert parameters.size() == JetCorrectorParameters(payload).size()
+    assert os.path.isfile(cacheFileName(payload, cacheDir=str(cacheDir)))
+
+
+def test_read_only_cache_directory(payload, tmp_path, monkeypatch):
+    cacheDir = tmp_path / 'cache'
+    cacheDir.mkdir()
+    cacheDir.chmod(0o555)
+    if os.access(str(cacheDir), os.W_OK):
+        # Running as root: the permissions are not enforced
+        def mkstemp(*args, **kwargs):
+            raise OSError(errno.EACCES, 'Permission denied')
+        monkeypatch.setattr(jecPayloadCache.tempfile, 'mkstemp', mkstemp)
+
+    try:
+        with pytest.warns(UserWarning):
+            parameters = loadParameters(payload, cacheDir=str(cacheDir))
+    finally:
+        cacheDir.chmod(0o755)
+
+    text = JetCorrectorParameters(payload)
+    np.testing.assert_array_equal(parameters.parameters, text.parameters)
+    assert not os.listdir(str(cacheDir))
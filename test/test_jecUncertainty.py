@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from JMEAnalysis.JMEValidator.jecUncertainty import JetCorrectionUncertainty, UP, DOWN
+
+# Two sources with the same eta binning, and pt rows of different lengths and
+# disjoint ranges from one bin to the next
+PAYLOAD = """
+[SourceA]
+{1 JetEta 1 JetPt "" Correction Uncertainty}
+-2.0 -1.5 6  600 0.6 0.5  700 0.4 0.3
+-1.5  0.5 9  10 0.12 0.10  20 0.20 0.18  500 0.25 0.20
+ 0.5  2.0 12 10 0.05 0.06  30 0.04 0.05  100 0.03 0.04  200 0.02 0.03
+[SourceB]
+{1 JetEta 1 JetPt "" Correction Uncertainty}
+-2.0 -1.5 3  50 0.01 0.02
+-1.5  0.5 9  5 0.3 0.2  15 0.1 0.05  25 0.2 0.1
+ 0.5  2.0 6  10 0.08 0.07  20 0.06 0.05
+"""
+
+
+def scalarUncertainty(fileName, source, eta, pt, direction):
+    """Per-jet reference, as SimpleJetCorrectionUncertainty: linear interpolation
+    in pt inside the eta bin, constant beyond the first and last points."""
+
+    inSection = False
+    for line in open(fileName):
+        line = line.strip()
+        if line.startswith('['):
+            inSection = (line.strip('[]') == source)
+            continue
+        if not inSection or not line or line.startswith('{'):
+            continue
+
+        values = [float(v) for v in line.split()]
+        if not (values[0] <= eta < values[1]):
+            continue
+
+        points = values[3:]
+        xs, ys = points[0::3], points[1 + direction::3]
+        if pt <= xs[0]:
+            return ys[0]
+        if pt >= xs[-1]:
+            return ys[-1]
+        for i in range(len(xs) - 1):
+            if xs[i] <= pt < xs[i + 1]:
+                return ys[i] + (pt - xs[i]) / (xs[i + 1] - xs[i]) * (ys[i + 1] - ys[i])
+
+    return np.nan
+
+
+@pytest.fixture
+def payload(tmp_path):
+    fileName = tmp_path / 'Uncertainty.txt'
+    fileName.write_text(PAYLOAD)
+    return str(fileName)
+
+
+def test_uneven_rows(payload):
+    unc = JetCorrectionUncertainty(payload, ['SourceA'])
+
+    result = unc.uncertainties(np.full(5, -1.), [10., 15., 20., 260., 500.])
+    np.testing.assert_allclose(result[:, 0, UP], [0.12, 0.16, 0.2, 0.225, 0.25])
+
+
+def test_against_scalar(payload):
+    unc = JetCorrectionUncertainty(payload)
+    assert unc.sources == ['SourceA', 'SourceB']
+
+    rng = np.random.RandomState(1)
+    # Bin edges, outside of the eta range, and pt below, on and above the points
+    eta = np.concatenate([[-2., -1.5, 0.5, 1.999, 2., -3., 3.], rng.uniform(-2.5, 2.5, 500)])
+    pt = np.concatenate([[10., 600., 1000., 5., 2000., 50., 50.], np.exp(rng.uniform(0., 8., 500))])
+
+    result = unc.uncertainties(eta, pt)
+    assert result.shape == (len(eta), 2, 2)
+
+    for i, source in enumerate(unc.sources):
+        for direction in (UP, DOWN):
+            expected = [scalarUncertainty(payload, source, e, p, direction) for e, p in zip(eta, pt)]
+            np.testing.assert_allclose(result[:, i, direction], expected, rtol=1e-12)